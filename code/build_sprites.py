@@ -0,0 +1,42 @@
+# build_sprites.py
+
+"""
+Builds the LCD sprite cache (see classes/sprite_cache.py) in advance, e.g. when installing on the Pi,
+so the first startup doesn't need to convert the images.
+
+Usage (from the 'code' directory):
+
+    python3 build_sprites.py [--config <settings overlay>] [<image> ...]
+
+The default images are those used by the Display, i.e. images/*.png and images/*.bmp.
+"""
+
+import glob
+import time
+import argparse
+
+from classes.config import Config
+from classes.sprite_cache import SpriteCache
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Convert the LCD images to cached RGB565 sprites")
+    parser.add_argument("paths", nargs="*", help="image files (default images/*.png images/*.bmp)")
+    parser.add_argument("--config", default=None, help="settings file to overlay on config/sensor_config.json")
+    args = parser.parse_args()
+
+    settings = Config(args.config).settings
+
+    paths = args.paths if len(args.paths) > 0 else sorted(glob.glob("images/*.png") + glob.glob("images/*.bmp"))
+
+    t_start = time.time()
+
+    sprites = SpriteCache(settings)
+    total_bytes = 0
+    for path in paths:
+        total_bytes += len(sprites.load(path))
+
+    print("build_sprites {} images ({} converted), {} bytes in {}, {:.3f} secs".format(len(paths),
+                                                                                      sprites.converted,
+                                                                                      total_bytes,
+                                                                                      sprites.cache_dir,
+                                                                                      time.time() - t_start))
@@ -0,0 +1,115 @@
+# calibrate.py
+
+"""
+Fits the load cell CalibrationModel (classes/calibration.py) to raw per-cell readings
+recorded with known weights on the scale.
+
+Usage (from the 'code' directory):
+
+    python3 calibrate.py --reference <reference.csv> [--config <settings overlay>]
+                         [--output <calibration.json>] <raw.csv> [<raw.csv> ...]
+
+<raw.csv> is written by the WeightSensor when settings["RAW_CSV_FILE"] is set, each line is
+    <ts>,<cell 0>,<cell 1>,<cell 2>,<cell 3>,<temperature>
+
+<reference.csv> lists the periods a known weight was on the scale (e.g. nothing, 1000g, 2000g), each line
+    <start ts>,<end ts>,<weight grams>
+
+The per-cell offsets are taken from the tare file (settings["TARE_FILENAME"]), then the per-cell gains,
+bias and temperature drift are fitted by least squares. The fitted model is written to --output
+(default config/sensor_calibration.json), to be used by setting "CALIBRATION_FILENAME".
+"""
+
+import sys
+import csv
+import argparse
+import simplejson as json
+import numpy as np
+
+from classes.config import Config
+from classes.calibration import CalibrationModel
+
+MIN_CUP_WEIGHT = 40 # as Events, the calibration should be well within this
+
+CELL_COUNT = 4
+
+# Return ( ts, raw, temperature ) numpy arrays from the raw CSV files
+def load_raw(filenames):
+    rows = []
+    for filename in filenames:
+        with open(filename, "r", newline="") as fp:
+            for row in csv.reader(fp):
+                try:
+                    rows.append([ float(x) for x in row[:CELL_COUNT + 2] ])
+                except ValueError:
+                    continue
+    data = np.array(rows)
+    return data[:,0], data[:,1:CELL_COUNT + 1], data[:,CELL_COUNT + 1]
+
+# Return a list of ( start_ts, end_ts, weight )
+def load_reference(filename):
+    reference = []
+    with open(filename, "r", newline="") as fp:
+        for row in csv.reader(fp):
+            try:
+                reference.append(( float(row[0]), float(row[1]), float(row[2]) ))
+            except (ValueError, IndexError):
+                continue
+    return reference
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Fit the load cell calibration model to reference weights")
+    parser.add_argument("paths", nargs="+", help="raw CSV files written via settings RAW_CSV_FILE")
+    parser.add_argument("--reference", required=True, help="CSV of <start ts>,<end ts>,<weight grams>")
+    parser.add_argument("--config", default=None, help="settings file to overlay on config/sensor_config.json")
+    parser.add_argument("--output", default="config/sensor_calibration.json", help="calibration json to write")
+    args = parser.parse_args()
+
+    settings = Config(args.config).settings
+
+    ts, raw, temperature = load_raw(args.paths)
+
+    # Select the readings within the reference periods, with their known weight
+    weight = np.full(len(ts), np.nan)
+    for start_ts, end_ts, reference_weight in load_reference(args.reference):
+        weight[(ts >= start_ts) & (ts <= end_ts)] = reference_weight
+
+    selected = ~np.isnan(weight)
+    if np.count_nonzero(selected) == 0:
+        print("calibrate no raw readings within the reference periods", file=sys.stderr)
+        sys.exit(1)
+
+    ts, raw, temperature, weight = ts[selected], raw[selected], temperature[selected], weight[selected]
+
+    model = CalibrationModel(settings=settings, cell_count=CELL_COUNT)
+
+    with open(settings["TARE_FILENAME"], "r") as fp:
+        model.set_offset(json.loads(fp.read())["tares"])
+
+    # The original WEIGHT_FACTOR calculation, for comparison
+    default_error = model.apply(raw) - weight
+
+    error = model.fit(raw, temperature, weight)
+
+    print("calibrate fitted {} readings at {} reference weights".format(len(weight), len(np.unique(weight))))
+    print("gain [ {} ]".format(", ".join([ "{:.6g}".format(g) for g in model.gain ])))
+    print("bias {:.1f} g, drift {:.2f} g/C at {:.1f} C".format(model.bias, model.drift, model.ref_temperature))
+
+    print("{: >10} {: >8} {: >10} {: >10} {: >10}".format("weight", "count", "mean", "rms", "default"))
+    for reference_weight in np.unique(weight):
+        rows = weight == reference_weight
+        print("{: >10.0f} {: >8} {: >10.1f} {: >10.1f} {: >10.1f}".format(reference_weight,
+                                                                          np.count_nonzero(rows),
+                                                                          np.mean(error[rows]),
+                                                                          np.sqrt(np.mean(error[rows]**2)),
+                                                                          np.sqrt(np.mean(default_error[rows]**2))))
+
+    rms = np.sqrt(np.mean(error**2))
+    print("rms error {:.1f} g (was {:.1f} g with WEIGHT_FACTOR), smallest cup {} g".format(rms,
+                                                                                        np.sqrt(np.mean(default_error**2)),
+                                                                                        MIN_CUP_WEIGHT))
+    if rms > MIN_CUP_WEIGHT / 4:
+        print("calibrate WARNING rms error is too large to reliably detect a {} g cup".format(MIN_CUP_WEIGHT))
+
+    model.save(args.output)
+    print("calibrate written to {}".format(args.output))
@@ -0,0 +1,157 @@
+# ----------------------------------------------------------------------
+# ----------------------------------------------------------------------
+# Calibration
+#
+# RawBuffer: a circular buffer of the raw per-cell load cell readings (plus temperature),
+#   held in a numpy array in parallel with the LocalSensor's sample_buffer of weights, so
+#   the per-cell data can be saved and used to fit a CalibrationModel offline (see calibrate.py).
+#
+# CalibrationModel: converts the raw readings of the load cells to grams:
+#
+#   weight = sum( gain[i] * (raw[i] - offset[i]) ) + bias + drift * (temperature - ref_temperature)
+#
+#   where 'offset' is the per-cell tare reading, 'gain' the per-cell grams per raw unit, and 'drift'
+#   the change in grams per degree C. The default model (gain = 1/WEIGHT_FACTOR for every cell,
+#   no bias or drift) gives the same weight as the original single WEIGHT_FACTOR calculation.
+#
+#   model.apply(raw, temperature) is a numpy multiply-add, and also accepts an (N x cells) array
+#   of readings (with an array of N temperatures) to convert a whole recording at once.
+#
+#   model.fit(raw, temperature, weight) fits gain, bias and drift by least squares to readings with
+#   known reference weights. The per-cell offsets are not fitted (only their gain-weighted sum is
+#   measurable from the total weight) but are kept from the tare.
+#
+# The model is saved as json, e.g. config/sensor_calibration.json:
+#   { "acp_ts": <time fitted>,
+#     "gain": [ <grams per raw unit per cell> ],
+#     "offset": [ <raw tare reading per cell> ],
+#     "bias": <grams>,
+#     "drift": <grams per degree C>,
+#     "ref_temperature": <degrees C>
+#   }
+# ----------------------------------------------------------------------
+# ----------------------------------------------------------------------
+
+import time
+import simplejson as json
+import numpy as np
+
+RAW_BUFFER_SIZE = 1000 # as the LocalSensor sample_buffer, i.e. 100 seconds at 10Hz
+
+class RawBuffer(object):
+    """
+    Circular buffer of 'ts' plus 'channels' raw values, e.g. 4 load cells + temperature
+    """
+
+    def __init__(self, size=RAW_BUFFER_SIZE, channels=5):
+        self.size = size
+        self.channels = channels
+
+        self.ts = np.zeros(size)
+        self.values = np.full((size, channels), np.nan)
+
+        self.index = 0   # index for the NEXT entry
+        self.samples = 0 # how many entries are in the buffer (max = size)
+
+    # Store a row of raw values (a sequence of 'channels' numbers) with timestamp 'ts'
+    def put(self, ts, values):
+        self.ts[self.index] = ts
+        self.values[self.index] = values
+        self.index = (self.index + 1) % self.size
+        if self.samples < self.size:
+            self.samples += 1
+
+    # Return ( ts array, values array ) of the latest 'count' entries (default all), oldest first
+    def latest(self, count=None):
+        if count is None or count > self.samples:
+            count = self.samples
+        rows = (np.arange(self.index - count, self.index)) % self.size
+        return self.ts[rows], self.values[rows]
+
+    # Append the buffer contents as CSV rows <ts>,<channel 0>,...,<channel n-1> to 'filename'
+    # 'ts_offset' is added to the timestamps, e.g. to convert monotonic to unix time.
+    def save(self, filename, ts_offset=0):
+        ts, values = self.latest()
+        with open(filename, "a") as fp:
+            for i in range(len(ts)):
+                fp.write("{:.3f},{}\n".format(ts[i] + ts_offset, ",".join([ "{:.1f}".format(v) for v in values[i] ])))
+
+class CalibrationModel(object):
+
+    def __init__(self, settings=None, cell_count=4):
+        self.settings = settings
+        self.cell_count = cell_count
+
+        weight_factor = settings["WEIGHT_FACTOR"] if settings is not None and "WEIGHT_FACTOR" in settings else 1
+
+        self.gain = np.full(cell_count, 1.0 / weight_factor)
+        self.offset = np.zeros(cell_count)
+        self.bias = 0.0
+        self.drift = 0.0
+        self.ref_temperature = 20.0
+
+    # Set the per-cell raw offsets, e.g. from the tare readings
+    def set_offset(self, offset_list):
+        self.offset = np.array(offset_list, dtype=float)
+
+    # Return the weight in grams for raw readings 'raw' (cell_count values, or an N x cell_count array)
+    # 'temperature' in degrees C (or an array of N temperatures) or None if not available.
+    def apply(self, raw, temperature=None):
+        weight = np.dot(np.asarray(raw, dtype=float) - self.offset, self.gain) + self.bias
+        if temperature is not None and self.drift != 0:
+            weight = weight + self.drift * (np.asarray(temperature) - self.ref_temperature)
+        return weight
+
+    # Least-squares fit of gain, bias and drift to raw readings (N x cell_count) with known weights (N).
+    # 'temperature' is an array of N temperatures (may include nan) or None, in which case drift is not fitted.
+    # Returns the array of residuals (grams) of the fitted model.
+    def fit(self, raw, temperature, weight):
+        x = np.asarray(raw, dtype=float) - self.offset
+        weight = np.asarray(weight, dtype=float)
+
+        columns = [ x, np.ones((len(weight), 1)) ]
+
+        fit_drift = temperature is not None and not np.any(np.isnan(temperature))
+        if fit_drift:
+            temperature = np.asarray(temperature, dtype=float)
+            self.ref_temperature = float(np.mean(temperature))
+            columns.append((temperature - self.ref_temperature).reshape(-1, 1))
+
+        a = np.hstack(columns)
+        coefficients, residuals, rank, singular_values = np.linalg.lstsq(a, weight, rcond=None)
+
+        self.gain = coefficients[:self.cell_count]
+        self.bias = float(coefficients[self.cell_count])
+        self.drift = float(coefficients[self.cell_count + 1]) if fit_drift else 0.0
+
+        return self.apply(raw, temperature if fit_drift else None) - weight
+
+    # Load the model from a json file, return True if successful
+    def load(self, filename):
+        try:
+            with open(filename, "r") as fp:
+                model = json.loads(fp.read())
+            self.gain = np.array(model["gain"], dtype=float)
+            if "offset" in model:
+                self.offset = np.array(model["offset"], dtype=float)
+            self.bias = model.get("bias", 0.0)
+            self.drift = model.get("drift", 0.0)
+            self.ref_temperature = model.get("ref_temperature", self.ref_temperature)
+            print("LOADED CALIBRATION FILE {}".format(filename))
+            return True
+        except Exception as e:
+            print("READ CALIBRATION FILE ERROR. Can't read supplied filename {}".format(filename))
+            print(e)
+        return False
+
+    # Save the model as a json file
+    def save(self, filename):
+        model = { "acp_ts": time.time(),
+                  "gain": self.gain.tolist(),
+                  "offset": self.offset.tolist(),
+                  "bias": self.bias,
+                  "drift": self.drift,
+                  "ref_temperature": self.ref_temperature
+                }
+        with open(filename, "w") as fp:
+            fp.write(json.dumps(model, indent=4))
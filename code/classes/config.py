@@ -1,7 +1,20 @@
-
 # ----------------------------------------------------------------------
 # ----------------------------------------------------------------------
 # Startup config
+#
+# settings = Config(filename).settings - the settings of config/sensor_config.json overlaid with those of
+# 'filename' (if not None), as a Settings object.
+#
+# Each file is checked against SETTINGS_SCHEMA: a setting with the wrong type raises NameError, and the
+# settings marked required must be in the merged result. A setting not in the schema is only warned about.
+#
+# A Settings object is a read-only dictionary (settings["LOG_LEVEL"], "X" in settings, settings.get(),
+# { **settings } all work as before), with the most used settings also as attributes, i.e.
+#   settings.log_level, settings.sensor_id, settings.weight_sensor_id
+# settings.replace(LOG_LEVEL=1, ...) returns a new (checked) Settings with those changes.
+#
+# The classes on the per-sample path (TimeBuffer, Events, Station, LocalSensor) copy the settings they use
+# into attributes when they are created, so a reading costs no settings lookups.
 # ----------------------------------------------------------------------
 # ----------------------------------------------------------------------
 
@@ -10,6 +23,186 @@ import simplejson as json
 # loads settings from sensor.json or argv[1]
 CONFIG_FILENAME = "config/sensor_config.json"
 
+NUMBER = (int, float)
+
+# setting name -> ( allowed types, required )
+SETTINGS_SCHEMA = {
+    "LOG_LEVEL": (int, True),
+    "LOG_FILE": (str, False),
+    "LOG_BUFFER_SIZE": (int, False),
+    "LOG_FLUSH_PERIOD": (NUMBER, False),
+    "VERSION": (str, False),
+
+    "SENSOR_ID": (str, True),
+    "SENSOR_TYPE": (str, True),
+    "WEIGHT_SENSOR_ID": (str, True),
+    "GRIND_SENSOR_ID": (str, True),
+    "BREW_SENSOR_ID": (str, True),
+    "STATIONS": (list, False),
+    "SENSORS": (list, False),
+
+    "PLATFORM_HOST": (str, True),
+    "PLATFORM_PORT": (int, True),
+    "PLATFORM_USER": (str, True),
+    "PLATFORM_PASSWORD": (str, True),
+
+    "SENSOR_HOST": (str, True),
+    "SENSOR_PORT": (int, True),
+    "SENSOR_USER": (str, True),
+    "SENSOR_PASSWORD": (str, True),
+    "SENSOR_TOPIC": (str, False),
+
+    "UPLINK": (str, False),
+    "SENSOR_LINK": (str, False),
+    "INGEST_LINK": (str, False),
+    "UPLINK_RECONNECT_MIN": (NUMBER, False),
+    "UPLINK_RECONNECT_MAX": (NUMBER, False),
+    "UPLINK_QUEUE_SIZE": (int, False),
+
+    "TARE_FILENAME": (str, True),
+    "WEIGHT_FACTOR": (NUMBER, True),
+    "TARE_WIDTH": (NUMBER, True),
+    "TARE_READINGS": (list, True),
+    "TARE_TRACKING": (bool, False),
+    "TARE_STABLE_SECONDS": (NUMBER, False),
+    "TARE_SMOOTHING": (NUMBER, False),
+    "TARE_SAVE_PERIOD": (NUMBER, False),
+    "CALIBRATION_FILENAME": (str, False),
+    "TEMPERATURE_FILENAME": (str, False),
+    "HX711_PINS": (list, False),
+    "WEIGHT_FULL": (NUMBER, True),
+    "WEIGHT_EMPTY": (NUMBER, True),
+
+    "FEEDMAKER_URL": (str, True),
+    "FEEDMAKER_HEADER_KEY": (str, True),
+    "FEEDMAKER_HEADER_VALUE": (str, True),
+
+    "WATCHDOG_PERIOD": (NUMBER, True),
+
+    "SAMPLE_PERIOD": (NUMBER, True),
+    "SAMPLE_SAVE_COUNT": (int, False),
+    "SAMPLE_FILTER": (str, False),
+    "SAMPLE_FILTER_PARAMS": (dict, False),
+    "SAMPLE_ADAPTIVE": (bool, False),
+    "SAMPLE_IDLE_SECONDS": (NUMBER, False),
+    "SAMPLE_IDLE_PERIOD": (NUMBER, False),
+    "SAMPLE_IDLE_DEVIATION": (NUMBER, False),
+    "SAMPLE_WAKE_DELTA": (NUMBER, False),
+    "CLOCK_SMOOTHING": (NUMBER, False),
+    "CLOCK_JUMP_SECONDS": (NUMBER, False),
+
+    "SIMULATE_WEIGHT": (bool, False),
+    "SIMULATE_DISPLAY": (bool, False),
+    "SIMULATE_UPLINK": (bool, False),
+    "SIMULATE_SENSORS": (bool, False),
+    "SIMULATE_INGEST": (bool, False),
+    "WEIGHT_CSV_FILE": (str, False),
+    "RAW_CSV_FILE": (str, False),
+
+    "STARTUP_DELAY": (NUMBER, False),
+    "PROFILE_STARTUP": (bool, False),
+
+    "DISPLAY": (bool, False),
+    "DISPLAY_CHART": (bool, False),
+    "DISPLAY_THREAD": (bool, False),
+    "SPRITE_CACHE_DIR": (str, False),
+
+    # The display layout, see DISPLAY_SETTINGS in display.py
+    "VALUE_X": (int, False),
+    "VALUE_Y": (int, False),
+    "VALUE_WIDTH": (int, False),
+    "VALUE_HEIGHT": (int, False),
+    "VALUE_COLOR_FG": (str, False),
+    "VALUE_COLOR_BG": (str, False),
+    "VALUE_RIGHT_MARGIN": (int, False),
+    "NEW_X": (int, False),
+    "NEW_Y": (int, False),
+    "NEW_WIDTH": (int, False),
+    "NEW_HEIGHT": (int, False),
+    "OLD_COLOR_FG": (str, False),
+    "OLD_COLOR_BG": (str, False),
+    "NEW_COLOR_FG": (str, False),
+    "NEW_COLOR_BG": (str, False),
+    "POT_X": (int, False),
+    "POT_Y": (int, False),
+    "POT_FG": (str, False),
+    "POT_BG": (str, False),
+    "POT_ZERO_RATIO": (NUMBER, False),
+    "EVENT_X": (int, False),
+    "EVENT_Y": (int, False),
+    "EVENT_WIDTH": (int, False),
+    "EVENT_HEIGHT": (int, False),
+    "EVENT_COUNT": (int, False),
+    "EVENT_COLOR_BG": (str, False),
+    "CHART_X": (int, False),
+    "CHART_Y": (int, False),
+    "CHART_WIDTH": (int, False),
+    "CHART_HEIGHT": (int, False),
+    "CHART_MAX_WEIGHT": (NUMBER, False),
+    "CHART_SCROLL": (bool, False)
+}
+
+# Raise NameError if a setting in 'settings' has a type not allowed by the SETTINGS_SCHEMA,
+# 'source' (e.g. the filename) is given in the error. None is allowed for the settings that are not required.
+def check_settings(settings, source="settings"):
+    for name, value in settings.items():
+        if not name in SETTINGS_SCHEMA:
+            continue
+        types, required = SETTINGS_SCHEMA[name]
+        if value is None and not required:
+            continue
+        # bool is an int, but e.g. "LOG_LEVEL": true is a mistake
+        if not isinstance(value, types) or (isinstance(value, bool) and types is not bool):
+            raise NameError("Bad setting in {}: {} = {}".format(source, name, json.dumps(value)))
+
+    # Each STATIONS entry overlays the settings, so is checked too
+    if "STATIONS" in settings and not settings["STATIONS"] is None:
+        for index, station in enumerate(settings["STATIONS"]):
+            if not isinstance(station, dict):
+                raise NameError("Bad setting in {}: STATIONS entry {} is not an object".format(source, index))
+            check_settings(station, "{} STATIONS entry {}".format(source, index))
+
+# Return the names of the settings not in the SETTINGS_SCHEMA
+def unknown_settings(settings):
+    return [ name for name in settings if not name in SETTINGS_SCHEMA ]
+
+class Settings(dict):
+
+    __slots__ = ( "log_level", "sensor_id", "weight_sensor_id" )
+
+    def __init__(self, settings=None, **changes):
+        super().__init__({} if settings is None else settings, **changes)
+        check_settings(self)
+
+        object.__setattr__(self, "log_level", dict.get(self, "LOG_LEVEL", 2))
+        object.__setattr__(self, "sensor_id", dict.get(self, "SENSOR_ID"))
+        object.__setattr__(self, "weight_sensor_id", dict.get(self, "WEIGHT_SENSOR_ID"))
+
+    # Return a new Settings with the 'changes', e.g. settings.replace(LOG_LEVEL=1)
+    def replace(self, **changes):
+        return Settings(self, **changes)
+
+    def read_only(self, *args, **kwargs):
+        raise TypeError("Settings are read-only, use settings.replace()")
+
+    __setitem__ = read_only
+    __delitem__ = read_only
+    __ior__ = read_only
+    __setattr__ = read_only
+    __delattr__ = read_only
+    clear = read_only
+    pop = read_only
+    popitem = read_only
+    setdefault = read_only
+    update = read_only
+
+    # e.g. for the replay worker processes
+    def __reduce__(self):
+        return ( Settings, ( dict(self), ) )
+
+    def __repr__(self):
+        return "Settings({})".format(dict.__repr__(self))
+
 class Config(object):
 
     def __init__(self,filename=None):
@@ -30,12 +223,23 @@ class Config(object):
             else:
                 config_dictionary = {}
 
-            # here's the clever bit... merge entries from file in to CONFIG dictionary
-            self.settings = { **prod_dictionary, **config_dictionary }
-            print("Config loaded {} LOG_LEVEL={}".format(filename,self.settings["LOG_LEVEL"]))
-
         except Exception as e:
             print("READ CONFIG FILE ERROR. Can't read supplied filename {}".format(filename))
             print(e)
+            return
+
+        # Each file is checked, so the error names it
+        check_settings(prod_dictionary, CONFIG_FILENAME)
+        check_settings(config_dictionary, filename)
+
+        # here's the clever bit... merge entries from file in to CONFIG dictionary
+        self.settings = Settings({ **prod_dictionary, **config_dictionary })
+
+        for name, (types, required) in SETTINGS_SCHEMA.items():
+            if required and self.settings.get(name) is None:
+                raise NameError("Bad config, missing setting: {}".format(name))
 
+        for name in unknown_settings(self.settings):
+            print("Config unknown setting {} (ignored)".format(name))
 
+        print("Config loaded {} LOG_LEVEL={}".format(filename,self.settings["LOG_LEVEL"]))
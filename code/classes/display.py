@@ -15,19 +15,57 @@ from PIL import ImageFont
 from PIL import ImageColor
 
 from classes.events import EventCode
+from classes.sprite_cache import SpriteCache
+from classes.render_thread import RenderThread
+
+# The fonts are loaded on first use by font(name), not at import
+FONT_FILENAME = 'fonts/Ubuntu-Regular.ttf'
+FONT_SIZES = { "VALUE": 30, "NEW": 22, "EVENT": 12, "DEBUG": 14 }
+FONTS = {}
+
+# Return the font 'name' from FONT_SIZES, loading it if this is the first use
+def font(name):
+    if not name in FONTS:
+        FONTS[name] = ImageFont.truetype(FONT_FILENAME, FONT_SIZES[name])
+    return FONTS[name]
+
+# The text sizes from ImageDraw.textsize(), by ( text, font name ), see text_size()
+TEXT_SIZES = {}
+TEXT_SIZES_MAX = 1000 # the cache is emptied when it reaches this size, e.g. after many event times
+
+# Return the ( width, height ) of 'text' in font 'font_name' drawn with ImageDraw 'draw'
+def text_size(draw, text, font_name):
+    key = ( text, font_name )
+    size = TEXT_SIZES.get(key)
+    if size is None:
+        if len(TEXT_SIZES) >= TEXT_SIZES_MAX:
+            TEXT_SIZES.clear()
+        size = draw.textsize(text, font=font(font_name))
+        TEXT_SIZES[key] = size
+    return size
+
+# A display region's RGB image and ImageDraw, created once and cleared in place for each redraw
+class RegionImage(object):
+
+    def __init__(self, w, h):
+        self.w = w
+        self.h = h
+        self.image = Image.new("RGB", (w, h))
+        self.draw = ImageDraw.Draw(self.image)
 
-VALUE_FONT = ImageFont.truetype('fonts/Ubuntu-Regular.ttf', 30)
-NEW_FONT = ImageFont.truetype('fonts/Ubuntu-Regular.ttf', 22)
-EVENT_FONT = ImageFont.truetype('fonts/Ubuntu-Regular.ttf', 12)
-DEBUG_FONT = ImageFont.truetype('fonts/Ubuntu-Regular.ttf', 14)
+    # Fill the image with 'color', returning the ImageDraw
+    def clear(self, color):
+        self.draw.rectangle((0, 0, self.w - 1, self.h - 1), fill=color)
+        return self.draw
 
 # ST7735 color mappings
 str_to_color = { "YELLOW": 0xFFE0,    # yellow 565 RGB
                  "BLUE": 0x001F    # blue 565 RGB
                }
 
-CHART_SETTINGS = { "x": 0, "y": 100, "w": 160, "h": 28, # 'pixels' top-left coords and width, height.
-                "step": 1,             # 'pixels': how many pixels to step in x direction for next()
+# The real-time weight chart, enabled with settings["DISPLAY_CHART"] = True. The position and size
+# are given by the CHART_X, CHART_Y, CHART_WIDTH, CHART_HEIGHT display settings.
+CHART_SETTINGS = { "step": 1,             # 'pixels': how many pixels to step in x direction for next()
                 "time_scale": 0.1,      # 'seconds per pixel' x-scale for Bar add_time(timestamp, height_pixels )
                 "bar_width": 1,        # 'pixels', width of value column
                 "point_height": None,  # 'pixels', will display point of this height, not column to x-axis
@@ -69,31 +107,61 @@ DISPLAY_SETTINGS = {
     "EVENT_WIDTH": 101,
     "EVENT_HEIGHT": 12,
     "EVENT_COUNT": 6,
-    "EVENT_COLOR_BG": "blue"
+    "EVENT_COLOR_BG": "blue",
+
+    # Weight chart (if DISPLAY_CHART), 101 x 36 above the events
+    "CHART_X": 59,
+    "CHART_Y": 28,
+    "CHART_WIDTH": 101,
+    "CHART_HEIGHT": 36,
+    "CHART_MAX_WEIGHT": 5000, # grams at the top of the chart
+    "CHART_SCROLL": False # use the LCD hardware scroll, needs a full height chart (CHART_Y 0, CHART_HEIGHT 128)
+}
 
+# With DISPLAY_CHART the chart takes the top of the events area, leaving three events below it
+CHART_DISPLAY_SETTINGS = {
+    "EVENT_Y": 64,
+    "EVENT_COUNT": 3
 }
 
 class Display(object):
 
     def __init__(self, settings=None):
 
-        if settings is None or settings["SIMULATE_DISPLAY"]:
-            from st7735_ijl20.st7735_emulator import ST7735_EMULATOR as ST7735
-        else:
-            from st7735_ijl20.st7735 import ST7735
-
         if settings is not None:
             self.settings = { **DISPLAY_SETTINGS, **settings }
         else:
             self.settings = DISPLAY_SETTINGS
 
+        self.chart = None
+        self.renderer = None
+        if "DISPLAY_CHART" in self.settings and self.settings["DISPLAY_CHART"]:
+            self.settings = { **DISPLAY_SETTINGS, **CHART_DISPLAY_SETTINGS, **settings }
+
         # Disable LCD display updates (e.g. for faster execution) if "DISPLAY": False in settings
         if 'DISPLAY' in self.settings and self.settings['DISPLAY'] == False:
             return
 
+        # The LCD driver (or emulator, which uses pygame) is only imported when the display is used
+        if settings is None or settings["SIMULATE_DISPLAY"]:
+            from st7735_ijl20.st7735_emulator import ST7735_EMULATOR as ST7735
+        else:
+            from st7735_ijl20.st7735 import ST7735
+
         if not "LOG_LEVEL" in self.settings:
             self.settings["LOG_LEVEL"] = 2
 
+        # After begin() the drawing is done on a RenderThread (see render_thread.py), so the LCD never blocks
+        # the sensor loop, unless "DISPLAY_THREAD": false. The emulator (pygame) is drawn on the main thread
+        # unless DISPLAY_THREAD is set.
+        if "DISPLAY_THREAD" in self.settings:
+            threaded = self.settings["DISPLAY_THREAD"]
+        else:
+            threaded = not (settings is None or settings["SIMULATE_DISPLAY"])
+
+        if threaded:
+            self.renderer = RenderThread(self.settings)
+
         t_start = time.process_time()
 
         self.prev_lcd_time = None
@@ -101,18 +169,32 @@ class Display(object):
         # initialize display events list (all to None)
         self.events = [None] * self.settings["EVENT_COUNT"]
 
+        # The images for each region of the display, reused for every redraw
+        self.value_image = RegionImage(self.settings["VALUE_WIDTH"], self.settings["VALUE_HEIGHT"])
+        self.new_image = RegionImage(self.settings["NEW_WIDTH"], self.settings["NEW_HEIGHT"])
+        self.events_image = RegionImage(self.settings["EVENT_WIDTH"],
+                                        self.settings["EVENT_HEIGHT"] * self.settings["EVENT_COUNT"])
+        self.event_image = RegionImage(self.settings["EVENT_WIDTH"], self.settings["EVENT_HEIGHT"])
+        self.debug_image = None # created on first draw_debug()
+
+        self.value_string = None # the value string on the display, so an unchanged value isn't redrawn
+
         self.LCD = ST7735()
 
         self.LCD.begin()
 
-        image = Image.open('images/pot.bmp')
+        # The images are loaded as ready-to-send RGB565 bytes, see sprite_cache.py
+        self.sprites = SpriteCache(self.settings)
+
         #LCD.LCD_PageImage(image)
-        self.LCD.display(image)
+        self.LCD.set_window(0, 0, self.LCD.width, self.LCD.height)
+        self.LCD.send_data(self.sprites.load('images/pot.bmp'))
 
         self.pot = Pot(LCD=self.LCD,
                        x=self.settings["POT_X"],
                        y=self.settings["POT_Y"],
-                       settings=self.settings)
+                       settings=self.settings,
+                       sprites=self.sprites)
 
         print("init_lcd in {:.3f} sec.".format(time.process_time() - t_start))
 
@@ -123,27 +205,35 @@ class Display(object):
         # Disable LCD display updates (e.g. for faster execution) if "DISPLAY": False in settings
         if 'DISPLAY' in self.settings and self.settings['DISPLAY'] == False:
             return
-        # here we disable the real-time chart
-        #self.chart = self.LCD.add_chart(CHART_SETTINGS)
-
         self.clear_events()
+
+        # The real-time weight chart, see st7735_ijl20/chart.py
+        if "DISPLAY_CHART" in self.settings and self.settings["DISPLAY_CHART"]:
+            self.chart = self.LCD.add_chart({ **CHART_SETTINGS,
+                                              "x": self.settings["CHART_X"],
+                                              "y": self.settings["CHART_Y"],
+                                              "w": self.settings["CHART_WIDTH"],
+                                              "h": self.settings["CHART_HEIGHT"],
+                                              "scroll": self.settings["CHART_SCROLL"] })
         
         self.pot.begin()
 
         self.update_old()
 
+        if not self.renderer is None:
+            self.renderer.start()
+
+    # Call draw(*args), on the RenderThread if we have one, where it replaces any draw waiting for 'region'
+    def render(self, region, draw, *args):
+        if self.renderer is None:
+            draw(*args)
+        else:
+            self.renderer.post(region, draw, *args)
+
     # -------------------------------------------------------------------
     # ------ DRAW NUMERIC VALUE ON LCD  ---------------------------------
     # -------------------------------------------------------------------
     def draw_value(self, value):
-        # create a blank image to write the weight on
-        image = Image.new( "RGB",
-                           ( self.settings["VALUE_WIDTH"],
-                             self.settings["VALUE_HEIGHT"]),
-                           self.settings["VALUE_COLOR_BG"])
-
-        draw = ImageDraw.Draw(image)
-
         # convert weight to string with fixed 5 digits including 1 decimal place, max 9999.9
 
         display_number = value
@@ -153,14 +243,22 @@ class Display(object):
 
         draw_string = "{:5.0f}".format(display_number) # 10 points for witty variable name
 
+        if draw_string == self.value_string:
+            return
+        self.value_string = draw_string
+
+        # clear the value image to write the weight on
+        image = self.value_image.image
+        draw = self.value_image.clear(self.settings["VALUE_COLOR_BG"])
+
         # calculate x coordinate necessary to right-justify text
-        string_width, string_height = draw.textsize(draw_string, font=VALUE_FONT)
+        string_width, string_height = text_size(draw, draw_string, "VALUE")
 
         # embed this number into the blank image we created earlier
         draw.text((self.settings["VALUE_WIDTH"]-string_width-self.settings["VALUE_RIGHT_MARGIN"],-4),
                 draw_string,
                 fill = self.settings["VALUE_COLOR_FG"],
-                font=VALUE_FONT)
+                font=font("VALUE"))
 
         # display image on screen at coords x,y. (0,0)=top left.
         self.LCD.display_window(image,
@@ -178,19 +276,18 @@ class Display(object):
         fg=self.settings["OLD_COLOR_FG"]
         bg=self.settings["OLD_COLOR_BG"]
 
-        # create a blank image to write the weight on
-        image = Image.new( "RGB", ( self.settings["NEW_WIDTH"], self.settings["NEW_HEIGHT"]), bg)
-
-        draw = ImageDraw.Draw(image)
+        # clear the image to write the message on
+        image = self.new_image.image
+        draw = self.new_image.clear(bg)
 
         # calculate x coordinate necessary to center text
-        string_width, string_height = draw.textsize(new_str, font=NEW_FONT)
+        string_width, string_height = text_size(draw, new_str, "NEW")
 
         # embed this number into the blank image we created earlier
         draw.text((math.floor((self.settings["NEW_WIDTH"] - string_width)/2),1),
                 new_str,
                 fill=fg,
-                font=NEW_FONT)
+                font=font("NEW"))
 
         # display image on screen at coords x,y. (0,0)=top left.
         self.LCD.display_window(image,
@@ -205,20 +302,22 @@ class Display(object):
     def draw_debug(self, debug_list):
         # display a two-line debug display of the weights from both load cells
         if self.settings["LOG_LEVEL"] <= 2:
-            image = Image.new("RGB", (160, 40), "BLACK")
-            draw = ImageDraw.Draw(image)
+            if self.debug_image is None:
+                self.debug_image = RegionImage(160, 40)
+            image = self.debug_image.image
+            draw = self.debug_image.clear("BLACK")
 
             draw_string = "{:5.1f}".format(debug_list[0])
-            draw.text((75,0), draw_string, fill="YELLOW", font=DEBUG_FONT)
+            draw.text((75,0), draw_string, fill="YELLOW", font=font("DEBUG"))
 
             draw_string = "{:5.1f}".format(debug_list[1])
-            draw.text((75,20), draw_string, fill="YELLOW", font=DEBUG_FONT)
+            draw.text((75,20), draw_string, fill="YELLOW", font=font("DEBUG"))
 
             draw_string = "{:5.1f}".format(debug_list[2])
-            draw.text((0,20), draw_string, fill="YELLOW", font=DEBUG_FONT)
+            draw.text((0,20), draw_string, fill="YELLOW", font=font("DEBUG"))
 
             draw_string = "{:5.1f}".format(debug_list[3])
-            draw.text((0,0), draw_string, fill="YELLOW", font=DEBUG_FONT)
+            draw.text((0,0), draw_string, fill="YELLOW", font=font("DEBUG"))
 
             self.LCD.display_window(image, 0, 40, 160, 40)
 
@@ -226,15 +325,12 @@ class Display(object):
     # ------ DRAW EVENTS ON LCD       ---------------------------
     # -------------------------------------------------------------------
     def clear_events(self):
-        # create a blank image
+        # clear the events image
         w = self.settings["EVENT_WIDTH"]
         h = self.settings["EVENT_HEIGHT"] * self.settings["EVENT_COUNT"]
 
-        image = Image.new( "RGB",
-                           (w,h),
-                           self.settings["EVENT_COLOR_BG"])
-
-        draw = ImageDraw.Draw(image)
+        image = self.events_image.image
+        self.events_image.clear(self.settings["EVENT_COLOR_BG"])
 
         # display image on screen at coords x,y. (0,0)=top left.
         self.LCD.display_window(image,
@@ -245,6 +341,9 @@ class Display(object):
 
     # Add the event to the event area
     def update_event(self,ts,event):
+        # Disable LCD display updates (e.g. for faster execution) if "DISPLAY": False in settings
+        if 'DISPLAY' in self.settings and self.settings['DISPLAY'] == False:
+            return
         #print("Display.update_event {} {}".format(ts,event))
         # get 'displayname' for the event to display
         try:
@@ -261,19 +360,22 @@ class Display(object):
         # store latest event
         self.events[0] = { "ts": ts, "event": event }
 
-        for i in range(self.settings["EVENT_COUNT"]):
-            self.draw_event(i)
+        self.render("events", self.draw_events, list(self.events))
 
+    # Draw the list of displayed 'events', most recent first
+    def draw_events(self, events):
+        for i in range(self.settings["EVENT_COUNT"]):
+            self.draw_event(events, i)
 
-    def draw_event(self, index):
-        if self.events[index] is None:
+    def draw_event(self, events, index):
+        if events[index] is None:
             return
         x = self.settings["EVENT_X"]
         y = self.settings["EVENT_Y"] + (self.settings["EVENT_COUNT"]-index-1) * self.settings["EVENT_HEIGHT"]
         w = self.settings["EVENT_WIDTH"]
         h = self.settings["EVENT_HEIGHT"]
 
-        event_code = self.events[index]["event"]["event_code"]
+        event_code = events[index]["event"]["event_code"]
 
         #print("Display.draw_event",event_code)
 
@@ -285,7 +387,7 @@ class Display(object):
             return
 
         # get the timestamp for the event, and convert to HH:MM
-        event_ts = self.events[index]["ts"]
+        event_ts = events[index]["ts"]
 
         # record time as HH:MM from ts
         time_str = datetime.fromtimestamp(event_ts,timezone('Europe/London')).strftime("%H:%M")
@@ -293,7 +395,7 @@ class Display(object):
         # If the event_code has a "value" key (e.g. = "weight_new"), append the value to the display text
         value_text = ""
         if "value" in EventCode.INFO[event_code]:
-            value_text = " "+str(self.events[index]["event"][EventCode.INFO[event_code]["value"]])
+            value_text = " "+str(events[index]["event"][EventCode.INFO[event_code]["value"]])
 
         fg = "YELLOW"
         if event_code == EventCode.NEW:
@@ -306,20 +408,20 @@ class Display(object):
 
         event_str = event_text + value_text + " |" +  time_str
 
-        # make the w x h empty image we're going to paint the text string onto
-        image = Image.new("RGB", (w, h), bg)
+        # clear the w x h event image we're going to paint the text string onto
+        image = self.event_image.image
 
-        # create a 'Draw' context for the .text()
-        draw = ImageDraw.Draw(image)
+        # the 'Draw' context for the .text()
+        draw = self.event_image.clear(bg)
 
         # calculate x coordinate necessary to right-justify text
-        string_width, string_height = draw.textsize(event_str, font=EVENT_FONT)
+        string_width, string_height = text_size(draw, event_str, "EVENT")
 
         # add text to image - we adjust y offset -2 for better fit, set x to right-justify
         draw.text((w - string_width,-2), # (x,y) of text top-left
                   event_str,             # string to display
                   fill=fg,               # (foreground) color of text 
-                  font=EVENT_FONT)       # character font
+                  font=font("EVENT"))       # character font
 
         self.LCD.display_window(image,x,y,w,h)
 
@@ -328,6 +430,10 @@ class Display(object):
         # Disable LCD display updates (e.g. for faster execution) if "DISPLAY": False in settings
         if 'DISPLAY' in self.settings and self.settings['DISPLAY'] == False:
             return
+
+        self.render("new", self.draw_new, ts)
+
+    def draw_new(self, ts):
         # record time as HH:MM from ts
         time_str = datetime.fromtimestamp(ts,timezone('Europe/London')).strftime("%H:%M")
         # create message for display e.g. "BREWED 11:27"
@@ -335,19 +441,18 @@ class Display(object):
         fg=self.settings["NEW_COLOR_FG"]
         bg = "GREEN"
 
-        # create a blank image to write the weight on
-        image = Image.new( "RGB", ( self.settings["NEW_WIDTH"], self.settings["NEW_HEIGHT"]), bg)
-
-        draw = ImageDraw.Draw(image)
+        # clear the image to write the message on
+        image = self.new_image.image
+        draw = self.new_image.clear(bg)
 
         # calculate x coordinate necessary to center text
-        string_width, string_height = draw.textsize(new_str, font=NEW_FONT)
+        string_width, string_height = text_size(draw, new_str, "NEW")
 
         # embed this number into the blank image we created earlier
         draw.text((math.floor((self.settings["NEW_WIDTH"] - string_width)/2),1),
                 new_str,
                 fill=fg,
-                font=NEW_FONT)
+                font=font("NEW"))
 
         # display image on screen at coords x,y. (0,0)=top left.
         self.LCD.display_window(image,
@@ -380,7 +485,7 @@ class Display(object):
                 if sample_median > self.settings["WEIGHT_EMPTY"] + 30:
                     display_value = sample_median - self.settings["WEIGHT_EMPTY"]
 
-                self.draw_value(display_value)
+                self.render("value", self.draw_value, display_value)
 
                 # if level is stable then update pot level
                 if not sample_deviation is None and sample_deviation < 30:
@@ -391,7 +496,7 @@ class Display(object):
                     elif pot_ratio < self.settings["POT_ZERO_RATIO"]: # Force to zero if little coffee in pot
                         pot_ratio = 0
 
-                    self.pot.update(pot_ratio)
+                    self.render("pot", self.pot.update, pot_ratio)
 
             self.prev_lcd_time = ts
 
@@ -408,26 +513,36 @@ class Display(object):
         # ------ ADD CURRENT WEIGHT TO BAR CHART   --------------------------
         # -------------------------------------------------------------------
 
+        if self.chart is None:
+            return
+
         latest_sample = sample_buffer.get(0)
         if not latest_sample == None:
-            # debug: need to link these constants to the actual bar settings...
-            BAR_MAX_G = 5000
-            BAR_MAX_Y = 40
+            bar_max_y = self.settings["CHART_HEIGHT"]
 
             # Create a bar height proportional to the value, capped at bottom and top of chart.
-            bar_height = math.floor(latest_sample["value"] / BAR_MAX_G * BAR_MAX_Y )
+            bar_height = math.floor(latest_sample["value"] / self.settings["CHART_MAX_WEIGHT"] * bar_max_y )
 
-            if bar_height > BAR_MAX_Y:
-                bar_height = BAR_MAX_Y
+            if bar_height > bar_max_y:
+                bar_height = bar_max_y
             elif bar_height < 1:
                 bar_height = 1
 
-            # This is a bar-per-sample. Could use time on x-axis.
-            #self.chart.next(bar_height)
-            # here we disable the real-time chart
-            #self.chart.add_time(ts, bar_height)
+            # Time on the x-axis (self.chart.next(bar_height) would give a bar-per-sample).
+            # Every point is drawn, i.e. the chart points are appended rather than replaced on the RenderThread.
+            if self.renderer is None:
+                self.chart.add_time(ts, bar_height)
+            else:
+                self.renderer.append("chart", self.draw_chart, ( ts, bar_height ))
+
+    # Add the list of ( ts, bar_height ) 'points' to the chart
+    def draw_chart(self, points):
+        for ts, bar_height in points:
+            self.chart.add_time(ts, bar_height)
 
     def finish(self):
+        if not self.renderer is None:
+            self.renderer.finish()
         self.LCD.cleanup()
 
 # Vertical bar display object
@@ -488,9 +603,13 @@ class VerticalBar(object):
 # Coffee Pot display object
 class Pot(object):
 
-    def __init__(self, LCD=None, x=0, y=28, settings=None):
+    def __init__(self, LCD=None, x=0, y=28, settings=None, sprites=None):
         self.LCD = LCD
 
+        if sprites is None:
+            sprites = SpriteCache(settings)
+        self.sprites = sprites
+
         # set pot coordinates on display
         self.x = x
         self.y = y
@@ -500,25 +619,14 @@ class Pot(object):
         self.bar_h = self.h - 52
         self.BG_COLOR = 0xFFFF
         self.FG_COLOR = 0x4145
-        self.custom = [ self.LCD.image_to_data(Image.open('images/pot_0.png')),
-                  self.LCD.image_to_data(Image.open('images/pot_1.png')),
-                  self.LCD.image_to_data(Image.open('images/pot_2.png')),
-                  self.LCD.image_to_data(Image.open('images/pot_3.png')),
-                  self.LCD.image_to_data(Image.open('images/pot_4.png')),
-                  self.LCD.image_to_data(Image.open('images/pot_5.png')),
-                  self.LCD.image_to_data(Image.open('images/pot_6.png')),
-                  self.LCD.image_to_data(Image.open('images/pot_7.png')),
-                  self.LCD.image_to_data(Image.open('images/pot_8.png')),
-                  self.LCD.image_to_data(Image.open('images/pot_9.png'))
-        ]
-        self.level_top = self.LCD.image_to_data(Image.open('images/pot_top.png'))
-        self.level_base = self.LCD.image_to_data(Image.open('images/pot_0_normal.png'))
+        self.custom = [ self.sprites.load('images/pot_{}.png'.format(i)) for i in range(10) ]
+        self.level_top = self.sprites.load('images/pot_top.png')
+        self.level_base = self.sprites.load('images/pot_0_normal.png')
 
     def begin(self):
         # 59 x 100
-        image = Image.open('images/pot_background.png')
-
-        self.LCD.display_window(image, self.x, self.y, self.w, self.h)
+        self.LCD.set_window(self.x, self.y, self.w, self.h)
+        self.LCD.send_data(self.sprites.load('images/pot_background.png'))
 
         # These vars keep track of the previous level set, so we can optimise update()
         # record whether the previous reading was a custom image
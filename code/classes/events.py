@@ -8,6 +8,9 @@
 # Provides a ".test(ts,sensor_id)" method which is called on *every* data tick,
 # and returns a (typically empty) list of events.
 #
+# The detectors run for each sensor_id are set from the sensor registry (see sensor_registry.py),
+# or with add_sensor(sensor_id, detectors, params).
+#
 # Each event is a python dictionary, e.g.
 # { "event_code": EventCode.EMPTY, "weight": weight, "acp_confidence": confidence }
 #
@@ -18,7 +21,9 @@
 
 import math
 
-from classes.time_buffer import TimeBuffer
+from classes.time_buffer import TimeBuffer, RollupBuffer
+from classes.sensor_registry import load_sensor_registry
+from classes.log import Log
 
 # COFFEE POT CONSTANTS
 class EventCode(object):
@@ -35,6 +40,11 @@ class EventCode(object):
     STATUS = "COFFEE_STATUS"
     GRIND_STATUS = "GRIND_STATUS"
     BREW_STATUS = "BREW_STATUS"
+    SENSOR_STATUS = "SENSOR_STATUS" # latest reading from any other RemoteSensor in the registry
+
+    # Power switched on/off at any other RemoteSensor (e.g. a milk fridge plug)
+    SENSOR_POWER_ON = "SENSOR_POWER_ON"
+    SENSOR_POWER_OFF = "SENSOR_POWER_OFF"
 
     INFO = { "COFFEE_STARTUP": { "text": "STARTUP" },
              "COFFEE_NEW": { "text": "NEW", "value": "weight_new" },
@@ -48,11 +58,30 @@ class EventCode(object):
 
 class Events(object):
 
+    # The detector methods by name, as used in the sensor registry (see sensor_registry.py)
+    # Each is called as method(ts, sensor_id) and returns an event or None
+    DETECTORS = { "new": "test_event_new",
+                  "removed": "test_event_removed",
+                  "poured": "test_event_poured",
+                  "empty": "test_event_empty",
+                  "replaced": "test_event_replaced",
+                  "grind": "test_grind",
+                  "brew": "test_brew",
+                  "power": "test_power",
+                  "status": "test_status"
+                }
+
     def __init__(self, settings=None):
 
         # set up the various timebuffers
         self.settings = settings
 
+        self.log = Log("Events", settings)
+
+        # settings used on every reading
+        self.weight_sensor_id = settings["WEIGHT_SENSOR_ID"]
+        self.weight_empty = settings["WEIGHT_EMPTY"]
+
         # CONSTS
         self.EMPTY_WEIGHT = 1630 # Weight of empty pot (grams)
         self.EMPTY_MARGIN = 50   # Will send COFFEE_EMPTY at EMPTY_WEIGHT+EMPTY_MARGIN
@@ -61,14 +90,68 @@ class Events(object):
         self.NEW_POT_MINIMUM = 1000 # Weight of COFFEE threshold for a new pot event
         self.REMOVED_WEIGHT = 0  # Expected weight when pot removed
         self.REMOVED_MARGIN = 100 # removed_value(weight) is True if within this margin
+        self.STABLE_DEVIATION = 30 # 1-second weight deviation must be below this for a 'stable' reading
+        self.MIN_CUP_WEIGHT = 40   # Smallest weight change accepted as COFFEE_POURED
+        self.MAX_CUP_WEIGHT = 1000 # Largest weight change accepted as COFFEE_POURED
+        self.POUR_TEST_SECONDS = 30  # look back this far for the weight before a pour
+        self.EMPTY_TEST_SECONDS = 30 # pot must have been NOT empty within this period for COFFEE_EMPTY
+        self.GRIND_POWER = 9 # power (watts) threshold for valid 'GRINDING'
+        self.BREW_POWER = 9  # power (watts) threshold for valid 'BREWING'
+        self.POWER_THRESHOLD = 5 # default power (watts) threshold for the "power" detector
 
         # Create event buffer for sensor node, i.e. common to all sensors
         self.event_buffer = TimeBuffer(size=1000, settings=self.settings)
 
+        # The latest event { "ts":, "value": <event> } for each event_code, so find_event() is O(1)
+        self.last_event = {}
+
+        # Hourly totals of the coffee POURED (grams), for a week
+        self.poured_buffer = RollupBuffer(size=168, duration=3600, settings=self.settings)
+
         # Create dictionary to reference buffers for each sensor
         # This Events object will be passed to each sensor __init__ so the sensor will add its buffers to sensor_buffers.
         self.sensor_buffers = {}
 
+        # The list of detector methods for each sensor_id, so test() is a dictionary lookup
+        self.sensor_detectors = {}
+
+        # Detector parameters for each sensor_id, from the sensor registry "params"
+        self.sensor_params = {}
+
+        # Current on/off state for each sensor_id with a "power" detector
+        self.power_on = {}
+
+        for sensor in load_sensor_registry(self.settings):
+            self.add_sensor(sensor["sensor_id"], sensor["detectors"], sensor.get("params"))
+
+    # Set the detectors (names from DETECTORS) to be run by test() for readings from 'sensor_id'
+    def add_sensor(self, sensor_id, detectors, params=None):
+        detector_list = []
+        for name in detectors:
+            if not name in self.DETECTORS:
+                raise NameError("Bad detector for {}: {}".format(sensor_id, name))
+            detector_list.append(getattr(self, self.DETECTORS[name]))
+
+        self.sensor_detectors[sensor_id] = detector_list
+        self.sensor_params[sensor_id] = {} if params is None else params
+
+    # Add 'delta' seconds to every timestamp held in the event_buffer and the sensor buffers,
+    # called by the SensorHub when the wall clock jumps.
+    def shift(self, delta):
+        for event_sample in self.last_event.values():
+            event_sample["ts"] += delta
+
+        buffers = [ self.event_buffer, self.poured_buffer ]
+        for sensor_buffers in self.sensor_buffers.values():
+            for buffer in sensor_buffers.values():
+                # A sample_buffer may update a stats_buffer that is not in sensor_buffers
+                for b in [ buffer, buffer.stats_buffer ]:
+                    if not b is None and not any(b is x for x in buffers):
+                        buffers.append(b)
+
+        for buffer in buffers:
+            buffer.shift(delta)
+
     # Test if value represents EMPTY pot
     def empty_value(self, x):
         if x==None:
@@ -98,15 +181,17 @@ class Events(object):
     # Test if pot is EMPTY
     # True if median for 1 second is 1400 grams +/- 100
     # Returns tuple <Test true/false>, < next offset >
-    def is_empty(self,offset):
-        sample_buffer = self.sensor_buffers[self.settings["WEIGHT_SENSOR_ID"]]["sample_buffer"]
+    def is_empty(self, offset, sensor_id=None):
+        if sensor_id is None:
+            sensor_id = self.weight_sensor_id
+        sample_buffer = self.sensor_buffers[sensor_id]["sample_buffer"]
         m, next_offset, duration, sample_count = sample_buffer.median(offset, 1)
         d, next_offset, duration, sample_count = sample_buffer.deviation(offset, 1, m)
         if (not m is None and
             not sample_count is None and
             sample_count > 5 and
             not d is None and
-            not d > 30):
+            not d > self.STABLE_DEVIATION):
 
             empty, confidence = self.empty_value(m)
 
@@ -117,15 +202,17 @@ class Events(object):
     # Test if pot is FULL
     # True if median for 1 second is 3400 grams +/- 400
     # Returns tuple <Test true/false>, < next offset >
-    def is_full(self,offset):
-        sample_buffer = self.sensor_buffers[self.settings["WEIGHT_SENSOR_ID"]]["sample_buffer"]
+    def is_full(self, offset, sensor_id=None):
+        if sensor_id is None:
+            sensor_id = self.weight_sensor_id
+        sample_buffer = self.sensor_buffers[sensor_id]["sample_buffer"]
         m, next_offset, duration, sample_count = sample_buffer.median(offset, 1)
         d, next_offset, duration, sample_count = sample_buffer.deviation(offset, 1, m)
         if (not m is None and
             not sample_count is None and
             sample_count > 5 and
             not d is None and
-            not d > 30):
+            not d > self.STABLE_DEVIATION):
 
             full, confidence = self.full_value(m)
 
@@ -136,8 +223,10 @@ class Events(object):
     # Test if pot is REMOVED
     # True if median for 3 seconds is 0 grams +/- 100
     # Returns tuple <Test true/false>, < next offset >
-    def is_removed(self,offset):
-        sample_buffer = self.sensor_buffers[self.settings["WEIGHT_SENSOR_ID"]]["sample_buffer"]
+    def is_removed(self, offset, sensor_id=None):
+        if sensor_id is None:
+            sensor_id = self.weight_sensor_id
+        sample_buffer = self.sensor_buffers[sensor_id]["sample_buffer"]
         m, next_offset, duration, sample_count = sample_buffer.median(offset, 3)
         if not m == None:
 
@@ -148,24 +237,34 @@ class Events(object):
             return None, None, None, None
 
     # Try and find an Event during previous 'duration' seconds
-    # Returns event or None
+    # Returns the most recent event { "ts":, "value": <event> } with 'event_code' or None
     def find_event(self, ts, event_code, duration):
-        # The event_buffer.find() duration is back from the ts of the MOST RECENT event in the buffer, but
-        # the find_event() 'duration' parameter is from the given 'ts'. So we need to adjust the duration given to 
-        # event_buffer.find()
-        sample = self.event_buffer.get(0)
-        if sample is None:
+        # The most recent event of each type is kept in last_event, so no need to search the event_buffer
+        since = self.time_since(ts, event_code)
+        if since is None or since > duration:
             return None
-        buffer_end_ts = sample["ts"]
-        buffer_duration = duration - (ts - buffer_end_ts)
+        return self.last_event[event_code]
 
-        is_event = lambda event_sample: event_sample['value']['event_code'] == event_code
-        e, e_offset, e_duration, e_count = self.event_buffer.find(0, buffer_duration, is_event)
-        return e # either None or the event that was found
+    # Return the seconds since the latest event with 'event_code' (e.g. time since NEW pot), or None
+    def time_since(self, ts, event_code):
+        event_sample = self.last_event.get(event_code)
+        if event_sample is None:
+            return None
+        return ts - event_sample["ts"]
+
+    # Return the grams of coffee POURED in the hour containing 'ts' so far
+    def poured_this_hour(self, ts):
+        # The poured_buffer only moves on to a new hour with the next POURED, so its current()
+        # record may be from an earlier hour
+        hour_ts = self.poured_buffer.current_ts()
+        if hour_ts is None or ts - hour_ts >= self.poured_buffer.duration:
+            return 0
+        record = self.poured_buffer.current()
+        return 0 if record is None else record["sum"]
 
     # Test if cup has been POURED
-    def test_event_poured(self, ts):
-        sample_buffer = self.sensor_buffers[self.settings["WEIGHT_SENSOR_ID"]]["sample_buffer"]
+    def test_event_poured(self, ts, sensor_id):
+        sample_buffer = self.sensor_buffers[sensor_id]["sample_buffer"]
 
         now = sample_buffer.get(0)["ts"]
 
@@ -183,7 +282,7 @@ class Events(object):
             #print("{} no stats now".format(now))
             return None
 
-        if current_deviation > 30:
+        if current_deviation > self.STABLE_DEVIATION:
             #print("{} deviation not stable = {}".format(now, current_deviation))
             return None
 
@@ -191,11 +290,11 @@ class Events(object):
 
         push_detected = False
 
+        stats_buffer = self.sensor_buffers[sensor_id]["stats_buffer"]
+
         # look back and see if push detected AND stable prior value was higher than latest stable value
-        POUR_TEST_SECONDS = 30
         # We are using the fact that each index in stats_buffer represents ONE SECOND of readings
-        for i in range(POUR_TEST_SECONDS):
-            stats_buffer = self.sensor_buffers[self.settings["WEIGHT_SENSOR_ID"]]["stats_buffer"]
+        for i in range(self.POUR_TEST_SECONDS):
             stats_record = stats_buffer.get(i)
             if stats_record is None:
                 continue
@@ -221,12 +320,10 @@ class Events(object):
             # check for higher level of coffee before push
             med_delta = stats["median"] - current_median
 
-            MIN_CUP_WEIGHT = 40
-            MAX_CUP_WEIGHT = 1000
             if ( push_detected and
-                 stats["deviation"] < 30 and
-                 med_delta > MIN_CUP_WEIGHT and
-                 med_delta < MAX_CUP_WEIGHT):
+                 stats["deviation"] < self.STABLE_DEVIATION and
+                 med_delta > self.MIN_CUP_WEIGHT and
+                 med_delta < self.MAX_CUP_WEIGHT):
 
                 #latest_event = self.event_buffer.get(0)
                 #if ((latest_event is None) or
@@ -240,10 +337,10 @@ class Events(object):
 
                 #prev_poured, offset, duration, count = self.event_buffer.find(0,POUR_TEST_SECONDS,is_poured_event)
 
-                prev_poured = self.find_event(ts, EventCode.POURED, POUR_TEST_SECONDS)
+                prev_poured = self.find_event(ts, EventCode.POURED, self.POUR_TEST_SECONDS)
 
                 # Only send this POURED event if there isn't already a recent POURED event with similar weight
-                if prev_poured is None or prev_poured['value']['weight'] - weight > MIN_CUP_WEIGHT:
+                if prev_poured is None or prev_poured['value']['weight'] - weight > self.MIN_CUP_WEIGHT:
                     confidence = 0.8 # we don't have much better yet
                     return { "event_code": EventCode.POURED,
                              "weight_poured": weight_poured,
@@ -257,13 +354,13 @@ class Events(object):
 
     # Test for a new pot of coffee
     # Return event or None
-    def test_event_new(self, ts):
+    def test_event_new(self, ts, sensor_id):
         REMOVED_TEST_SECONDS = 30 # pot weight => removed within past 30 seconds
         PREVIOUS_NEW_TEST_SECONDS = 60*30 # no NEW event within past 30 mins
         STABILITY_TEST_SECONDS = 1 # the weight must be 'stable' for this long for valid reading
 
         # Return None if current weight not stable
-        sample_buffer = self.sensor_buffers[self.settings["WEIGHT_SENSOR_ID"]]["sample_buffer"]
+        sample_buffer = self.sensor_buffers[sensor_id]["sample_buffer"]
         current_median, next_offset, duration, sample_count = sample_buffer.median(0, STABILITY_TEST_SECONDS)
         d, next_offset, duration, sample_count = sample_buffer.deviation(0, STABILITY_TEST_SECONDS, current_median)
         # Return None if we don't have a stable weight
@@ -271,7 +368,7 @@ class Events(object):
              sample_count is None or
              sample_count < 5 or
              d is None or
-             d > 30):
+             d > self.STABLE_DEVIATION):
             return None
 
         # Return None if pot has not enough coffee for possible NEW event
@@ -291,13 +388,12 @@ class Events(object):
         # define stats_buffer sample test function
         removed_test = lambda stats_sample: self.removed_value(stats_sample['value']['median'])[0]
         # look in stats_buffer to try and find 'removed' 1-second median
-        stats_buffer = self.sensor_buffers[self.settings["WEIGHT_SENSOR_ID"]]["stats_buffer"]
+        stats_buffer = self.sensor_buffers[sensor_id]["stats_buffer"]
         stats_removed, stats_offset, stats_duration, stats_count = stats_buffer.find(0, REMOVED_TEST_SECONDS, removed_test)
         if stats_removed == None:
             return None
 
-        if self.settings["LOG_LEVEL"] <= 1:
-            print("{:.3f} test_event_new stats_removed test succeeded".format(ts))
+        self.log.debug("{:.3f} test_event_new stats_removed test succeeded", ts)
 
         # Return None if New event in past 30 mins
         if not self.find_event(ts, EventCode.NEW, PREVIOUS_NEW_TEST_SECONDS) is None:
@@ -307,19 +403,19 @@ class Events(object):
         weight = math.floor(current_median + 0.5)
         return { "event_code": EventCode.NEW,
                  "weight": weight,
-                 "weight_new": weight - self.settings["WEIGHT_EMPTY"],
+                 "weight_new": weight - self.weight_empty,
                  "acp_confidence": confidence }
 
-    def test_event_removed(self, ts):
+    def test_event_removed(self, ts, sensor_id):
         # Is the pot removed now ?
-        removed_now, offset, removed_now_weight, removed_now_confidence = self.is_removed(0)
+        removed_now, offset, removed_now_weight, removed_now_confidence = self.is_removed(0, sensor_id)
 
         # Immediate exit if pot does not seem 'removed' now
         if not removed_now:
             return None
 
         # Was it removed before ?
-        removed_before, new_offset, removed_before_weight, removed_before_confidence = self.is_removed(offset)
+        removed_before, new_offset, removed_before_weight, removed_before_confidence = self.is_removed(offset, sensor_id)
 
         if not removed_before:
             latest_event = self.event_buffer.get(0)
@@ -332,8 +428,8 @@ class Events(object):
 
         return None
 
-    def test_event_replaced(self, ts):
-        sample_buffer = self.sensor_buffers[self.settings["WEIGHT_SENSOR_ID"]]["sample_buffer"]
+    def test_event_replaced(self, ts, sensor_id):
+        sample_buffer = self.sensor_buffers[sensor_id]["sample_buffer"]
 
         # fast fail if latest weight reading < EMPTY_WEIGHT
         latest_sample = sample_buffer.get(0)
@@ -356,17 +452,16 @@ class Events(object):
              duration is None or
              sample_count is None or
              current_deviation is None ):
-            print("{:.3f} test_event_replaced() {} no stats now".format(ts,now))
+            self.log.debug("{:.3f} test_event_replaced() {} no stats now", ts, now)
             return None
 
         if current_median < self.EMPTY_WEIGHT * 0.9:
-            if self.settings["LOG_LEVEL"] <= 1:
-                print("{:.3f} test_event_replaced() weight={:.0f} median too small for replaced".format(ts, current_median))
+            self.log.debug("{:.3f} test_event_replaced() weight={:.0f} median too small for replaced", ts, current_median)
             return None
 
-        if current_deviation > 30:
-            if self.settings["LOG_LEVEL"] <= 1:
-                print("{:.3f} test_event_replaced() weight={:.0f} deviation {:.0f} not stable".format(ts, current_median, current_deviation))
+        if current_deviation > self.STABLE_DEVIATION:
+            self.log.debug("{:.3f} test_event_replaced() weight={:.0f} deviation {:.0f} not stable",
+                           ts, current_median, current_deviation)
             return None
 
         # Was pot REMOVED during previous 6 seconds ?
@@ -374,13 +469,12 @@ class Events(object):
         removed_test = lambda stats_sample: self.removed_value(stats_sample['value']['median'])[0]
 
         # look in stats_buffer to try and find 'removed' 1-second median
-        stats_buffer = self.sensor_buffers[self.settings["WEIGHT_SENSOR_ID"]]["stats_buffer"]
+        stats_buffer = self.sensor_buffers[sensor_id]["stats_buffer"]
 
         stats_removed, stats_offset, stats_duration, stats_count = stats_buffer.find(0, 6, removed_test)
 
         if stats_removed != None:
-            if self.settings["LOG_LEVEL"] <= 1:
-                print("{:.3f} test_event_replaced() weight={:.0f} stats_removed test succeeded".format(ts, current_median))
+            self.log.debug("{:.3f} test_event_replaced() weight={:.0f} stats_removed test succeeded", ts, current_median)
 
             previous_event = self.find_event(ts, EventCode.REPLACED, 10)
 
@@ -389,20 +483,20 @@ class Events(object):
                 weight = math.floor(current_median+0.5)
                 confidence = 0.8 #debug need to calculate a reasonable figure
                 return { "event_code": EventCode.REPLACED, "weight": weight, "acp_confidence": confidence }
-            elif self.settings["LOG_LEVEL"] <= 1:
-                print("{:.3f} test_event_replaced() weight={:.0f} REPLACED suppressed due to prior event {}".format(ts, current_median, previous_event))
+            else:
+                self.log.debug("{:.3f} test_event_replaced() weight={:.0f} REPLACED suppressed due to prior event {}",
+                               ts, current_median, previous_event)
 
-        elif self.settings["LOG_LEVEL"] <= 1:
-            print("{:.3f} test_event_replaced() weight={:.0f} remove_test failed".format(ts, current_median))
+        else:
+            self.log.debug("{:.3f} test_event_replaced() weight={:.0f} remove_test failed", ts, current_median)
 
         return None
 
     # Will return a COFFEE_EMPTY event if the weight ~ empty pot, otherwise None
-    def test_event_empty(self, ts):
-        EMPTY_TEST_SECONDS = 30
+    def test_event_empty(self, ts, sensor_id):
         PREVIOUS_EMPTY_TEST_SECONDS = 60
         # Is the pot empty now ?
-        empty_now, offset, empty_weight, empty_confidence = self.is_empty(0)
+        empty_now, offset, empty_weight, empty_confidence = self.is_empty(0, sensor_id)
 
         # Immediate return if pot doesn't seem empty now
         if not empty_now:
@@ -412,8 +506,8 @@ class Events(object):
         # define stats_buffer sample test function
         not_empty = lambda stats_sample: not self.empty_value(stats_sample['value']['median'])[0]
         # look in stats_buffer to try and find 'not empty' 1-second median
-        stats_buffer = self.sensor_buffers[self.settings["WEIGHT_SENSOR_ID"]]["stats_buffer"]
-        stats_not_empty, stats_offset, stats_duration, stats_count = stats_buffer.find(0, EMPTY_TEST_SECONDS, not_empty)
+        stats_buffer = self.sensor_buffers[sensor_id]["stats_buffer"]
+        stats_not_empty, stats_offset, stats_duration, stats_count = stats_buffer.find(0, self.EMPTY_TEST_SECONDS, not_empty)
 
         #print(ts,"test_event_empty: empty_now, stats_not_empty=", stats_not_empty)
 
@@ -439,76 +533,117 @@ class Events(object):
 
         return None
 
+    # Return the power (watts) of the latest message from a RemoteSensor, or None if it had no power reading.
+    # The power is extracted from each message once, into the stats_buffer.value_buffer.
+    def latest_power(self, sensor_id):
+        sample = self.sensor_buffers[sensor_id]["sample_buffer"].get(0)
+        power_sample = self.sensor_buffers[sensor_id]["stats_buffer"].value_buffer.get(0)
+        if sample is None or power_sample is None or power_sample["ts"] != sample["ts"]:
+            return None
+        return power_sample["value"]
+
     # Test any event after a GRIND reading
-    def test_grind(self, ts):
-        GRIND_POWER = 9 #debug - power (watts) threshold for valid 'GRINDING'
+    # A Tasmota plug sends a message every TelePeriod (120 seconds) and when the power changes by PowerDelta
+    # (see remote_sensors/tasmota/README.md), so a grind of ~20 seconds may be a single message with the power
+    # above GRIND_POWER. The Power of each message is already the plug's averaged reading, so that one message
+    # is taken as GRINDING.
+    def test_grind(self, ts, sensor_id):
+        grind_sensor_id = sensor_id
         # TimeBuffer.get() returns {"ts": , "value": }
-        sample = self.sensor_buffers[self.settings["GRIND_SENSOR_ID"]]["sample_buffer"].get(0)
+        value = self.sensor_buffers[grind_sensor_id]["sample_buffer"].get(0)["value"]
 
-        value = sample["value"]
+        power = self.latest_power(grind_sensor_id)
 
         # debug - maybe we can create a more meaningful confidence value
         confidence = 0.81
 
-        if "ENERGY" in value and "Power" in value["ENERGY"]:
-            power = value["ENERGY"]["Power"]
-            if power > GRIND_POWER:
-                return { "event_code": EventCode.GRINDING,
-                         "power": power,
-                         "value": value,
-                         "acp_confidence": confidence }
+        if not power is None and power > self.GRIND_POWER:
+            return { "event_code": EventCode.GRINDING,
+                     "power": power,
+                     "value": value,
+                     "acp_confidence": confidence }
 
-        return { "event_code": EventCode.GRIND_STATUS, "value": value, "acp_confidence": confidence }
+        return { "event_code": EventCode.GRIND_STATUS, "power": power, "value": value, "acp_confidence": confidence }
 
     # Test any event after a BREW reading
-    def test_brew(self, ts):
-        BREW_POWER = 9 #debug - power (watts) threshold for valid 'BREWING'
+    # As test_grind(), each message with the power above BREW_POWER is BREWING.
+    def test_brew(self, ts, sensor_id):
+        brew_sensor_id = sensor_id
         # get latest sample from BREW sample buffer
-        sample = self.sensor_buffers[self.settings["BREW_SENSOR_ID"]]["sample_buffer"].get(0)
+        value = self.sensor_buffers[brew_sensor_id]["sample_buffer"].get(0)["value"]
 
-        value = sample["value"]
+        power = self.latest_power(brew_sensor_id)
 
         # debug - maybe we can create a more meaningful confidence value
         confidence = 0.82
 
-        if "ENERGY" in value and "Power" in value["ENERGY"]:
-            power = value["ENERGY"]["Power"]
-            if power > BREW_POWER:
-                return { "event_code": EventCode.BREWING,
-                         "power": power,
-                         "value": value,
-                         "acp_confidence": confidence }
+        if not power is None and power > self.BREW_POWER:
+            return { "event_code": EventCode.BREWING,
+                     "power": power,
+                     "value": value,
+                     "acp_confidence": confidence }
+
+        return { "event_code": EventCode.BREW_STATUS, "power": power, "value": value, "acp_confidence": confidence }
+
+    # Test for the power switching on or off at a RemoteSensor, e.g. a milk fridge or kettle plug.
+    # As test_grind(), each message is taken as the power since the previous one, and only the changes across
+    # the sensor's "power_threshold" param (default POWER_THRESHOLD) are sent, not each message.
+    def test_power(self, ts, sensor_id):
+        threshold = self.sensor_params[sensor_id].get("power_threshold", self.POWER_THRESHOLD)
+
+        power = self.latest_power(sensor_id)
+        if power is None:
+            return None
+
+        power_on = self.power_on.get(sensor_id, False)
 
-        return { "event_code": EventCode.BREW_STATUS, "value": value, "acp_confidence": confidence }
+        if not power_on and power > threshold:
+            self.power_on[sensor_id] = True
+            return { "event_code": EventCode.SENSOR_POWER_ON,
+                     "sensor_id": sensor_id,
+                     "power": power,
+                     "acp_confidence": 0.8 }
+
+        if power_on and power <= threshold:
+            self.power_on[sensor_id] = False
+            return { "event_code": EventCode.SENSOR_POWER_OFF,
+                     "sensor_id": sensor_id,
+                     "power": power,
+                     "acp_confidence": 0.8 }
+
+        return None
+
+    # Return the latest reading from a RemoteSensor as a SENSOR_STATUS, e.g. a temperature probe
+    def test_status(self, ts, sensor_id):
+        value = self.sensor_buffers[sensor_id]["sample_buffer"].get(0)["value"]
+
+        return { "event_code": EventCode.SENSOR_STATUS,
+                 "sensor_id": sensor_id,
+                 "power": self.latest_power(sensor_id),
+                 "value": value,
+                 "acp_confidence": 1 }
 
     # test(ts, sensor_id)
     # This is the public method of Events which looks in the various TimeBuffers and
     # returns a list of events for any patterns recognized.
     def test(self, ts, sensor_id):
 
-        if sensor_id == self.settings["WEIGHT_SENSOR_ID"]:
-            tests = [ self.test_event_new,
-                      self.test_event_removed,
-                      self.test_event_poured,
-                      self.test_event_empty,
-                      self.test_event_replaced
-                    ]
-
-        elif sensor_id == self.settings["GRIND_SENSOR_ID"]:
-            tests = [ self.test_grind ]
-
-        elif sensor_id == self.settings["BREW_SENSOR_ID"]:
-            tests = [ self.test_brew ]
-
-        else:
+        tests = self.sensor_detectors.get(sensor_id)
+        if tests is None:
             raise NameError("Bad sensor id: {}".format(sensor_id))
 
         event_list = []
         for test_function in tests:
-            event = test_function(ts)
+            event = test_function(ts, sensor_id)
             if not event is None:
                 event_list.append(event)
+                # Readings from the other registry sensors would displace the coffee events from the event_buffer
+                if event["event_code"] == EventCode.SENSOR_STATUS:
+                    continue
                 self.event_buffer.put(ts,event)
+                self.last_event[event["event_code"]] = { "ts": ts, "value": event }
+                if event["event_code"] == EventCode.POURED:
+                    self.poured_buffer.add(ts, event["weight_poured"])
 
         return event_list
 
@@ -0,0 +1,139 @@
+# ----------------------------------------------------------------------
+# ----------------------------------------------------------------------
+# Sample filters
+#
+# Streaming filters applied to each sensor reading before it is put into the sample_buffer,
+# so single-reading spikes from the load cells don't reach the TimeBuffer medians or the Events tests.
+#
+# Each filter has fixed-size state (allocated in __init__) and constant cost per reading:
+#
+#   f = MedianFilter(size=5)
+#   value = f.filter(ts, value)  # returns the filtered value for this reading
+#   f.reset()                    # forget the history
+#
+# MedianFilter(size):         running median of the latest 'size' readings.
+# HampelFilter(size, sigmas): reading is replaced by the median of the latest 'size' readings if it is
+#                             more than 'sigmas' (scaled MAD) from that median, otherwise unchanged.
+# KalmanFilter(process_noise, measurement_noise, gate):
+#                             scalar Kalman filter of the pot weight. A single reading more than 'gate'
+#                             standard deviations from the estimate is rejected, but two consecutive such
+#                             readings on the same side are a real change (e.g. pot lifted) and reset the estimate.
+#
+# make_filter(settings) returns the filter selected by settings["SAMPLE_FILTER"] (one of the FILTERS
+# names below, with optional settings["SAMPLE_FILTER_PARAMS"] keyword arguments) or None.
+# ----------------------------------------------------------------------
+# ----------------------------------------------------------------------
+
+MAD_SCALE = 1.4826 # scales median absolute deviation to standard deviation for normal noise
+
+class MedianFilter(object):
+
+    def __init__(self, size=5):
+        self.size = size
+        self.window = [ 0.0 ] * size  # circular buffer of the latest readings
+        self.sorted = [ 0.0 ] * size  # working copy, sorted in place
+        self.index = 0
+        self.count = 0
+
+    def reset(self):
+        self.index = 0
+        self.count = 0
+
+    # Add 'value' to the window, return median of the window
+    def filter(self, ts, value):
+        self.window[self.index] = value
+        self.index = (self.index + 1) % self.size
+        if self.count < self.size:
+            self.count += 1
+            # Until the window is full, pass the readings through
+            return value
+
+        self.sorted[:] = self.window
+        self.sorted.sort()
+        return self.sorted[self.size // 2]
+
+class HampelFilter(MedianFilter):
+
+    def __init__(self, size=7, sigmas=3):
+        super().__init__(size=size)
+        self.sigmas = sigmas
+        self.deviations = [ 0.0 ] * size
+
+    def filter(self, ts, value):
+        median = super().filter(ts, value)
+        if self.count < self.size:
+            return value
+
+        deviations = self.deviations
+        for i in range(self.size):
+            deviations[i] = abs(self.window[i] - median)
+        deviations.sort()
+        mad = deviations[self.size // 2]
+
+        # The outlier stays in the window, so a real step change passes after size/2 readings
+        if abs(value - median) > self.sigmas * MAD_SCALE * mad:
+            return median
+
+        return value
+
+class KalmanFilter(object):
+
+    # process_noise: variance (grams^2) of the weight change between readings
+    # measurement_noise: variance (grams^2) of the load cell reading
+    # gate: readings more than this many standard deviations from the estimate are outliers
+    def __init__(self, process_noise=4.0, measurement_noise=25.0, gate=5):
+        self.process_noise = process_noise
+        self.measurement_noise = measurement_noise
+        self.gate = gate
+        self.reset()
+
+    def reset(self):
+        self.estimate = None
+        self.variance = self.measurement_noise
+        self.outlier_sign = 0 # sign of the previous reading's innovation if it was an outlier, otherwise 0
+
+    def filter(self, ts, value):
+        if self.estimate is None:
+            self.estimate = value
+            return value
+
+        variance = self.variance + self.process_noise
+        innovation = value - self.estimate
+        innovation_variance = variance + self.measurement_noise
+
+        if innovation * innovation > self.gate * self.gate * innovation_variance:
+            sign = 1 if innovation > 0 else -1
+            if sign != self.outlier_sign:
+                # First outlier, reject the reading
+                self.outlier_sign = sign
+                self.variance = variance
+                return self.estimate
+            # Second consecutive outlier in the same direction, the weight has really changed
+            self.outlier_sign = 0
+            self.estimate = value
+            self.variance = self.measurement_noise
+            return value
+
+        self.outlier_sign = 0
+        gain = variance / innovation_variance
+        self.estimate += gain * innovation
+        self.variance = (1 - gain) * variance
+        return self.estimate
+
+FILTERS = { "median": MedianFilter,
+            "hampel": HampelFilter,
+            "kalman": KalmanFilter
+          }
+
+# Return a new filter as selected by settings["SAMPLE_FILTER"], or None if no filter is set.
+def make_filter(settings):
+    if settings is None or not "SAMPLE_FILTER" in settings or settings["SAMPLE_FILTER"] is None:
+        return None
+
+    filter_name = settings["SAMPLE_FILTER"]
+    if not filter_name in FILTERS:
+        raise NameError("Bad SAMPLE_FILTER: {}".format(filter_name))
+
+    params = settings["SAMPLE_FILTER_PARAMS"] if "SAMPLE_FILTER_PARAMS" in settings else {}
+
+    return FILTERS[filter_name](**params)
@@ -0,0 +1,238 @@
+"""
+IngestService - a local stand-in for the platform's event ingestion, to measure the end-to-end event latency
+and how many sensor nodes one platform instance can absorb (see ingest_service.py)
+
+service = IngestService(settings) - the link is chosen by settings["INGEST_LINK"], default "gmqtt" (see uplink.py)
+
+await service.start(server_settings, topic) - CONNECT to the broker and SUBSCRIBE to 'topic' (e.g. "#"), then
+                                              receive the events until finish()
+await service.finish()
+
+service.report() - dictionary of the statistics since the last report() (or start), see below
+
+Each message is validated against EVENT_SCHEMA, i.e. it must be a JSON object with a string "acp_id" and
+"event_code" and a numeric "acp_ts", and the receive latency is the time it arrived less its "acp_ts" (so the
+node and the service clocks must agree, e.g. on the same machine). report() returns e.g.
+    { "secs": 10.0, "received": 2000, "valid": 2000, "invalid": { "missing acp_ts": 0 },
+      "event_codes": { "COFFEE_STATUS": 1950, ... }, "nodes": 200,
+      "latency_p50": 0.002, "latency_p99": 0.010, "latency_max": 0.030 }
+
+The simulated nodes publish recorded traffic:
+
+traffic = node_traffic(filenames, settings) - the events the node would have sent for the <ts>,<weight> csv
+    readings in 'filenames', i.e. the events detected by a replay (see replay.py) plus a COFFEE_STATUS every
+    WATCHDOG_PERIOD, as a list of [ secs from the first reading, event without "acp_id" and "acp_ts" ]
+
+await simulate_nodes(settings, server_settings, traffic, node_ids, speed, seconds) - a link per node id
+    publishing the traffic 'speed' times faster than recorded, each node starting at a random point in it,
+    with "acp_ts" set to the time of sending, returns the count of events sent
+"""
+
+import time
+import random
+import asyncio
+from collections import deque
+
+from classes.uplink import load_uplink, decode_message
+from classes.events import EventCode
+from classes.replay import replay_day, count_lines
+from classes.time_buffer import TimeBuffer
+from classes.log import Log
+
+# The fields every event must have, and their types
+EVENT_SCHEMA = { "acp_id": str,
+                 "acp_ts": (int, float),
+                 "event_code": str
+               }
+
+LATENCY_SAMPLES = 100000 # latencies kept for the percentiles of each report
+
+# Return None if 'event' matches the EVENT_SCHEMA, else the reason it doesn't, e.g. "missing acp_ts"
+def validate_event(event):
+    if not isinstance(event, dict):
+        return "not an object"
+    for field, field_type in EVENT_SCHEMA.items():
+        if not field in event:
+            return "missing " + field
+        # bool is an int, but not a timestamp
+        if not isinstance(event[field], field_type) or isinstance(event[field], bool):
+            return "bad " + field
+    return None
+
+class IngestService(object):
+
+    def __init__(self, settings=None):
+        self.settings = settings
+        self.log = Log("IngestService", settings)
+
+        self.link = load_uplink(settings, "INGEST_LINK", "SIMULATE_INGEST")
+
+        self.quit = False
+        self.finished = asyncio.Event()
+
+        self.t_report = time.time()
+        self.received = 0
+        self.valid = 0
+        self.invalid = {}     # reason -> count
+        self.event_codes = {} # event_code -> count
+        self.nodes = set()    # acp_ids seen
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+
+    async def start(self, server_settings, topic="#"):
+        await self.link.start(server_settings)
+
+        direct = self.link.set_receiver(self.receive)
+
+        await self.link.subscribe({ "topic": topic })
+
+        self.t_report = time.time()
+
+        if direct:
+            # the link calls receive() with each message until finish()
+            await self.finished.wait()
+        else:
+            while not self.quit:
+                message = await self.link.get()
+
+                # get() returns None when the link is stopped by finish()
+                if message is None:
+                    break
+
+                self.process_message(time.time(), message)
+
+        print("IngestService finished")
+
+    # Called by the link with each message, i.e. its topic and bytes
+    def receive(self, topic, payload):
+        self.process_message(time.time(), decode_message(topic, payload))
+
+    def process_message(self, ts, message):
+        self.received += 1
+
+        error = validate_event(message)
+        if not error is None:
+            self.invalid[error] = self.invalid.get(error, 0) + 1
+            self.log.info("IngestService invalid event on {}: {}", message.get("topic"), error)
+            return
+
+        self.valid += 1
+        event_code = message["event_code"]
+        self.event_codes[event_code] = self.event_codes.get(event_code, 0) + 1
+        self.nodes.add(message["acp_id"])
+        self.latencies.append(ts - message["acp_ts"])
+
+        self.log.debug("IngestService {} {} latency {:.3f}", message["acp_id"], event_code, ts - message["acp_ts"])
+
+    # Return the statistics dictionary (see above) since the last report(), and start the next period
+    def report(self):
+        now = time.time()
+        latencies = sorted(self.latencies)
+        count = len(latencies)
+
+        report = { "secs": now - self.t_report,
+                   "received": self.received,
+                   "valid": self.valid,
+                   "invalid": self.invalid,
+                   "event_codes": self.event_codes,
+                   "nodes": len(self.nodes),
+                   "latency_p50": latencies[count // 2] if count > 0 else None,
+                   "latency_p99": latencies[min(count - 1, int(count * 0.99))] if count > 0 else None,
+                   "latency_max": latencies[-1] if count > 0 else None
+                 }
+
+        self.t_report = now
+        self.received = 0
+        self.valid = 0
+        self.invalid = {}
+        self.event_codes = {}
+        self.nodes = set()
+        self.latencies.clear()
+
+        return report
+
+    async def finish(self):
+        self.quit = True
+        self.finished.set()
+        await self.link.finish()
+        self.link.stop_get()
+
+# Return the recorded traffic of a node, see above
+def node_traffic(filenames, settings):
+    readings = []
+    for filename in sorted(filenames):
+        recording = TimeBuffer(size=count_lines(filename), settings=settings)
+        recording.load(filename)
+        recording.play(lambda ts, value: readings.append((ts, value)))
+
+    if len(readings) == 0:
+        return []
+
+    begin_ts = readings[0][0]
+
+    traffic = []
+
+    # the COFFEE_STATUS events, with the weight at the time
+    status_period = settings["WATCHDOG_PERIOD"]
+    next_status_ts = begin_ts
+    for ts, value in readings:
+        if ts >= next_status_ts:
+            status = { "acp_type": settings["SENSOR_TYPE"],
+                       "acp_units": "GRAMS",
+                       "event_code": EventCode.STATUS,
+                       "weight": int(value + 0.5)
+                     }
+            if "VERSION" in settings:
+                status["version"] = settings["VERSION"]
+            traffic.append([ ts - begin_ts, status ])
+            next_status_ts = ts + status_period
+
+    # the events detected in the readings
+    for event in replay_day("traffic", filenames, settings)["events"]:
+        event = dict(event)
+        ts = event.pop("ts")
+        event["acp_type"] = settings["SENSOR_TYPE"]
+        traffic.append([ ts - begin_ts, event ])
+
+    traffic.sort(key=lambda item: item[0])
+
+    return traffic
+
+# Publish the 'traffic' from each of 'node_ids', see above
+async def simulate_nodes(settings, server_settings, traffic, node_ids, speed, seconds):
+    duration = traffic[-1][0] + 1
+
+    links = []
+    for node_id in node_ids:
+        link = load_uplink(settings, "INGEST_LINK", "SIMULATE_INGEST")
+        await link.start(server_settings)
+        links.append(link)
+
+    sent = [ 0 ]
+
+    async def node(link, node_id):
+        t_start = time.time()
+        offset = random.uniform(0, duration)
+        index = next((i for i, item in enumerate(traffic) if item[0] >= offset), 0)
+        lap = 0 # the traffic repeats, each lap starting 'duration' secs later
+        while True:
+            send_secs = (lap * duration + traffic[index][0] - offset) / speed
+            if send_secs > seconds:
+                return
+            delay = t_start + send_secs - time.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            await link.put(node_id, { **traffic[index][1], "acp_id": node_id, "acp_ts": time.time() })
+            sent[0] += 1
+
+            index += 1
+            if index == len(traffic):
+                index = 0
+                lap += 1
+
+    await asyncio.gather(*[ node(link, node_id) for link, node_id in zip(links, node_ids) ])
+
+    for link in links:
+        await link.finish()
+
+    return sent[0]
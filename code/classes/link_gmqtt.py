@@ -13,11 +13,32 @@ await link.subscribe(subscription_settings) - requests SUBSCRIPTION from host, s
 
 await link.get() - async GETS next message from host
 
+link.stop_get() - a pending (or the next) get() will return None, e.g. to end a message loop
+
+link.set_receiver(receiver) - call receiver(topic, payload) with each message, rather than queueing it for get()
+
+link.status() - the connection state and counts, see below
+
+If the connection fails (in start(), or when the broker goes away later) the link keeps reconnecting in the
+background, waiting a random delay of between half and all of UPLINK_RECONNECT_MIN secs (default 1) doubled
+for each failed attempt, up to UPLINK_RECONNECT_MAX secs (default 60). On each connect the subscriptions are
+requested again, then the messages put() while disconnected are sent. Up to UPLINK_QUEUE_SIZE (default 1000)
+messages are queued, after that the oldest are dropped.
+
+link.status() returns e.g.
+    { "state": "connected", "connects": 3, "disconnects": 2, "failures": 5, "queued": 0, "dropped": 0 }
+where "state" is "connecting", "connected" or "disconnected", "failures" is the count of failed connect
+attempts, "queued" the messages waiting for a connection and "dropped" those lost from a full queue.
 """
 
+import random
 import asyncio
+import logging
+from collections import deque
+
 import simplejson as json
-from simplejson.errors import JSONDecodeError
+
+from classes.uplink import Uplink, decode_message
 
 from gmqtt import Client as MQTTClient
 from gmqtt.mqtt.constants import MQTTv311
@@ -26,53 +47,167 @@ from gmqtt.mqtt.constants import MQTTv311
 #import uvloop
 #asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
 
-class LinkGMQTT(object):
+RECONNECT_MIN = 1   # secs, the first reconnect delay
+RECONNECT_MAX = 60  # secs, the longest reconnect delay
+QUEUE_SIZE = 1000   # messages put() while disconnected
+CONNECT_TIMEOUT = 10 # secs to wait for the CONNACK
+
+# The gmqtt Client reconnects itself after a fixed delay (6 secs), and without restoring the subscriptions,
+# so here that is disabled and LinkGMQTT does the reconnecting.
+class LinkClient(MQTTClient):
+
+    async def reconnect(self, delay=False):
+        pass
+
+# gmqtt logs a traceback (to stderr) for each connection lost with an exception, e.g. ConnectionResetError
+# when the broker goes away. LinkGMQTT reconnects (see on_disconnect()), so the traceback is replaced by a
+# one-line message.
+class ConnectionLostFilter(logging.Filter):
+
+    def filter(self, record):
+        if not record.exc_info is None and isinstance(record.exc_info[1], ConnectionError):
+            print("LinkGMQTT connection lost: {}".format(record.exc_info[1]))
+            return False
+        return True
+
+logging.getLogger("gmqtt.mqtt.protocol").addFilter(ConnectionLostFilter())
+
+class LinkGMQTT(Uplink):
 
     def __init__(self, settings=None):
+        super().__init__(settings)
         print("LinkGMQTT __init__()")
-        self.settings = settings
-        self.client = MQTTClient(None) # None => autogenerated client id
+        self.client = LinkClient(None) # None => autogenerated client id
         self.client.on_connect = self.on_connect
         self.client.on_message = self.on_message
         self.client.on_disconnect = self.on_disconnect
         self.client.on_subscribe = self.on_subscribe
 
         self.subscription_queue = asyncio.Queue()
+        self.receiver = None
+
+        settings = {} if settings is None else settings
+        self.reconnect_min = settings["UPLINK_RECONNECT_MIN"] if "UPLINK_RECONNECT_MIN" in settings else RECONNECT_MIN
+        self.reconnect_max = settings["UPLINK_RECONNECT_MAX"] if "UPLINK_RECONNECT_MAX" in settings else RECONNECT_MAX
+        queue_size = settings["UPLINK_QUEUE_SIZE"] if "UPLINK_QUEUE_SIZE" in settings else QUEUE_SIZE
+
+        self.server_settings = None
+        self.topics = [] # the subscribed topics, requested again on each connect
+        self.publish_queue = deque(maxlen=queue_size) # [ sensor_id, message ] put() while disconnected
+
+        self.state = "disconnected"
+        self.finishing = False
+        self.reconnect_task = None
+
+        self.connects = 0
+        self.disconnects = 0
+        self.failures = 0
+        self.dropped = 0
         print("LinkGMQTT __init__ completed")
 
 
     async def start(self, server_settings):
         """
-        Connects to broker
+        Connects to broker, or starts reconnecting in the background if that fails
         """
         print('LinkGMQTT.start() connecting as user {}'.format(server_settings["user"]))
+        self.server_settings = server_settings
         self.client.set_auth_credentials(server_settings["user"], server_settings["password"])
+        if not await self.connect():
+            self.start_reconnect()
+
+
+    # Return True if we connect to the broker, having requested our subscriptions and sent the queued messages
+    async def connect(self):
+        self.state = "connecting"
         try:
-            await self.client.connect(server_settings["host"],keepalive=60,version=MQTTv311)
+            await asyncio.wait_for(self.client.connect(self.server_settings["host"],
+                                                       port=self.server_settings.get("port", 1883),
+                                                       keepalive=60,
+                                                       version=MQTTv311),
+                                   CONNECT_TIMEOUT)
+        except asyncio.TimeoutError:
+            self.failures += 1
+            self.state = "disconnected"
+            print("LinkGMQTT connect timeout")
+            # close the connection that got no CONNACK
+            try:
+                await self.client.disconnect()
+            except Exception:
+                pass
+            return False
         except Exception as e:
+            self.failures += 1
+            self.state = "disconnected"
             print("LinkGMQTT connect exception: {}".format(e))
+            return False
+
+        self.state = "connected"
+        self.connects += 1
+        print('LinkGMQTT.start() connected {}'.format(self.server_settings["host"]))
+
+        for topic in self.topics:
+            self.client.subscribe(topic, qos=0)
+
+        if len(self.publish_queue) > 0:
+            print("LinkGMQTT sending {} queued messages".format(len(self.publish_queue)))
+        while len(self.publish_queue) > 0 and self.state == "connected":
+            sensor_id, message = self.publish_queue.popleft()
+            self.client.publish(sensor_id, message, qos=0)
+
+        return True
+
+
+    def start_reconnect(self):
+        if self.finishing or not self.reconnect_task is None:
             return
-        print('LinkGMQTT.start() connected {}'.format(server_settings["host"]))
+        self.reconnect_task = asyncio.ensure_future(self.reconnect())
+
+
+    # Connect with jittered exponential backoff, until connected or finish()
+    async def reconnect(self):
+        attempt = 0
+        while not self.finishing:
+            delay = min(self.reconnect_max, self.reconnect_min * 2 ** attempt)
+            delay = random.uniform(delay / 2, delay)
+            print("LinkGMQTT reconnecting in {:.1f} secs".format(delay))
+            await asyncio.sleep(delay)
+            if await self.connect():
+                break
+            attempt += 1
+        self.reconnect_task = None
 
 
     async def put(self, sensor_id, event):
         """
-        Sends sensor_id/event to MQTT broker.
+        Sends sensor_id/event to MQTT broker, or queues it until connected
         sensor_id is string, used as MQTT topic
         event is dictionary which will be converted to bytes for MQTT message
         """
         #print('LinkGMQTT.put() sending {}'.format(sensor_id))
 
         message = json.dumps(event)
+
+        if self.state != "connected":
+            if len(self.publish_queue) == self.publish_queue.maxlen:
+                self.dropped += 1
+            self.publish_queue.append([ sensor_id, message ])
+            self.log.debug("LinkGMQTT.put() queued {} {}", sensor_id, message)
+            return
+
         self.client.publish(sensor_id, message, qos=0)
 
-        print("LinkGMQTT.put() published {} {}".format(sensor_id,message))
+        self.log.debug("LinkGMQTT.put() published {} {}", sensor_id, message)
 
 
     async def subscribe(self, subscribe_settings):
         """
         Subscribes to sensor events.
         """
+        self.topics.append(subscribe_settings["topic"])
+        if self.state != "connected":
+            print("LinkGMQTT.subscribe() {} when connected".format(subscribe_settings["topic"]))
+            return
         try:
             self.client.subscribe(subscribe_settings["topic"], qos=0)
         except Exception as e:
@@ -82,35 +217,52 @@ class LinkGMQTT(object):
 
 
     async def get(self):
-        print("LinkGMQTT get requested from client, awaiting queue")
+        self.log.debug("LinkGMQTT get requested from client, awaiting queue")
         message = await self.subscription_queue.get()
-        print("LinkGMQTT get returned from queue")
+        self.log.debug("LinkGMQTT get returned from queue")
 
         return message
 
 
+    def set_receiver(self, receiver):
+        self.receiver = receiver
+        return True
+
+
+    def stop_get(self):
+        self.subscription_queue.put_nowait(None)
+
+
+    def status(self):
+        return { "state": self.state,
+                 "connects": self.connects,
+                 "disconnects": self.disconnects,
+                 "failures": self.failures,
+                 "queued": len(self.publish_queue),
+                 "dropped": self.dropped
+               }
+
+
     def on_connect(self, client, flags, rc, properties):
         print('LinkGMQTT Connected')
 
 
     def on_message(self, client, topic, payload, qos, properties):
-        print('LinkGMQTT RECV MSG:', topic, payload)
-        message = payload.decode('utf-8')
-
-        message_dict = {}
-        try:
-            message_dict = json.loads(message)
-        except JSONDecodeError:
-            message_dict["message"] = message
-            print("remote_sensors() json msg error: {} => {}".format(topic,message))
+        self.log.debug("LinkGMQTT RECV MSG: {} {}", topic, payload)
 
-        message_dict["topic"] = topic
-
-        self.subscription_queue.put_nowait(message_dict)
+        if self.receiver is None:
+            self.subscription_queue.put_nowait(decode_message(topic, payload))
+        else:
+            self.receiver(topic, payload)
 
 
     def on_disconnect(self, client, packet, exc=None):
         print('LinkGMQTT Disconnected')
+        # Also called for a refused connect(), which has its own retry
+        if self.state == "connected":
+            self.state = "disconnected"
+            self.disconnects += 1
+            self.start_reconnect()
 
 
     def on_subscribe(self, client, mid, qos, properties):
@@ -118,5 +270,10 @@ class LinkGMQTT(object):
 
 
     async def finish(self):
-        await self.client.disconnect()
-
+        self.finishing = True
+        if not self.reconnect_task is None:
+            self.reconnect_task.cancel()
+            self.reconnect_task = None
+        if self.state == "connected":
+            self.state = "disconnected"
+            await self.client.disconnect()
@@ -19,14 +19,16 @@ import asyncio
 import simplejson as json
 from simplejson.errors import JSONDecodeError
 
+from classes.uplink import Uplink
+
 from hbmqtt.client import MQTTClient, ClientException, ConnectException
 from hbmqtt.mqtt.constants import QOS_0, QOS_1, QOS_2
 
-class LinkHBMQTT(object):
+class LinkHBMQTT(Uplink):
 
     def __init__(self, settings=None):
+        super().__init__(settings)
         print("LinkHBMQTT __init__()")
-        self.settings = settings
         client_config = {
                             'keep_alive': 10,
                             'ping_delay': 1,
@@ -48,7 +50,7 @@ class LinkHBMQTT(object):
         connect_url = "mqtt://"+user+":"+password+"@"+host+":"+str(port)
         try:
             await self.client.connect(connect_url)
-        except ConnectionException as ce:
+        except ConnectException as ce:
             print("LinkHBMQTT connect {}@{} failed: {}".format(user, host, ce))
             return
 
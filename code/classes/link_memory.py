@@ -0,0 +1,76 @@
+"""
+In-memory link for SensorHub and RemoteSensors, via a LocalBroker in the same process (see local_broker.py)
+
+link = LinkMemory(settings) - instantiate object. settings = application settings e.g. "LOG_LEVEL"
+
+await link.start(server_settings) - CONNECT to the LocalBroker named by server_settings "host"
+
+await link.finish() - cleanup, i.e. remove our subscriptions
+
+await link.put(sensor_id, event) - SENDS message to the broker
+
+await link.subscribe(subscription_settings) - SUBSCRIBES to the broker, settings { topic: }
+
+await link.get() - async GETS next message from the broker
+
+link.stop_get() - a pending (or the next) get() will return None, e.g. to end a message loop
+
+link.set_receiver(receiver) - call receiver(topic, payload) with each message, rather than queueing it for get()
+
+The events are sent as JSON bytes, as over MQTT, so the messages received are the same as with the
+other links. E.g. for tests with the SensorHub and SensorSubscriber in one process use "UPLINK": "memory",
+"SENSOR_LINK": "memory" and the same PLATFORM_HOST and SENSOR_HOST.
+"""
+
+import asyncio
+import simplejson as json
+
+from classes.uplink import Uplink, decode_message
+from classes.local_broker import get_broker
+
+class LinkMemory(Uplink):
+
+    def __init__(self, settings=None):
+        super().__init__(settings)
+        print("LinkMemory __init__()")
+
+        self.broker = None
+
+        self.subscription_queue = asyncio.Queue()
+        self.receiver = None
+
+    async def start(self, server_settings):
+        self.broker = get_broker(server_settings["host"])
+        print('LinkMemory.start() connected {}'.format(server_settings["host"]))
+
+    async def put(self, sensor_id, event):
+        message = json.dumps(event)
+        self.broker.publish(sensor_id, message.encode('utf-8'))
+
+        self.log.debug("LinkMemory.put() published {} {}", sensor_id, message)
+
+    async def subscribe(self, subscribe_settings):
+        self.broker.subscribe(subscribe_settings["topic"], self.deliver)
+        print("LinkMemory.subscribed() {}".format(subscribe_settings["topic"]))
+
+    # Called by the broker for each message matching our subscriptions
+    def deliver(self, topic, payload):
+        if self.receiver is None:
+            self.subscription_queue.put_nowait(decode_message(topic, payload))
+        else:
+            self.receiver(topic, payload)
+
+    def set_receiver(self, receiver):
+        self.receiver = receiver
+        return True
+
+    async def get(self):
+        return await self.subscription_queue.get()
+
+    def stop_get(self):
+        self.subscription_queue.put_nowait(None)
+
+    async def finish(self):
+        if not self.broker is None:
+            self.broker.unsubscribe(self.deliver)
+        print("LinkMemory finished")
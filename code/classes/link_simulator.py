@@ -13,17 +13,21 @@ await link.subscribe(subscription_settings) - requests SUBSCRIPTION from host, s
 
 await link.get() - async GETS next message from host
 
+link.stop_get() - a pending (or the next) get() will return None, e.g. to end a message loop
+
 """
 
 import asyncio
 import simplejson as json
 from simplejson.errors import JSONDecodeError
 
-class LinkSimulator(object):
+from classes.uplink import Uplink
+
+class LinkSimulator(Uplink):
 
     def __init__(self, settings=None):
+        super().__init__(settings)
         print("Using LinkSimulator")
-        self.settings = settings
 
         self.subscription_queue = asyncio.Queue()
         print("LinkSimulator __init__ completed")
@@ -44,8 +48,9 @@ class LinkSimulator(object):
         sensor_id is string, used as MQTT topic
         event is dictionary which will be converted to bytes for MQTT message
         """
-        print('LinkSimulator.put() sending {}'.format(sensor_id))
-        print("LinkSimulator.put() published {} {}".format(sensor_id,event))
+        self.log.debug("LinkSimulator.put() sending {}", sensor_id)
+        # the events are printed (as dictionaries), that is what the simulator is for
+        self.log.info("LinkSimulator.put() published {} {}", sensor_id, event)
 
 
     async def subscribe(self, subscribe_settings):
@@ -64,9 +69,12 @@ class LinkSimulator(object):
 
         return message
 
+    def stop_get(self):
+        self.subscription_queue.put_nowait(None)
+
     # Put a message in the queue every 10 seconds
     async def sim_messages(self):
-        topic = "/csn-node-test-brew/tele/SENSOR"
+        topic = "csn/"+self.settings["BREW_SENSOR_ID"]+"/tele/SENSOR"
         self.message_loop = True
         while self.message_loop:
             await asyncio.sleep(10)
@@ -82,7 +90,7 @@ class LinkSimulator(object):
                                       "Factor":0.18,
                                       "Voltage":246,
                                       "Current":0.035},
-                            "topic":"csn-node-test-brew/tele/SENSOR"}
+                            "topic":topic}
             print('LinkSimulator RECV MSG:', topic)
             self.subscription_queue.put_nowait(message_dict)
         print("LinkSimulator message loop finished")
@@ -0,0 +1,100 @@
+"""
+Unix socket link for SensorHub and RemoteSensors, to a LocalBroker (see local_broker.py, run_broker.py)
+
+link = LinkUnix(settings) - instantiate object. settings = application settings e.g. "LOG_LEVEL"
+
+await link.start(server_settings) - CONNECT to the Unix socket at path server_settings "host"
+
+await link.finish() - cleanup, i.e. close the connection
+
+await link.put(sensor_id, event) - SENDS message to the broker
+
+await link.subscribe(subscription_settings) - SUBSCRIBES to the broker, settings { topic: }
+
+await link.get() - async GETS next message from the broker
+
+link.stop_get() - a pending (or the next) get() will return None, e.g. to end a message loop
+
+link.set_receiver(receiver) - call receiver(topic, payload) with each message, rather than queueing it for get()
+
+Each message is one line "PUB\t<topic>\t<json>" to the broker, and "MSG\t<topic>\t<json>" from the broker.
+"""
+
+import asyncio
+import simplejson as json
+
+from classes.uplink import Uplink, decode_message
+
+class LinkUnix(Uplink):
+
+    def __init__(self, settings=None):
+        super().__init__(settings)
+        print("LinkUnix __init__()")
+
+        self.reader = None
+        self.writer = None
+        self.read_task = None
+
+        self.subscription_queue = asyncio.Queue()
+        self.receiver = None
+
+    async def start(self, server_settings):
+        path = server_settings["host"]
+        try:
+            self.reader, self.writer = await asyncio.open_unix_connection(path)
+        except OSError as e:
+            print("LinkUnix connect {} exception: {}".format(path, e))
+            return
+
+        self.read_task = asyncio.ensure_future(self.read_messages())
+        print('LinkUnix.start() connected {}'.format(path))
+
+    async def put(self, sensor_id, event):
+        if self.writer is None:
+            return
+
+        message = json.dumps(event)
+        self.writer.write(b"PUB\t" + sensor_id.encode('utf-8') + b"\t" + message.encode('utf-8') + b"\n")
+        await self.writer.drain()
+
+        self.log.debug("LinkUnix.put() published {} {}", sensor_id, message)
+
+    async def subscribe(self, subscribe_settings):
+        if self.writer is None:
+            return
+
+        self.writer.write(b"SUB\t" + subscribe_settings["topic"].encode('utf-8') + b"\n")
+        await self.writer.drain()
+        print("LinkUnix.subscribed() {}".format(subscribe_settings["topic"]))
+
+    # Put each message from the broker in the subscription_queue, or pass it to the receiver
+    async def read_messages(self):
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                break
+            fields = line.rstrip(b"\n").split(b"\t", 2)
+            if fields[0] == b"MSG" and len(fields) == 3:
+                if self.receiver is None:
+                    self.subscription_queue.put_nowait(decode_message(fields[1].decode('utf-8'), fields[2]))
+                else:
+                    self.receiver(fields[1].decode('utf-8'), fields[2])
+        print("LinkUnix connection closed")
+
+    async def get(self):
+        return await self.subscription_queue.get()
+
+    def stop_get(self):
+        self.subscription_queue.put_nowait(None)
+
+    def set_receiver(self, receiver):
+        self.receiver = receiver
+        return True
+
+    async def finish(self):
+        if not self.writer is None:
+            self.writer.close()
+            self.writer = None
+        if not self.read_task is None:
+            self.read_task.cancel()
+        print("LinkUnix finished")
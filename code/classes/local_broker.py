@@ -0,0 +1,236 @@
+"""
+LocalBroker - a small in-process publish/subscribe broker, for testing and benchmarking the uplinks on one machine
+
+broker = get_broker(name) - the LocalBroker called 'name' in this process (created on first use)
+
+await broker.start_mqtt(host, port) - accept MQTT 3.1.1 clients (e.g. gmqtt, hbmqtt) on TCP host:port,
+                                      port 0 for any free port, see broker.mqtt_port
+await broker.start_unix(path) - accept LinkUnix clients on the Unix socket 'path'
+await broker.finish() - close the servers and client connections
+
+broker.publish(topic, payload) - deliver bytes 'payload' to the subscribers of 'topic'
+broker.subscribe(topic_filter, deliver) - call deliver(topic, payload) for each message matching 'topic_filter'
+broker.unsubscribe(deliver) - remove all the subscriptions of 'deliver'
+
+The in-memory links (LinkMemory) subscribe directly, the MQTT and Unix socket clients via their connection,
+so a message published with any transport is delivered to the matching subscribers of every transport.
+
+The MQTT support is the subset the links use: CONNECT (no authentication), PUBLISH QoS 0 and 1 (delivered at
+QoS 0, no retained messages), SUBSCRIBE, UNSUBSCRIBE, PINGREQ and DISCONNECT. The Unix socket protocol is
+one line per message, with tab-separated fields (the JSON payloads contain no raw tabs or newlines):
+    client -> broker: "SUB\t<topic filter>", "PUB\t<topic>\t<payload>"
+    broker -> client: "MSG\t<topic>\t<payload>"
+
+run_broker.py runs a LocalBroker on its own, e.g. for a SensorNode configured with the "unix" uplink.
+"""
+
+import os
+import asyncio
+
+# The LocalBrokers in this process, by name
+BROKERS = {}
+
+# MQTT control packet types (the high 4 bits of the first byte)
+CONNECT = 1
+CONNACK = 2
+PUBLISH = 3
+PUBACK = 4
+SUBSCRIBE = 8
+SUBACK = 9
+UNSUBSCRIBE = 10
+UNSUBACK = 11
+PINGREQ = 12
+PINGRESP = 13
+DISCONNECT = 14
+
+# Return the LocalBroker called 'name', creating it if this is the first use
+def get_broker(name="localhost"):
+    if not name in BROKERS:
+        BROKERS[name] = LocalBroker(name)
+    return BROKERS[name]
+
+# Return True if MQTT 'topic' matches 'topic_filter', which can include the + and # wildcards
+def topic_matches(topic_filter, topic):
+    filter_levels = topic_filter.split("/")
+    topic_levels = topic.split("/")
+    for i, level in enumerate(filter_levels):
+        if level == "#":
+            return True
+        if i >= len(topic_levels):
+            return False
+        if level != "+" and level != topic_levels[i]:
+            return False
+    return len(filter_levels) == len(topic_levels)
+
+# Return the MQTT 'remaining length' encoding of 'length'
+def encode_length(length):
+    encoded = bytearray()
+    while True:
+        byte = length % 128
+        length = length // 128
+        if length > 0:
+            byte |= 0x80
+        encoded.append(byte)
+        if length == 0:
+            return bytes(encoded)
+
+# Return an MQTT PUBLISH packet (QoS 0) of bytes 'payload' on 'topic'
+def publish_packet(topic, payload):
+    topic_bytes = topic.encode('utf-8')
+    remaining = len(topic_bytes) + 2 + len(payload)
+    return b"".join([ bytes([ PUBLISH << 4 ]), encode_length(remaining),
+                      len(topic_bytes).to_bytes(2, "big"), topic_bytes, payload ])
+
+class LocalBroker(object):
+
+    def __init__(self, name="localhost"):
+        self.name = name
+
+        self.subscriptions = [] # list of [ topic filter, deliver function ]
+
+        self.servers = []
+        self.writers = set() # the open client connections
+
+        self.mqtt_port = None
+        self.unix_path = None
+
+        self.published = 0 # count of messages published
+        self.delivered = 0 # count of messages delivered to subscribers
+
+    def subscribe(self, topic_filter, deliver):
+        self.subscriptions.append([ topic_filter, deliver ])
+
+    def unsubscribe(self, deliver, topic_filter=None):
+        self.subscriptions = [ s for s in self.subscriptions
+                               if not (s[1] == deliver and (topic_filter is None or s[0] == topic_filter)) ]
+
+    def publish(self, topic, payload):
+        self.published += 1
+        for topic_filter, deliver in self.subscriptions:
+            if topic_matches(topic_filter, topic):
+                self.delivered += 1
+                deliver(topic, payload)
+
+    async def start_mqtt(self, host="127.0.0.1", port=1883):
+        server = await asyncio.start_server(self.mqtt_client, host, port)
+        self.servers.append(server)
+        self.mqtt_port = server.sockets[0].getsockname()[1]
+        print("LocalBroker {} MQTT on {}:{}".format(self.name, host, self.mqtt_port))
+
+    async def start_unix(self, path):
+        if os.path.exists(path):
+            os.unlink(path)
+        server = await asyncio.start_unix_server(self.unix_client, path)
+        self.servers.append(server)
+        self.unix_path = path
+        print("LocalBroker {} on Unix socket {}".format(self.name, path))
+
+    async def finish(self):
+        for server in self.servers:
+            server.close()
+        for writer in list(self.writers):
+            writer.close()
+        for server in self.servers:
+            await server.wait_closed()
+        self.servers = []
+
+        if not self.unix_path is None and os.path.exists(self.unix_path):
+            os.unlink(self.unix_path)
+
+        print("LocalBroker {} finished, {} published {} delivered".format(self.name, self.published, self.delivered))
+
+    # Serve one MQTT client connection
+    async def mqtt_client(self, reader, writer):
+        self.writers.add(writer)
+
+        def deliver(topic, payload):
+            writer.write(publish_packet(topic, payload))
+
+        try:
+            while True:
+                header = await reader.readexactly(1)
+                packet_type = header[0] >> 4
+
+                # the 'remaining length', 1..4 bytes of 7 bits
+                remaining = 0
+                multiplier = 1
+                while True:
+                    byte = (await reader.readexactly(1))[0]
+                    remaining += (byte & 0x7F) * multiplier
+                    multiplier *= 128
+                    if byte & 0x80 == 0:
+                        break
+                body = await reader.readexactly(remaining)
+
+                if packet_type == CONNECT:
+                    writer.write(bytes([ CONNACK << 4, 2, 0, 0 ]))
+
+                elif packet_type == PUBLISH:
+                    qos = (header[0] >> 1) & 0x03
+                    topic_length = int.from_bytes(body[0:2], "big")
+                    topic = body[2:2+topic_length].decode('utf-8')
+                    position = 2 + topic_length
+                    if qos > 0:
+                        packet_id = body[position:position+2]
+                        position += 2
+                        if qos == 1:
+                            writer.write(bytes([ PUBACK << 4, 2 ]) + packet_id)
+                    self.publish(topic, body[position:])
+
+                elif packet_type == SUBSCRIBE or packet_type == UNSUBSCRIBE:
+                    packet_id = body[0:2]
+                    position = 2
+                    granted = bytearray()
+                    while position < len(body):
+                        filter_length = int.from_bytes(body[position:position+2], "big")
+                        topic_filter = body[position+2:position+2+filter_length].decode('utf-8')
+                        position += 2 + filter_length
+                        if packet_type == SUBSCRIBE:
+                            position += 1 # requested QoS, we grant 0
+                            granted.append(0)
+                            self.subscribe(topic_filter, deliver)
+                        else:
+                            self.unsubscribe(deliver, topic_filter)
+                    if packet_type == SUBSCRIBE:
+                        writer.write(bytes([ SUBACK << 4 ]) + encode_length(2 + len(granted)) + packet_id + granted)
+                    else:
+                        writer.write(bytes([ UNSUBACK << 4, 2 ]) + packet_id)
+
+                elif packet_type == PINGREQ:
+                    writer.write(bytes([ PINGRESP << 4, 0 ]))
+
+                elif packet_type == DISCONNECT:
+                    break
+
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.unsubscribe(deliver)
+            self.writers.discard(writer)
+            writer.close()
+
+    # Serve one LinkUnix client connection
+    async def unix_client(self, reader, writer):
+        self.writers.add(writer)
+
+        def deliver(topic, payload):
+            writer.write(b"MSG\t" + topic.encode('utf-8') + b"\t" + payload + b"\n")
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                fields = line.rstrip(b"\n").split(b"\t", 2)
+                if fields[0] == b"PUB" and len(fields) == 3:
+                    self.publish(fields[1].decode('utf-8'), fields[2])
+                elif fields[0] == b"SUB" and len(fields) == 2:
+                    self.subscribe(fields[1].decode('utf-8'), deliver)
+                else:
+                    print("LocalBroker {} bad Unix socket message {}".format(self.name, line[:80]))
+        except ConnectionError:
+            pass
+        finally:
+            self.unsubscribe(deliver)
+            self.writers.discard(writer)
+            writer.close()
@@ -5,18 +5,42 @@ LocalSensor - direct readings in loop from sensor hub
 import asyncio
 import time
 import random
+import math
 
-from classes.time_buffer import TimeBuffer, StatsBuffer
+from classes.time_buffer import TimeBuffer, StatsBuffer, RollupBuffer
+from classes.filters import make_filter
+from classes.log import Log
 
 STATS_HISTORY_SIZE = 1000 # Define a stats_buffer with 1000 entries, each 1 second long
 STATS_DURATION = 1
 
+MINUTE_HISTORY_SIZE = 1440 # 1-minute rollups for a day
+HOUR_HISTORY_SIZE = 168    # 1-hour rollups for a week
+
+# Adaptive sampling defaults, can be overridden in settings
+SAMPLE_PERIOD = 0.1         # seconds between readings when active, i.e. 10Hz
+SAMPLE_IDLE_PERIOD = 1.0    # seconds between readings when idle
+SAMPLE_IDLE_SECONDS = 60    # stats must be 'flat' for this long before we go idle
+SAMPLE_IDLE_DEVIATION = 10  # a stats record is 'flat' if its deviation is below this
+SAMPLE_WAKE_DELTA = 20      # any reading (or stats median) this far from the flat median wakes the sensor
+STATS_MIN_SAMPLES = 5       # when idle, each stats record is from (at least) this many readings, as the detectors need
+
 class LocalSensor():
     """
     LocalSensor polls a locally connected hardware sensor and sends values to the SensorHub.
 
     The local sensor is defined by instantiation argument "sensor" (e.g. a WeightSensor) which
     must provide the method "get_value()"
+
+    If settings["SAMPLE_ADAPTIVE"] is True the sensor is read every settings["SAMPLE_PERIOD"] seconds
+    while 'active' but drops to every settings["SAMPLE_IDLE_PERIOD"] seconds once the 1-second stats
+    have been flat for settings["SAMPLE_IDLE_SECONDS"] with no GRINDING or BREWING event. The first
+    reading that moves away from the flat median, or a GRINDING / BREWING event (via SensorHub calling
+    wake()), returns the sensor to the active rate.
+
+    While idle a 1-second stats record would hold a single reading, so with SAMPLE_ADAPTIVE each stats
+    record is from at least STATS_MIN_SAMPLES readings (i.e. the latest few seconds when idle), and the
+    flat weight before e.g. a pour is still there for the detectors' look-backs.
     """
 
     def __init__(self, settings=None, sensor_id=None, sensor=None, sensor_hub=None):
@@ -35,10 +59,52 @@ class LocalSensor():
         self.save_counter = 0 # cumulative count of how many samples we've collected
         print("Set save_count to", self.save_count)
 
+        self.log = Log("LocalSensor", settings)
+
+        # Adaptive sampling settings
+        self.adaptive = self.setting("SAMPLE_ADAPTIVE", False)
+        self.active_period = self.setting("SAMPLE_PERIOD", SAMPLE_PERIOD)
+        self.idle_period = self.setting("SAMPLE_IDLE_PERIOD", SAMPLE_IDLE_PERIOD)
+        self.idle_seconds = self.setting("SAMPLE_IDLE_SECONDS", SAMPLE_IDLE_SECONDS)
+        self.idle_deviation = self.setting("SAMPLE_IDLE_DEVIATION", SAMPLE_IDLE_DEVIATION)
+        self.wake_delta = self.setting("SAMPLE_WAKE_DELTA", SAMPLE_WAKE_DELTA)
+
+        self.idle = False           # True when sampling at the idle rate
+        self.flat_since = None      # timestamp since which the stats have been flat
+        self.flat_median = None     # median weight while flat
+        self.stats_ts = None        # timestamp of the latest stats record we have checked
+        self.wake_event = asyncio.Event() # set by wake() to cut short an idle sleep
+
+        # sampling statistics, returned by sampling_status()
+        self.sampling = { "samples": 0,
+                          "active_seconds": 0.0,
+                          "idle_seconds": 0.0,
+                          "process_time": 0.0,
+                          "wake_count": 0,
+                          "max_wake_latency": 0.0
+                        }
+
+        # Optional streaming filter applied to each reading before it is stored, see classes/filters.py
+        self.sample_filter = make_filter(self.settings)
+
+        # Longer-term history: each 1-second stats record updates the minute_buffer, each minute the hour_buffer
+        self.hour_buffer = RollupBuffer(size=HOUR_HISTORY_SIZE,
+                                        duration=3600,
+                                        settings=self.settings)
+
+        self.minute_buffer = RollupBuffer(size=MINUTE_HISTORY_SIZE,
+                                          duration=60,
+                                          settings=self.settings,
+                                          stats_buffer=self.hour_buffer)
+
         # Create a 30-entry x 1-second stats buffer
+        # With adaptive sampling a stats record may go back over the latest STATS_MIN_SAMPLES idle readings
         self.stats_buffer = StatsBuffer(size=STATS_HISTORY_SIZE,
                                         duration=STATS_DURATION,
-                                        settings=self.settings)
+                                        settings=self.settings,
+                                        stats_buffer=self.minute_buffer,
+                                        min_samples=STATS_MIN_SAMPLES if self.adaptive else None,
+                                        max_duration=STATS_MIN_SAMPLES * self.idle_period)
 
         #debug will have settings var for buffer size
         self.sample_buffer = TimeBuffer(size=1000, settings=self.settings, stats_buffer=self.stats_buffer)
@@ -46,45 +112,162 @@ class LocalSensor():
         # Add the buffers to the sensor_hub object so it can use it in event tests
         self.sensor_hub.add_buffers( self.sensor_id,
                                      { "sample_buffer": self.sample_buffer,
-                                       "stats_buffer": self.stats_buffer
+                                       "stats_buffer": self.stats_buffer,
+                                       "minute_buffer": self.minute_buffer,
+                                       "hour_buffer": self.hour_buffer
                                      })
 
+        # A sensor with update_tare() (e.g. WeightSensor) refines its tare from the Events detector state
+        self.tare_tracking = hasattr(self.sensor, "update_tare")
+        self.tare_stats_ts = None # timestamp of the latest stats record when update_tare() was called
+
+        # The SensorHub will call self.wake() on GRINDING or BREWING events
+        if self.adaptive:
+            self.sensor_hub.add_activity_listener(self)
+
+    # Return settings[name] if it is set, otherwise the default
+    def setting(self, name, default):
+        if self.settings is None or not name in self.settings:
+            return default
+        return self.settings[name]
+
+    # Shift the timestamps we hold by 'delta' seconds, called by the SensorHub after a clock jump
+    def shift(self, delta):
+        if not self.flat_since is None:
+            self.flat_since += delta
+        if not self.stats_ts is None:
+            self.stats_ts += delta
+
+    # Switch to the active sample rate, e.g. called by the SensorHub on a GRINDING or BREWING event
+    def wake(self, ts=None):
+        self.flat_since = ts
+        if self.idle:
+            self.idle = False
+            self.sampling["wake_count"] += 1
+            self.wake_event.set()
+            self.log.info("{:.3f} LocalSensor {} active", time.time(), self.sensor_id)
+
+    # Decide whether the sensor should be sampling at the idle or active rate, given the latest reading
+    def update_sample_rate(self, ts, value, prev_ts):
+        # Any reading away from the flat median immediately returns to the active rate
+        if self.idle:
+            if abs(value - self.flat_median) > self.wake_delta:
+                self.wake(ts)
+                # the change may have happened any time since the previous idle reading
+                wake_latency = ts - prev_ts
+                if wake_latency > self.sampling["max_wake_latency"]:
+                    self.sampling["max_wake_latency"] = wake_latency
+            return
+
+        # Otherwise we only need to check once per stats record (i.e. once per second)
+        stats_record = self.stats_buffer.get(0)
+        if stats_record is None or stats_record["ts"] == self.stats_ts:
+            return
+        self.stats_ts = stats_record["ts"]
+
+        stats = stats_record["value"]
+        if stats["median"] is None or stats["deviation"] is None:
+            return
+
+        if ( self.flat_since is None or
+             stats["deviation"] > self.idle_deviation or
+             abs(stats["median"] - self.flat_median) > self.wake_delta ):
+            self.flat_since = stats_record["ts"]
+            self.flat_median = stats["median"]
+            return
+
+        if stats_record["ts"] - self.flat_since > self.idle_seconds:
+            self.idle = True
+            self.wake_event.clear()
+            self.log.info("{:.3f} LocalSensor {} idle at {:.0f}", time.time(), self.sensor_id, self.flat_median)
+
+    # Return a dictionary of the sampling statistics, including the estimated saving from adaptive sampling
+    def sampling_status(self):
+        status = { "mode": "idle" if self.idle else "active", **self.sampling }
+        total_seconds = status["active_seconds"] + status["idle_seconds"]
+        # How many samples we would have taken at the active rate
+        full_rate_samples = total_seconds / self.active_period
+        status["saved_samples"] = max(0, math.floor(full_rate_samples - status["samples"]))
+        status["saved_ratio"] = status["saved_samples"] / full_rate_samples if full_rate_samples > 0 else 0
+        # Estimated cpu seconds saved, from the average cpu time per sample
+        if status["samples"] > 0:
+            status["saved_process_time"] = status["saved_samples"] * status["process_time"] / status["samples"]
+        return status
+
     # start() method is async with permanent loop, using asyncio.sleep().
     async def start(self):
-        # minimum seconds between sensor readings
-        SENSOR_READ_PERIOD = 0.1 # reading sensor at max 10Hz
+        prev_ts = None
 
         self.quit = False
         while not self.quit:
-            ts = time.time()
+            t_start = time.process_time()
+            loop_start = time.monotonic()
             if self.sensor is None:
+                # no sensor provided, so generate random test values 0..100
                 value = random.random() * 100
             else:
-                # no sensor provided, so generate random test values 0..100
                 value = self.sensor.get_value()
 
+            # Timestamp the reading with the time it was acquired by the hardware if the sensor
+            # provides that (e.g. WeightSensor), converted to wall-clock time by the SensorHub.
+            acquisition_ts = getattr(self.sensor, "acquisition_ts", None)
+            if acquisition_ts is None:
+                acquisition_ts = time.monotonic()
+            ts = self.sensor_hub.timestamp(acquisition_ts)
+
+            # remove spikes etc. (e.g. settings["SAMPLE_FILTER"] = "hampel")
+            if not self.sample_filter is None:
+                value = self.sample_filter.filter(ts, value)
+
             # save the reading to the sample_buffer
             self.sample_buffer.put(ts, value)
 
             # call the hub to process the reading, including test/send events to Platform
             await self.sensor_hub.process_reading(ts, self.sensor_id)
 
-            # calculate time (seconds) taken to process reading
-            process_time = time.time() - ts
+            # record the time spent at the current sample rate
+            if not prev_ts is None:
+                if self.idle:
+                    self.sampling["idle_seconds"] += ts - prev_ts
+                else:
+                    self.sampling["active_seconds"] += ts - prev_ts
+
+            if self.adaptive:
+                self.update_sample_rate(ts, value, prev_ts)
+
+            # Background tare tracking, once per stats record (i.e. once per second)
+            if self.tare_tracking:
+                stats_record = self.stats_buffer.get(0)
+                if not stats_record is None and stats_record["ts"] != self.tare_stats_ts:
+                    self.tare_stats_ts = stats_record["ts"]
+                    self.sensor.update_tare(self.sensor_hub.station(self.sensor_id).events, self.sensor_id)
+
+            prev_ts = ts
+            self.sampling["samples"] += 1
+            self.sampling["process_time"] += time.process_time() - t_start
+
+            # calculate time (seconds) taken to read and process the reading
+            process_time = time.monotonic() - loop_start
 
             # If the process_time was more than 1 second, print log message
-            if self.settings["LOG_LEVEL"] <= 2 and process_time > 1:
-                print("{:.3f} LocalSensor {} process_time was {:.1f}".format(time.time(),
-                                                                             self.sensor_id,
-                                                                             process_time))
+            if process_time > 1:
+                self.log.info("{:.3f} LocalSensor {} process_time was {:.1f}", time.time(), self.sensor_id, process_time)
 
-            # set the sleep time so total loop is at least SENSOR_READ_PERIOD
-            sleep_time = SENSOR_READ_PERIOD - process_time
+            # set the sleep time so total loop is at least the sample period
+            sample_period = self.idle_period if self.idle else self.active_period
+            sleep_time = sample_period - process_time
             if sleep_time < 0.01: # could be zero or negative, but we should always await
                 sleep_time = 0.01
 
-            # sleep 0.01 .. SENSOR_READ_PERIOD seconds.
-            await asyncio.sleep(sleep_time)
+            # sleep 0.01 .. sample_period seconds.
+            if self.idle:
+                # when idle, wake() can cut the sleep short
+                try:
+                    await asyncio.wait_for(self.wake_event.wait(), sleep_time)
+                except asyncio.TimeoutError:
+                    pass
+            else:
+                await asyncio.sleep(sleep_time)
 
         print("LocalSensor {} finished".format(self.sensor_id))
 
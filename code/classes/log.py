@@ -0,0 +1,175 @@
+"""
+Log - level-guarded logging with lazy formatting, for the per-reading and per-message code
+
+log = Log(name, settings) - e.g. Log("TimeBuffer", settings), the level is settings["LOG_LEVEL"] (default 2)
+
+log.debug(message, *args) - written if LOG_LEVEL is 1
+log.info(message, *args)  - written if LOG_LEVEL <= 2
+log.warn(message, *args)  - written if LOG_LEVEL <= 3
+log.error(message, *args) - always written
+
+The message is only formatted (message.format(*args)) if it is written, and each method is bound when the
+Log is created, so below the LOG_LEVEL it is a call to a function that does nothing. Where even working out
+the arguments is too costly for the path (e.g. TimeBuffer.get()), the call is guarded by the caller's
+'if self.log_level == 1:' as before.
+
+Without settings["LOG_FILE"] the messages are printed, as the print() calls they replace. With "LOG_FILE"
+the messages (unformatted) are appended to a ring buffer of settings["LOG_BUFFER_SIZE"] (default 10000)
+records, and a LogWriter thread formats and writes them to the file every settings["LOG_FLUSH_PERIOD"] secs
+(default 1) or when the buffer is half full, so the event loop never waits for the file. If the buffer fills
+between flushes the oldest messages are lost, and the count is written to the file. Each line is
+    <unix time> <DEBUG|INFO|WARN|ERROR> <name> <message>
+As the arguments are formatted later, they should not be changed after the call (numbers and strings are fine).
+
+All the Logs with the same LOG_FILE share one LogWriter, flushed when the program exits or by close_logs().
+"""
+
+import time
+import atexit
+import threading
+from collections import deque
+
+BUFFER_SIZE = 10000 # messages held between flushes
+FLUSH_PERIOD = 1    # secs between writes to the LOG_FILE
+
+DEBUG = 1
+INFO = 2
+WARN = 3
+ERROR = 4
+
+LEVEL_NAMES = { DEBUG: "DEBUG", INFO: "INFO", WARN: "WARN", ERROR: "ERROR" }
+
+# The LogWriter for each LOG_FILE
+WRITERS = {}
+
+# The method of a Log below its LOG_LEVEL
+def skip(message, *args):
+    pass
+
+def format_message(message, args):
+    if len(args) == 0:
+        return message
+    try:
+        return message.format(*args)
+    except Exception as e:
+        return "{} {} (log format error {})".format(message, args, e)
+
+class Log(object):
+
+    def __init__(self, name, settings=None):
+        self.name = name
+
+        if settings is None:
+            settings = {}
+        self.level = settings["LOG_LEVEL"] if "LOG_LEVEL" in settings else 2
+
+        filename = settings["LOG_FILE"] if "LOG_FILE" in settings else None
+        self.writer = None if filename is None else get_writer(filename, settings)
+
+        self.debug = self.method(DEBUG)
+        self.info = self.method(INFO)
+        self.warn = self.method(WARN)
+        self.error = self.method(ERROR)
+
+    # Return the function for messages of 'level', i.e. skip() if they are not to be written
+    def method(self, level):
+        if level < self.level:
+            return skip
+
+        if self.writer is None:
+            def print_message(message, *args):
+                print(format_message(message, args))
+            return print_message
+
+        put = self.writer.put
+        name = self.name
+        level_name = LEVEL_NAMES[level]
+        def put_message(message, *args):
+            put(( time.time(), level_name, name, message, args ))
+        return put_message
+
+class LogWriter(object):
+
+    def __init__(self, filename, size=BUFFER_SIZE, period=FLUSH_PERIOD):
+        self.filename = filename
+        self.period = period
+
+        # [ ts, level name, log name, message, args ], appended by put() and removed by flush()
+        self.buffer = deque(maxlen=size)
+        self.wake_size = size // 2
+
+        self.dropped = 0  # messages lost from a full buffer, counted by put()
+        self.reported = 0 # of those, written to the file by flush()
+
+        self.file = open(filename, "a")
+        self.lock = threading.Lock() # flush() is called by the thread and by close()
+        self.wake = threading.Event()
+        self.quit = False
+
+        self.thread = threading.Thread(target=self.run, name="LogWriter", daemon=True)
+        self.thread.start()
+
+        atexit.register(self.close)
+
+    # Called on the event loop, so no locks
+    def put(self, record):
+        buffer = self.buffer
+        if len(buffer) == buffer.maxlen:
+            self.dropped += 1
+        buffer.append(record)
+        if len(buffer) == self.wake_size:
+            self.wake.set()
+
+    def run(self):
+        while not self.quit:
+            self.wake.wait(self.period)
+            self.wake.clear()
+            self.flush()
+
+    # Format and write the buffered messages
+    def flush(self):
+        with self.lock:
+            if self.file is None:
+                return
+
+            lines = []
+            dropped = self.dropped - self.reported
+            if dropped > 0:
+                lines.append("{:.3f} WARN LogWriter {} messages lost, LOG_BUFFER_SIZE {}\n".format(time.time(),
+                                                                                              dropped,
+                                                                                              self.buffer.maxlen))
+                self.reported += dropped
+
+            buffer = self.buffer
+            while len(buffer) > 0:
+                ts, level_name, name, message, args = buffer.popleft()
+                lines.append("{:.3f} {} {} {}\n".format(ts, level_name, name, format_message(message, args)))
+
+            if len(lines) > 0:
+                self.file.write("".join(lines))
+                self.file.flush()
+
+    def close(self):
+        self.quit = True
+        self.wake.set()
+        if self.thread.is_alive() and not self.thread is threading.current_thread():
+            self.thread.join(timeout=5)
+        self.flush()
+        with self.lock:
+            if not self.file is None:
+                self.file.close()
+                self.file = None
+
+# Return the LogWriter for 'filename', created on first use
+def get_writer(filename, settings):
+    if not filename in WRITERS:
+        size = settings["LOG_BUFFER_SIZE"] if "LOG_BUFFER_SIZE" in settings else BUFFER_SIZE
+        period = settings["LOG_FLUSH_PERIOD"] if "LOG_FLUSH_PERIOD" in settings else FLUSH_PERIOD
+        WRITERS[filename] = LogWriter(filename, size=size, period=period)
+    return WRITERS[filename]
+
+# Write the buffered messages and close the LOG_FILEs, e.g. at the end of a run
+def close_logs():
+    for writer in WRITERS.values():
+        writer.close()
+    WRITERS.clear()
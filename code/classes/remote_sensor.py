@@ -2,23 +2,27 @@
 RemoteSensor - downstream sensors to Sensor Node
 """
 
-import asyncio
-import time
-
-#from classes.link_hbmqtt import LinkHBMQTT as SensorLink
-from classes.link_gmqtt import LinkGMQTT as SensorLink
 from classes.time_buffer import TimeBuffer, StatsBuffer
 
-STATS_HISTORY_SIZE = 1000 # Define a stats_buffer with 1000 entries, each 1 second long
-STATS_DURATION = 1
+POWER_HISTORY_SIZE = 1000 # the power of the latest 1000 messages
+
+# Return the power (watts) from a Tasmota "tele/SENSOR" message, or None if the message has no power reading
+def tasmota_power(message):
+    try:
+        return message["ENERGY"]["Power"]
+    except (KeyError, TypeError):
+        return None
 
 class RemoteSensor():
     """
     RemoteSensor represents a sensor within the Node connected remotely, e.g. via
     a local wifi ssid broadcast by the sensor hub.
+
+    The messages from the sensor (topic "csn/<sensor_id>/tele/SENSOR") are received by the
+    SensorSubscriber shared by all the RemoteSensors, which calls process_message().
     """
 
-    def __init__(self, settings=None, sensor_id=None, sensor_hub=None):
+    def __init__(self, settings=None, sensor_id=None, sensor_hub=None, sensor_subscriber=None):
         print("RemoteSensor() __init__ {}".format(sensor_id))
 
         self.settings = settings
@@ -26,60 +30,39 @@ class RemoteSensor():
         self.sensor_hub = sensor_hub
 
         self.quit = False
-        self.finish_event = asyncio.Event()
 
-        #debug - StatsBuffer should have a FUNCTION to extract the value from the reading
-        # Create a 30-entry x 1-second stats buffer
-        #self.stats_buffer = StatsBuffer(size=STATS_HISTORY_SIZE,
-        #                                duration=STATS_DURATION,
-        #                                settings=self.settings)
+        # The power extracted once from each message into stats_buffer.value_buffer, for the Events detectors.
+        # No stats records are made (duration=None), as the detectors use each message's power, see test_grind().
+        self.stats_buffer = StatsBuffer(duration=None,
+                                        settings=self.settings,
+                                        value_fn=tasmota_power,
+                                        value_buffer_size=POWER_HISTORY_SIZE)
 
         #debug setting var for buffer size
-        self.sample_buffer = TimeBuffer(size=1000, settings=self.settings, stats_buffer=None )
-
-        # Add the sample_buffer to the sensor_hub object so Events can use it in event tests
-        self.sensor_hub.add_buffers(self.sensor_id, { "sample_buffer": self.sample_buffer } )
-
-        self.sensor_link = SensorLink(settings=self.settings)
-
+        self.sample_buffer = TimeBuffer(size=1000, settings=self.settings, stats_buffer=self.stats_buffer )
 
-    async def start(self):
-        link_settings = {}
-        link_settings["host"] = self.settings["SENSOR_HOST"]
-        link_settings["user"] = self.settings["SENSOR_USER"]
-        link_settings["password"] = self.settings["SENSOR_PASSWORD"]
-        await self.sensor_link.start(link_settings)
+        # Add the buffers to the sensor_hub object so Events can use them in event tests
+        self.sensor_hub.add_buffers(self.sensor_id, { "sample_buffer": self.sample_buffer,
+                                                      "stats_buffer": self.stats_buffer
+                                                    })
 
-        subscribe_settings = {}
-        subscribe_settings["topic"] = "csn/"+self.sensor_id+"/tele/SENSOR"
-        await self.sensor_link.subscribe(subscribe_settings)
+        self.topic = "csn/"+self.sensor_id+"/tele/SENSOR"
 
-        while True:
-            get_task = asyncio.ensure_future(self.sensor_link.get())
-            finish_task = asyncio.ensure_future(self.finish_event.wait())
+        sensor_subscriber.add_handler(self.topic, self.process_message)
 
-            finished, pending = await asyncio.wait( [ get_task, finish_task ],
-                                                    return_when=asyncio.FIRST_COMPLETED )
+    # Called by the SensorSubscriber with each message from this sensor
+    async def process_message(self, message):
+        if self.quit:
+            return
 
-            # was self.quit just set in self.finish()?
-            if self.quit:
-                break
+        # The time the message was received, converted to wall-clock time by the SensorHub
+        ts = self.sensor_hub.timestamp()
 
-            message = finished.pop().result()
+        self.sample_buffer.put(ts, message)
 
-            ts = time.time()
-
-            self.sample_buffer.put(ts, message)
-
-            await self.sensor_hub.process_reading(ts, self.sensor_id)
-
-        print("RemoteSensor() {} finished".format(self.sensor_id))
+        await self.sensor_hub.process_reading(ts, self.sensor_id)
 
     async def finish(self):
         print("RemoteSensor {} set to finish".format(self.sensor_id))
         self.quit = True
-        self.finish_event.set()
-
-        await self.sensor_link.finish()
-
         print("RemoteSendor() {} finish completed".format(self.sensor_id))
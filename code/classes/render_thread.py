@@ -0,0 +1,91 @@
+# ----------------------------------------------------------------------
+# ----------------------------------------------------------------------
+# Display render thread
+#
+# The Display posts its drawing (PIL images, RGB565 conversion and the SPI transfers) to a RenderThread,
+# so a slow LCD update never blocks the asyncio loop that samples the sensors and keeps MQTT alive.
+#
+# Each display region (e.g. "value", "pot", "events") has a single-slot mailbox, and a post replaces
+# whatever is waiting in that region's slot, so only the newest state of a region is drawn:
+#
+#   renderer = RenderThread(settings)
+#   renderer.start()
+#   renderer.post("value", display.draw_value, 1234)   # draw_value(1234) on the render thread
+#   renderer.append("chart", display.draw_chart, ( ts, bar_height )) # draw_chart([ items since last draw ])
+#   renderer.finish()                                  # draw anything waiting, then stop the thread
+#
+# append() is for a region where every item is needed (e.g. the chart columns): the items posted
+# since the region was last drawn are passed to its draw function as one list.
+# ----------------------------------------------------------------------
+# ----------------------------------------------------------------------
+
+import time
+import threading
+
+class RenderThread(object):
+
+    def __init__(self, settings=None):
+        self.log_level = 2 if settings is None or not "LOG_LEVEL" in settings else settings["LOG_LEVEL"]
+
+        self.mailbox = {} # region -> [ draw function, args ] waiting to be drawn
+        self.condition = threading.Condition()
+        self.stopping = False
+        self.thread = None
+
+        self.posts = 0     # count of posts, i.e. post() and append() calls
+        self.draws = 0     # count of draw function calls, i.e. posts less those replaced by a newer post
+        self.draw_time = 0 # total secs in draw functions
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name="RenderThread", daemon=True)
+        self.thread.start()
+
+    # Put draw(*args) in the 'region' slot, replacing any draw waiting there
+    def post(self, region, draw, *args):
+        with self.condition:
+            self.posts += 1
+            self.mailbox[region] = [ draw, args ]
+            self.condition.notify()
+
+    # Add 'item' to the list to be passed to draw(items) for 'region'
+    def append(self, region, draw, item):
+        with self.condition:
+            self.posts += 1
+            if region in self.mailbox:
+                self.mailbox[region][1][0].append(item)
+            else:
+                self.mailbox[region] = [ draw, ( [ item ], ) ]
+            self.condition.notify()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while len(self.mailbox) == 0 and not self.stopping:
+                    self.condition.wait()
+                if len(self.mailbox) == 0:
+                    return
+                mailbox = self.mailbox
+                self.mailbox = {}
+
+            for region, (draw, args) in mailbox.items():
+                t_start = time.perf_counter()
+                try:
+                    draw(*args)
+                except Exception as e:
+                    if self.log_level <= 3:
+                        print("RenderThread {} draw exception {}: {}".format(region, type(e).__name__, e))
+                self.draws += 1
+                self.draw_time += time.perf_counter() - t_start
+
+    # Draw whatever is waiting, then stop the thread
+    def finish(self, timeout=5):
+        with self.condition:
+            self.stopping = True
+            self.condition.notify()
+
+        if not self.thread is None:
+            self.thread.join(timeout)
+            self.thread = None
+
+        if self.log_level <= 2:
+            print("RenderThread finished, {} posts {} draws {:.3f} secs".format(self.posts, self.draws, self.draw_time))
@@ -0,0 +1,165 @@
+# ----------------------------------------------------------------------
+# ----------------------------------------------------------------------
+# Replay
+#
+# Offline replay of recorded weight readings through the Events detector.
+#
+# Each call to replay_day() builds its own sample_buffer / stats_buffer / Events,
+# exactly as LocalSensor and SensorHub do on the node, so every recorded day is
+# processed in isolation and the calls can safely run in separate processes.
+#
+# A 'day' is a list of CSV files of <ts>,<weight> readings (as written by TimeBuffer.save())
+# which are played in filename order through the same detector state.
+#
+# replay_day(day, filenames, settings, params) returns a python dictionary:
+#   { "day": <day name>,
+#     "files": <list of filenames played>,
+#     "samples": <count of readings played>,
+#     "begin_ts": <ts of first reading>, "end_ts": <ts of last reading>,
+#     "events": [ { "ts": , "event_code": , "weight": , ... }, ... ],
+#     "process_time": <cpu seconds used>
+#   }
+# ----------------------------------------------------------------------
+# ----------------------------------------------------------------------
+
+import time
+
+from classes.time_buffer import TimeBuffer, StatsBuffer
+from classes.events import Events, EventCode
+
+SAMPLE_BUFFER_SIZE = 1000 # As LocalSensor
+STATS_HISTORY_SIZE = 1000
+STATS_DURATION = 1
+
+# Event codes counted in the per-day summary, with their summary column names
+SUMMARY_EVENTS = { EventCode.NEW: "NEW",
+                   EventCode.POURED: "POURED",
+                   EventCode.EMPTY: "EMPTY"
+                 }
+
+# Count the lines in a file, so we can size the TimeBuffer the recording is loaded into
+def count_lines(filename):
+    count = 0
+    with open(filename, "r") as fp:
+        for line in fp:
+            count += 1
+    return count
+
+# A Replay holds the detector state for one day.
+# 'params' is an optional dictionary of Events attributes to override, e.g. { "MIN_CUP_WEIGHT": 30 }
+# 'sample_buffer' is an optional TimeBuffer (already linked to 'stats_buffer') to use for the weight readings.
+# 'sample_filter' is an optional filter (see classes/filters.py) applied to each reading, as LocalSensor.
+class Replay(object):
+
+    def __init__(self, day, settings, params=None, sample_buffer=None, stats_buffer=None, sample_filter=None):
+        self.t_start = time.process_time()
+
+        self.day = day
+        self.settings = settings
+        self.weight_sensor_id = settings["WEIGHT_SENSOR_ID"]
+
+        # Create the same buffers as LocalSensor for the weight sensor
+        if sample_buffer is None:
+            stats_buffer = StatsBuffer(size=STATS_HISTORY_SIZE,
+                                       duration=STATS_DURATION,
+                                       settings=settings)
+
+            sample_buffer = TimeBuffer(size=SAMPLE_BUFFER_SIZE, settings=settings, stats_buffer=stats_buffer)
+
+        self.sample_buffer = sample_buffer
+
+        self.sample_filter = sample_filter
+
+        self.events = Events(settings=settings)
+
+        # Override detector thresholds, e.g. for a parameter sweep
+        if params is not None:
+            for name, value in params.items():
+                if not hasattr(self.events, name):
+                    raise NameError("Bad Events parameter: {}".format(name))
+                setattr(self.events, name, value)
+
+        self.events.sensor_buffers[self.weight_sensor_id] = { "sample_buffer": sample_buffer,
+                                                              "stats_buffer": stats_buffer
+                                                            }
+
+        self.result = { "day": day,
+                        "files": [],
+                        "samples": 0,
+                        "begin_ts": None,
+                        "end_ts": None,
+                        "events": [],
+                        "process_time": 0
+                      }
+
+    # Called (e.g. by TimeBuffer.play()) for each recorded reading
+    def process_sample(self, ts, value):
+        result = self.result
+        if result["begin_ts"] is None:
+            result["begin_ts"] = ts
+        result["end_ts"] = ts
+        result["samples"] += 1
+
+        if not self.sample_filter is None:
+            value = self.sample_filter.filter(ts, value)
+
+        self.sample_buffer.put(ts, value)
+
+        for event in self.events.test(ts, self.weight_sensor_id):
+            result["events"].append({ "ts": ts, **event })
+
+    # Load a CSV file of <ts>,<value> readings and play them through the detector
+    def play_file(self, filename):
+        line_count = count_lines(filename)
+        if line_count == 0:
+            return
+
+        recording = TimeBuffer(size=line_count, settings=self.settings)
+        recording.load(filename)
+
+        # TimeBuffer.load() skips lines that are not <ts>,<value> (e.g. server event logs)
+        if recording.get(0) is None:
+            if self.settings["LOG_LEVEL"] <= 2:
+                print("Replay {} skipping {}, no readings".format(self.day, filename))
+            return
+
+        self.result["files"].append(filename)
+
+        recording.play(self.process_sample)
+
+    # Return the result dictionary (see above)
+    def finish(self):
+        self.result["process_time"] = time.process_time() - self.t_start
+        return self.result
+
+# Play the readings in 'filenames' through a fresh Events detector.
+def replay_day(day, filenames, settings, params=None, sample_filter=None):
+    replay = Replay(day, settings, params=params, sample_filter=sample_filter)
+
+    for filename in sorted(filenames):
+        replay.play_file(filename)
+
+    return replay.finish()
+
+# Return a summary of the replay_day() result, e.g. for a per-day report
+#   { "day":, "samples":, "NEW":, "POURED":, "EMPTY":, "new_times": [ <ts of each NEW event> ] }
+def summarize(result):
+    summary = { "day": result["day"],
+                "samples": result["samples"],
+                "begin_ts": result["begin_ts"],
+                "end_ts": result["end_ts"],
+                "process_time": result["process_time"],
+                "new_times": []
+              }
+
+    for column in SUMMARY_EVENTS.values():
+        summary[column] = 0
+
+    for event in result["events"]:
+        event_code = event["event_code"]
+        if event_code == EventCode.NEW:
+            summary["new_times"].append(event["ts"])
+        if event_code in SUMMARY_EVENTS:
+            summary[SUMMARY_EVENTS[event_code]] += 1
+
+    return summary
@@ -0,0 +1,80 @@
+# ----------------------------------------------------------------------
+# ----------------------------------------------------------------------
+# SensorClock
+#
+# Maps monotonic acquisition timestamps (time.monotonic()) to wall-clock (unix) timestamps.
+#
+# The sensors record *when* a reading was acquired with time.monotonic(), e.g. the HX711 records
+# the time the DOUT pin went ready, so the timestamps do not include the time spent reading the
+# hardware or any step in the system clock. The SensorHub converts those to the unix timestamps
+# stored in the TimeBuffers via clock.timestamp(mono).
+#
+# The offset (wall clock - monotonic clock) is smoothed with an exponentially weighted moving
+# average (weight settings["CLOCK_SMOOTHING"]) so gradual NTP slewing is followed without jitter.
+#
+# A change in the measured offset of more than settings["CLOCK_JUMP_SECONDS"] is treated as a
+# clock *jump* (e.g. NTP setting the clock after boot): the offset is reset to the new value and
+# update() returns the size of the jump so the SensorHub can shift the timestamps already stored.
+#
+# Usage:
+#   clock = SensorClock(settings)
+#   jump = clock.update()          # 0 unless the wall clock has stepped, returns step in seconds
+#   ts = clock.timestamp(mono)     # unix timestamp for monotonic time 'mono'
+# ----------------------------------------------------------------------
+# ----------------------------------------------------------------------
+
+import time
+
+CLOCK_SMOOTHING = 0.01      # EWMA weight given to each new offset measurement
+CLOCK_JUMP_SECONDS = 0.5    # offset change (seconds) treated as a clock jump
+
+class SensorClock(object):
+
+    def __init__(self, settings=None):
+        self.settings = settings
+
+        if settings is not None and "CLOCK_SMOOTHING" in settings:
+            self.smoothing = settings["CLOCK_SMOOTHING"]
+        else:
+            self.smoothing = CLOCK_SMOOTHING
+
+        if settings is not None and "CLOCK_JUMP_SECONDS" in settings:
+            self.jump_seconds = settings["CLOCK_JUMP_SECONDS"]
+        else:
+            self.jump_seconds = CLOCK_JUMP_SECONDS
+
+        self.offset = None      # smoothed (wall clock - monotonic clock) in seconds
+
+        self.jump_count = 0     # how many clock jumps have been absorbed
+        self.jump_total = 0.0   # sum of those jumps (seconds)
+
+        self.update()
+
+    # Measure the current offset of the wall clock from the monotonic clock
+    def measure(self):
+        return time.time() - time.monotonic()
+
+    # Update the smoothed offset, return the size of a clock jump (seconds) or 0
+    def update(self):
+        offset = self.measure()
+
+        if self.offset is None:
+            self.offset = offset
+            return 0
+
+        delta = offset - self.offset
+
+        if abs(delta) > self.jump_seconds:
+            self.offset = offset
+            self.jump_count += 1
+            self.jump_total += delta
+            return delta
+
+        self.offset += self.smoothing * delta
+        return 0
+
+    # Return the unix timestamp for the monotonic timestamp 'mono' (default now)
+    def timestamp(self, mono=None):
+        if mono is None:
+            mono = time.monotonic()
+        return mono + self.offset
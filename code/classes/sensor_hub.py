@@ -1,23 +1,22 @@
 """
 The SensorHub, instantiated by a SensorNode with s = SensorHub(settings):
+* the SensorHub will instantiate a Station for each coffee pot (see station.py), by default one
 * the SensorNode will also instantiate LocalSensors and RemoteSensors, passing the SensorHub to them
-* the LocalSensors and RemoteSensors will make their TimeBuffers visible to the SensorHub, and so to Events.
-* the SensorHub will instantiate an Uplink for sending data to the Platform
-* the SensorHub will instantiate an Events to test incoming date for patterns
+* the LocalSensors and RemoteSensors will make their TimeBuffers visible to the SensorHub, and so to
+  the Events of their Station.
+* the SensorHub will instantiate an Uplink for sending data to the Platform, shared by the Stations
+* each Station will instantiate an Events to test incoming date for patterns
 * the SensorHub receives data from the LocalSensors and RemoteSensors
-* on each data 'tick' the SensorHub calls the Events.test(ts,sensor_id) method
+* on each data 'tick' the SensorHub calls the Station's Events.test(ts,sensor_id) method
 * Events will be sent via the Uplink to the Platform when appropriate.
 """
-import simplejson as json
-from simplejson.errors import JSONDecodeError
 import time
-import math
 
-from classes.link_simulator import LinkSimulator
-#from classes.link_hbmqtt import LinkHBMQTT as Uplink
-from classes.link_gmqtt import LinkGMQTT as Uplink
-from classes.display import Display
-from classes.events import Events, EventCode
+from classes.events import EventCode
+from classes.sensor_clock import SensorClock
+from classes.station import Station, load_stations
+from classes.uplink import load_uplink
+from classes.log import Log
 
 class SensorHub(object):
     """
@@ -30,33 +29,37 @@ class SensorHub(object):
     def __init__(self, settings=None):
         print("SensorHub __init()__")
         self.settings = settings
+        self.log = Log("SensorHub", settings)
 
-        self.new_status = None # timestamp, weight of current pot of coffee
+        # Converts the sensors' monotonic acquisition times to unix timestamps, see timestamp()
+        self.clock = SensorClock(settings=self.settings)
 
-        self.grind_status = None # most recent timestamp, power from grinder
+        # Connect to the platform with the link chosen by settings["UPLINK"] (or SIMULATE_UPLINK), see uplink.py,
+        # only importing the MQTT client (gmqtt) if it is used
+        self.uplink = load_uplink(self.settings, "UPLINK", "SIMULATE_UPLINK")
 
-        self.brew_status = None # most recent timestamp, power from brew machine
+        # STATIONS, i.e. the coffee pots, each with its own Events and status, by station SENSOR_ID
+        self.stations = {}
 
-        # LCD DISPLAY
+        # The Station of each sensor_id, so process_reading() is a dictionary lookup
+        self.sensor_stations = {}
 
-        self.display = Display(self.settings)
-
-        # EVENTS PATTERN MATCH
-
-        self.events = Events(settings=self.settings)
-
-        # Connect to the platform
-        if ( "SIMULATE_UPLINK" in self.settings and
-                 self.settings["SIMULATE_UPLINK"]):
-            self.uplink = LinkSimulator(settings=self.settings)
-        else:
-            self.uplink = Uplink(settings=self.settings)
+        for station_settings in load_stations(self.settings):
+            station = Station(settings=station_settings, uplink=self.uplink)
+            self.stations[station.station_id] = station
+            for sensor_id in station.sensor_ids:
+                self.sensor_stations[sensor_id] = station
 
+        # The first station, which has the LCD display
+        primary_station = next(iter(self.stations.values()))
+        self.display = primary_station.display
+        self.events = primary_station.events
 
     # start() is async to allow Uplink.put
     async def start(self, ts):
 
-        self.display.begin()
+        for station in self.stations.values():
+            station.begin()
 
         uplink_settings = {}
         uplink_settings["host"] = self.settings["PLATFORM_HOST"]
@@ -66,172 +69,72 @@ class SensorHub(object):
 
         await self.uplink.start(uplink_settings)
 
-        # Send startup message
-        startup_event = { "acp_ts": ts,
-                          "acp_id": self.settings["SENSOR_ID"],
-                          "acp_confidence": 1,
-                          "event_code": EventCode.STARTUP
-                        }
+        for station in self.stations.values():
+            # Send startup message
+            startup_event = { "acp_ts": ts,
+                              "acp_id": station.station_id,
+                              "acp_confidence": 1,
+                              "event_code": EventCode.STARTUP
+                            }
 
-        #send to platform
-        await self.uplink.put(self.settings["SENSOR_ID"], startup_event)
+            #send to platform
+            await self.uplink.put(station.station_id, startup_event)
+
+    # Return the Station with sensor 'sensor_id'
+    def station(self, sensor_id):
+        if not sensor_id in self.sensor_stations:
+            raise NameError("Bad sensor id: {}".format(sensor_id))
+        return self.sensor_stations[sensor_id]
 
     # A LocalSensor or RemoteSensor will call this add_buffers() method to
-    # make their TimeBuffers visible to Events
+    # make their TimeBuffers visible to the Events of their Station
     # e.g. { "sample_buffer": self.sample_buffer,
     #        "stats_buffer": self.stats_buffer
     #      }
     def add_buffers(self, sensor_id, buffers):
         print("SensorHub adding buffers for {}".format(sensor_id))
-        self.events.sensor_buffers[sensor_id] = buffers
-
-    # watchdog is called by Watchdog coroutine periodically
+        self.station(sensor_id).events.sensor_buffers[sensor_id] = buffers
+
+    # A LocalSensor with adaptive sampling will call add_activity_listener() so that
+    # its wake(ts) method is called on GRINDING or BREWING events at its Station.
+    def add_activity_listener(self, listener):
+        self.station(listener.sensor_id).activity_listeners.append(listener)
+
+    # Return the unix timestamp for a reading acquired at monotonic time 'mono' (default now).
+    # Called by the LocalSensors and RemoteSensors for each reading, so a jump in the wall clock
+    # is detected before the reading is stored.
+    def timestamp(self, mono=None):
+        jump = self.clock.update()
+        if jump != 0:
+            self.clock_jump(jump)
+        return self.clock.timestamp(mono)
+
+    # The wall clock has jumped by 'delta' seconds (e.g. an NTP step), so shift every timestamp
+    # already stored to be consistent with the new readings. This keeps the time durations used in
+    # the Events tests and the StatsBuffer periods correct across the jump.
+    def clock_jump(self, delta):
+        self.log.warn("{:.3f} SensorHub clock jump {:+.3f} secs, shifting buffers", time.time(), delta)
+
+        for station in self.stations.values():
+            station.shift(delta)
+
+    # watchdog is called by Watchdog coroutine periodically, i.e. one timer for all the stations
     async def watchdog(self):
         ts = time.time()
-        print("{:.3f} SensorHub() watchdog...".format(ts))
-        # ------------------------------------------
-        # SEND 'STATUS' (WITH WEIGHT) TO PLATFORM
-        # ------------------------------------------
-        weight_sensor_id = self.settings["WEIGHT_SENSOR_ID"]
-
-        weight_sample_buffer = self.events.sensor_buffers[weight_sensor_id]["sample_buffer"]
-
-        sample_value, offset, duration, sample_count = weight_sample_buffer.median(0,2)
-
-        if not sample_value == None:
-            print ("{:.3f} WEIGHT {:5.1f}".format(ts, sample_value))
-
-            await self.send_status(ts, sample_value)
-
-            if self.settings["LOG_LEVEL"] == 1:
-                print("SensorHub.watchdog() send status at {:.3f}".format(time.process_time()))
-        else:
-            print("SensorHub.watchdog() status NOT SENT as data value None")
-
-
-    # send 'status' event (periodic)
-    async def send_status(self, ts, weight_g):
-        weight_event = { 'acp_id': self.settings["SENSOR_ID"],
-                         'acp_type': self.settings["SENSOR_TYPE"],
-                         'acp_ts': ts,
-                         'acp_units': 'GRAMS',
-                         'event_code': EventCode.STATUS,
-                         'weight': math.floor(weight_g+0.5), # rounded to integer grams
-                         'version': self.settings["VERSION"]
-                       }
-
-        # Add status (e.g. timestamp, weight) of latest brew if we have one
-        if not self.new_status is None:
-            weight_event["new_status"] = self.new_status
+        self.log.info("{:.3f} SensorHub() watchdog...", ts)
 
-        # Add status (e.g. timestamp, power) of latest grind if we have one
-        if not self.grind_status is None:
-            weight_event["grind_status"] = self.grind_status
-
-        # Add status (e.g. timestamp, power) of latest brewing if we have one
-        if not self.brew_status is None:
-            weight_event["brew_status"] = self.brew_status
-
-        #send MQTT topic, message
-        await self.uplink.put(self.settings["SENSOR_ID"], weight_event)
+        for station in self.stations.values():
+            await station.watchdog(ts)
 
     # process_reading(ts, sensor_id) is called by each of the sensors, i.e.
     # LocalSensors and RemoteSensors, each time they have a reading to be
-    # processed.  The Events module can use 'sensor_id' to determine the
-    # source of the reading.  All events sent to the Platform are labelled
-    # with the sensor_id of the sensor node, not the individual sensor.
+    # processed, and passed to the Station of the sensor.
     async def process_reading(self, ts, sensor_id):
-        t_start = time.process_time()
-
-        weight_sensor_id = self.settings["WEIGHT_SENSOR_ID"]
-        weight_sample_buffer = self.events.sensor_buffers[weight_sensor_id]["sample_buffer"]
-
-        # ---------------------------------
-        # TEST EVENTS AND SEND TO PLATFORM
-        # ---------------------------------
-        events_list = self.events.test(ts, sensor_id)
-
-        for event in events_list:
-            # display time of new brew is we have one
-
-            event_code = event["event_code"]
-
-            # If this event is a NEW POT then update display and record the time
-            if event_code == EventCode.NEW:
-                self.new_status = { "acp_ts": ts,
-                                    "weight": event["weight"],
-                                    "weight_new": event["weight_new"],
-                                    "acp_confidence": event["acp_confidence"]
-                                  }
-                self.display.update_new(ts)
-
-            # If this event is from the GRINDER then record the grind status for next COFFEE_STATUS event
-            elif event_code == EventCode.GRINDING or event_code == EventCode.GRIND_STATUS:
-                self.grind_status = { "acp_ts" : ts,
-                                      "power": event["value"]["ENERGY"]["Power"],
-                                      "acp_units": "WATTS"
-                                    }
-                # For a 'status' message from a RemoteSensor we only store it and return.
-                if event_code == EventCode.GRIND_STATUS:
-                    return
-
-            # If this event is from the BREWER then record the brew status for the next COFFEE_STATUS event                                    
-            elif event_code == EventCode.BREWING or event_code == EventCode.BREW_STATUS:
-                self.brew_status = { "acp_ts" : ts,
-                                     "power": event["value"]["ENERGY"]["Power"],
-                                     "acp_units": "WATTS"
-                                    }
-                # For a 'status' message from a RemoteSensor we only store it and return.
-                if event_code == EventCode.BREW_STATUS:
-                    return
-                                    
-            # piggyback a weight property if the event doesn't already include it.
-            if not "weight" in event:
-                weight_stats_buffer = self.events.sensor_buffers[weight_sensor_id]["stats_buffer"]
-
-                # we'll add a weight value for events that don't include it
-                default_weight = weight_stats_buffer.get(0)["value"]["median"]
-
-                if default_weight is None:
-                    default_weight = 0
-
-                event["weight"] = math.floor(default_weight+0.5)
-
-            # also piggyback the timestamp of the most recent new brew
-            if not self.new_status is None:
-                event["new_status"] = self.new_status
-
-            # add acp_id, acp_ts, acp_type
-            event_params =  { "acp_ts": ts,
-                              "acp_id": self.settings["SENSOR_ID"],
-                              "acp_type": self.settings["SENSOR_TYPE"]
-                            }
-            #send MQTT topic, message
-            event_to_send = { **event, **event_params }
-
-            await self.uplink.put(self.settings["SENSOR_ID"], event_to_send)
-
-            self.display.update_event(ts, event)
-
-        #----------------
-        # UPDATE DISPLAY
-        # ---------------
-
-        self.display.update(ts, weight_sample_buffer)
-
-        if self.settings["LOG_LEVEL"] == 1:
-            print ("WEIGHT,{:.3f},{:.3f}".format(ts,weight_sample_buffer.get(0)["value"]))
-
-        if self.settings["LOG_LEVEL"] == 1:
-            print("process_reading time (before sleep) {:.3f} secs.\n".format(time.process_time() - t_start))
-
+        await self.sensor_stations[sensor_id].process_reading(ts, sensor_id)
 
     async def finish(self):
 
         await self.uplink.finish()
 
-        if not self.settings["SIMULATE_DISPLAY"]:
-
-            self.display.finish()
-
-
+        for station in self.stations.values():
+            station.finish()
@@ -5,10 +5,12 @@ import time
 
 from classes.sensor_hub import SensorHub
 from classes.remote_sensor import RemoteSensor
+from classes.sensor_subscriber import SensorSubscriber
 from classes.local_sensor import LocalSensor
-from classes.weight_sensor import WeightSensor
-from classes.weight_simulator import WeightSimulator
 from classes.watchdog import Watchdog
+from classes.sensor_registry import load_sensor_registry, sensor_settings
+from classes.config import Settings
+from classes import startup_profile
 
 GPIO_FAIL = False
 try:
@@ -21,8 +23,9 @@ class SensorNode(object):
     """
     SensorNode(settings) is the "main" class for the sensor node, providing async methods:
 
-    async start() - instantiates SensorHub, LocalSensors, RemoteSensors, Watchdog
-              and runs them in parallel as co-routines.
+    async start() - instantiates SensorHub, LocalSensors, RemoteSensors (sharing a SensorSubscriber), Watchdog
+              and runs them in parallel as co-routines. The sensors are listed in the sensor registry,
+              see sensor_registry.py, for each of the SensorHub stations (see station.py).
 
     async finish() - attempts cleanup when SensorNode has been signalled to end.
     """
@@ -30,20 +33,22 @@ class SensorNode(object):
     def __init__(self, settings=None, finish_event=None):
         global GPIO_FAIL
 
-        self.settings = settings
+        if settings is None:
+            settings = { }
 
-        if self.settings is None:
-            self.settings = { }
+        changes = {}
 
-        if not "VERSION" in self.settings:
-            self.settings["VERSION"] = VERSION
+        if not "VERSION" in settings:
+            changes["VERSION"] = VERSION
 
-        if "SIMULATE_DISPLAY" in self.settings and self.settings["SIMULATE_DISPLAY"]:
+        if "SIMULATE_DISPLAY" in settings and settings["SIMULATE_DISPLAY"]:
             print("Using SIMULATE_DISPLAY=True from settings file")
 
         # ensure settings["SIMULATE_DISPLAY"] is set
-        if not "SIMULATE_DISPLAY" in self.settings:
-            self.settings["SIMULATE_DISPLAY"] = GPIO_FAIL
+        if not "SIMULATE_DISPLAY" in settings:
+            changes["SIMULATE_DISPLAY"] = GPIO_FAIL
+
+        self.settings = Settings(settings, **changes)
 
         self.finish_event = finish_event
 
@@ -54,37 +59,59 @@ class SensorNode(object):
 
         self.sensor_hub = SensorHub(settings=self.settings)
 
-        await asyncio.sleep(3)
+        if "STARTUP_DELAY" in self.settings:
+            await asyncio.sleep(self.settings["STARTUP_DELAY"])
+        else:
+            await asyncio.sleep(3)
 
         await self.sensor_hub.start(time.time())
 
-        self.remote_sensor_a = RemoteSensor( settings=self.settings,
-                                        sensor_id=self.settings["GRIND_SENSOR_ID"],
-                                        sensor_hub=self.sensor_hub)
+        # One MQTT subscription for all the RemoteSensors
+        self.sensor_subscriber = SensorSubscriber(settings=self.settings)
 
-        self.remote_sensor_b = RemoteSensor( settings=self.settings,
-                                        sensor_id=self.settings["BREW_SENSOR_ID"],
-                                        sensor_hub=self.sensor_hub)
+        self.remote_sensors = []
 
-        # Here we choose whether to use the real HX711-based sensor, or a simulation
-        if "SIMULATE_WEIGHT" in self.settings and self.settings["SIMULATE_WEIGHT"]:
-            weight_sensor = WeightSimulator(settings=self.settings)
-            print("Using SIMULATE_WEIGHT=True from settings file")
-        else:
-            weight_sensor = WeightSensor(settings=self.settings)
+        self.local_sensors = []
+
+        # The sensors of each station (by default one) from its sensor registry
+        station_sensors = [ ( station, sensor ) for station in self.sensor_hub.stations.values()
+                                                for sensor in load_sensor_registry(station.settings) ]
 
-        self.local_sensor = LocalSensor( settings=self.settings,
-                                    sensor_id=self.settings["WEIGHT_SENSOR_ID"],
-                                    sensor=weight_sensor,
-                                    sensor_hub=self.sensor_hub)
+        for station, sensor in station_sensors:
+            settings = sensor_settings(station.settings, sensor)
+
+            if sensor["type"] == "remote":
+                self.remote_sensors.append(RemoteSensor( settings=settings,
+                                                         sensor_id=sensor["sensor_id"],
+                                                         sensor_hub=self.sensor_hub,
+                                                         sensor_subscriber=self.sensor_subscriber))
+                continue
+
+            # Here we choose whether to use the real HX711-based sensor, or a simulation
+            # (imported here, so numpy and the HX711 driver are only loaded for the real sensor)
+            if "SIMULATE_WEIGHT" in settings and settings["SIMULATE_WEIGHT"]:
+                from classes.weight_simulator import WeightSimulator
+                weight_sensor = WeightSimulator(settings=settings)
+                print("Using SIMULATE_WEIGHT=True from settings file")
+            else:
+                from classes.weight_sensor import WeightSensor
+                weight_sensor = WeightSensor(settings=settings)
+
+            self.local_sensors.append(LocalSensor( settings=settings,
+                                                   sensor_id=sensor["sensor_id"],
+                                                   sensor=weight_sensor,
+                                                   sensor_hub=self.sensor_hub))
 
         self.watchdog = Watchdog( settings=self.settings,
                                   watched=self.sensor_hub,
                                   period=self.settings["WATCHDOG_PERIOD"])
 
-        await asyncio.gather(self.local_sensor.start(),
-                             self.remote_sensor_a.start(),
-                             self.remote_sensor_b.start(),
+        if "PROFILE_STARTUP" in self.settings and self.settings["PROFILE_STARTUP"]:
+            startup_profile.mark("SensorNode ready")
+            startup_profile.report()
+
+        await asyncio.gather(*[ local_sensor.start() for local_sensor in self.local_sensors ],
+                             self.sensor_subscriber.start(),
                              self.watchdog.start(),
                              self.finish() # will await the 'finish_event'
                             )
@@ -101,11 +128,13 @@ class SensorNode(object):
 
         await self.watchdog.finish()
 
-        await self.remote_sensor_a.finish()
+        for remote_sensor in self.remote_sensors:
+            await remote_sensor.finish()
 
-        await self.remote_sensor_b.finish()
+        await self.sensor_subscriber.finish()
 
-        await self.local_sensor.finish()
+        for local_sensor in self.local_sensors:
+            await local_sensor.finish()
 
         await self.sensor_hub.finish()
 
@@ -0,0 +1,59 @@
+"""
+Sensor registry - the sensors of a SensorNode, loaded from settings["SENSORS"]
+
+    sensors = load_sensor_registry(settings)
+
+returns a list with an entry for each sensor, e.g.
+
+    [ { "sensor_id": "csn-node-weight", "type": "weight", "detectors": [ "new", "removed", "poured", "empty", "replaced" ] },
+      { "sensor_id": "csn-node-grind",  "type": "remote", "detectors": [ "grind" ] },
+      { "sensor_id": "csn-milk-fridge", "type": "remote", "detectors": [ "power", "status" ],
+                                        "params": { "power_threshold": 40 } }
+    ]
+
+"type" is "weight" (a LocalSensor reading the load cells, or the WeightSimulator if settings["SIMULATE_WEIGHT"])
+or "remote" (a RemoteSensor receiving the Tasmota "csn/<sensor_id>/tele/SENSOR" messages).
+
+"detectors" are names from Events.DETECTORS, run in that order by Events.test() for each reading from the sensor.
+
+"params" (optional) are per-sensor detector parameters, e.g. "power_threshold" (watts) for the "power" detector.
+
+"settings" (optional) are overlaid on the node settings for this sensor only, e.g. the HX711 pins of a second scale.
+
+If settings["SENSORS"] is not set, the registry is the original weight, grinder and brew machine sensors
+from settings WEIGHT_SENSOR_ID, GRIND_SENSOR_ID and BREW_SENSOR_ID.
+"""
+
+from classes.config import Settings
+
+SENSOR_TYPES = [ "weight", "remote" ]
+
+WEIGHT_DETECTORS = [ "new", "removed", "poured", "empty", "replaced" ]
+
+# Return the list of sensor entries for this SensorNode
+def load_sensor_registry(settings):
+    if "SENSORS" in settings and not settings["SENSORS"] is None:
+        sensors = settings["SENSORS"]
+    else:
+        sensors = [ { "sensor_id": settings["WEIGHT_SENSOR_ID"], "type": "weight", "detectors": WEIGHT_DETECTORS },
+                    { "sensor_id": settings["GRIND_SENSOR_ID"], "type": "remote", "detectors": [ "grind" ] },
+                    { "sensor_id": settings["BREW_SENSOR_ID"], "type": "remote", "detectors": [ "brew" ] }
+                  ]
+
+    sensor_ids = set()
+    for sensor in sensors:
+        if not "sensor_id" in sensor:
+            raise NameError("Bad SENSORS entry, no sensor_id: {}".format(sensor))
+        if sensor["sensor_id"] in sensor_ids:
+            raise NameError("Bad SENSORS entry, duplicate sensor_id: {}".format(sensor["sensor_id"]))
+        sensor_ids.add(sensor["sensor_id"])
+        if not sensor.get("type") in SENSOR_TYPES:
+            raise NameError("Bad SENSORS type for {}: {}".format(sensor["sensor_id"], sensor.get("type")))
+
+    return sensors
+
+# Return the settings for one sensor, i.e. the node settings with the sensor's "settings" overlaid
+def sensor_settings(settings, sensor):
+    if "settings" in sensor:
+        return Settings({ **settings, **sensor["settings"] })
+    return settings
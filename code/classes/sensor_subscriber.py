@@ -0,0 +1,144 @@
+"""
+SensorSubscriber - a single MQTT subscription shared by all the RemoteSensors
+
+Instantiation by SensorNode:
+    sensor_subscriber = SensorSubscriber(settings=settings)
+
+Each RemoteSensor registers a handler for its topic:
+    sensor_subscriber.add_handler(topic, handler) # handler is async, called as 'await handler(message)'
+
+Methods:
+    await sensor_subscriber.start() - connect to SENSOR_HOST, subscribe to the wildcard SENSOR_TOPIC
+                                      (default "csn/+/tele/SENSOR") and route each message to its handler
+    await sensor_subscriber.finish()
+
+So there is one connection to the broker and one message loop however many RemoteSensors there
+are. Each message is parsed once by the link, and routed by a dictionary lookup of its "topic".
+
+With the links that support it (see Uplink.set_receiver) the link calls receive() with the topic and bytes
+of each message as it arrives, so the message is routed before it is parsed, the messages for topics with no
+handler (e.g. Tasmota devices not in the sensor registry) aren't parsed at all, and the parsed messages are
+queued for the message loop with their handler. The handlers are still called in order by the one message
+loop, as they await the SensorHub (e.g. sending events).
+"""
+
+import asyncio
+
+from classes.uplink import load_uplink, decode_message
+from classes.log import Log
+
+SENSOR_TOPIC = "csn/+/tele/SENSOR"
+
+class SensorSubscriber():
+
+    def __init__(self, settings=None):
+        print("SensorSubscriber() __init__")
+
+        self.settings = settings
+        self.log = Log("SensorSubscriber", settings)
+
+        self.quit = False
+
+        # handlers for each topic, i.e. { <topic>: <async function(message)> }
+        self.handlers = {}
+
+        if "SENSOR_TOPIC" in self.settings:
+            self.topic = self.settings["SENSOR_TOPIC"]
+        else:
+            self.topic = SENSOR_TOPIC
+
+        # The link chosen by settings["SENSOR_LINK"], see uplink.py, or the LinkSimulator to generate
+        # sensor messages if settings["SIMULATE_SENSORS"]=True, so the MQTT client (gmqtt) is only imported if it is used
+        self.sensor_link = load_uplink(self.settings, "SENSOR_LINK", "SIMULATE_SENSORS")
+
+        # [ handler, message ] for the message loop, if the link calls receive()
+        self.message_queue = None
+
+        self.unrouted = 0 # count of the messages with no handler
+
+    # Register async function 'handler' to be called with each message on 'topic'
+    def add_handler(self, topic, handler):
+        print("SensorSubscriber adding handler for {}".format(topic))
+        self.handlers[topic] = handler
+
+    async def start(self):
+        link_settings = {}
+        link_settings["host"] = self.settings["SENSOR_HOST"]
+        if "SENSOR_PORT" in self.settings:
+            link_settings["port"] = self.settings["SENSOR_PORT"]
+        link_settings["user"] = self.settings["SENSOR_USER"]
+        link_settings["password"] = self.settings["SENSOR_PASSWORD"]
+        await self.sensor_link.start(link_settings)
+
+        if self.sensor_link.set_receiver(self.receive):
+            self.message_queue = asyncio.Queue()
+
+        subscribe_settings = {}
+        subscribe_settings["topic"] = self.topic
+        await self.sensor_link.subscribe(subscribe_settings)
+
+        if self.message_queue is None:
+            await self.get_messages()
+        else:
+            await self.receive_messages()
+
+        print("SensorSubscriber() finished, {} messages with no handler".format(self.unrouted))
+
+    # Called by the link with each message, i.e. its topic and bytes
+    def receive(self, topic, payload):
+        handler = self.handlers.get(topic)
+
+        if handler is None:
+            self.unrouted += 1
+            self.log.debug("SensorSubscriber no handler for {}", topic)
+            return
+
+        self.message_queue.put_nowait([ handler, decode_message(topic, payload) ])
+
+    # The message loop for the messages passed to receive()
+    async def receive_messages(self):
+        message_queue = self.message_queue
+
+        while not self.quit:
+            item = await message_queue.get()
+
+            # finish() puts None in the queue
+            if item is None:
+                break
+
+            handler, message = item
+            await handler(message)
+
+    # The message loop for the links without set_receiver(), getting the decoded messages
+    async def get_messages(self):
+        handlers = self.handlers
+
+        while not self.quit:
+            message = await self.sensor_link.get()
+
+            # get() returns None when the link is stopped by finish()
+            if message is None:
+                break
+
+            handler = handlers.get(message.get("topic"))
+
+            if handler is None:
+                self.unrouted += 1
+                self.log.debug("SensorSubscriber no handler for {}", message.get("topic"))
+                continue
+
+            await handler(message)
+
+    async def finish(self):
+        print("SensorSubscriber set to finish")
+        self.quit = True
+
+        await self.sensor_link.finish()
+
+        # end the message loop in start()
+        if self.message_queue is None:
+            self.sensor_link.stop_get()
+        else:
+            self.message_queue.put_nowait(None)
+
+        print("SensorSubscriber() finish completed")
@@ -0,0 +1,83 @@
+# ----------------------------------------------------------------------
+# ----------------------------------------------------------------------
+# LCD sprite cache
+#
+# The Display images (e.g. images/pot_0.png) are converted once to the ST7735 16-bit 565 RGB bytes
+# and stored in SPRITE_CACHE_DIR (default images/cache), with the filename including a hash of the
+# source image, e.g. images/cache/pot_0-3f2a9c0d1e2b4a5c.rgb565. Later startups mmap the cached
+# bytes directly, without opening the image in PIL or converting it with NumPy.
+#
+#   sprites = SpriteCache(settings)
+#   data = sprites.load('images/pot_0.png') # RGB565 bytes (a memoryview), e.g. for LCD.send_data(data)
+#
+# If the cache directory can't be written the converted bytes are returned uncached.
+# The cache can be built in advance with build_sprites.py.
+# ----------------------------------------------------------------------
+# ----------------------------------------------------------------------
+
+import os
+import mmap
+import hashlib
+
+SPRITE_CACHE_DIR = "images/cache"
+
+# Return the 16-bit 565 RGB bytes of image file 'filename', as ST7735.image_to_data()
+def convert_image(filename):
+    import numpy as np
+    from PIL import Image
+
+    with Image.open(filename) as image:
+        pb = np.array(image.convert('RGB')).astype('uint16')
+    color = ((pb[:,:,0] & 0xF8) << 8) | ((pb[:,:,1] & 0xFC) << 3) | (pb[:,:,2] >> 3)
+    return color.astype('>u2').tobytes()
+
+class SpriteCache(object):
+
+    def __init__(self, settings=None):
+        if settings is None or not "SPRITE_CACHE_DIR" in settings:
+            self.cache_dir = SPRITE_CACHE_DIR
+        else:
+            self.cache_dir = settings["SPRITE_CACHE_DIR"]
+
+        self.log_level = 2 if settings is None or not "LOG_LEVEL" in settings else settings["LOG_LEVEL"]
+
+        # The open mmaps, kept so the memoryviews we return stay valid
+        self.maps = []
+
+        self.converted = 0 # count of images converted, i.e. not found in the cache
+
+    # Return the cache filename for image 'filename'
+    def cache_filename(self, filename):
+        with open(filename, "rb") as fp:
+            digest = hashlib.sha1(fp.read()).hexdigest()[:16]
+        name = os.path.splitext(os.path.basename(filename))[0]
+        return os.path.join(self.cache_dir, "{}-{}.rgb565".format(name, digest))
+
+    # Return the RGB565 bytes of image 'filename', from the cache if possible
+    def load(self, filename):
+        cache_filename = self.cache_filename(filename)
+
+        if not os.path.isfile(cache_filename):
+            data = convert_image(filename)
+            self.converted += 1
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                # write to a temporary file and rename, so a partly written file is never used
+                tmp_filename = cache_filename + ".tmp"
+                with open(tmp_filename, "wb") as fp:
+                    fp.write(data)
+                os.replace(tmp_filename, cache_filename)
+            except OSError as e:
+                if self.log_level <= 3:
+                    print("SpriteCache can't write {}: {}".format(cache_filename, e))
+                return memoryview(data)
+
+            if self.log_level <= 2:
+                print("SpriteCache converted {} to {}".format(filename, cache_filename))
+
+        with open(cache_filename, "rb") as fp:
+            data_map = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self.maps.append(data_map)
+
+        return memoryview(data_map)
@@ -0,0 +1,84 @@
+# ----------------------------------------------------------------------
+# ----------------------------------------------------------------------
+# Startup profiling
+#
+# With settings["PROFILE_STARTUP"] = True, main.py calls start() once the config is loaded, so
+# every module imported after that is timed, and the SensorNode calls mark(name) at each stage of
+# startup. report() then prints the time of each stage since main.py started, and the import
+# time of each package (the sum of its modules' own import time, excluding their imports of
+# other packages), slowest first.
+#
+# main.py imports this module first, so START_TIME is as near the start of the process as we can get.
+# ----------------------------------------------------------------------
+# ----------------------------------------------------------------------
+
+import sys
+import time
+import builtins
+
+START_TIME = time.perf_counter()
+
+class ImportProfiler(object):
+
+    def __init__(self):
+        self.original_import = None
+        self.module_times = {} # module name -> [ inclusive secs, own secs ]
+        self.stack = []        # the time spent in nested imports, for each import in progress
+
+    def start(self):
+        self.original_import = builtins.__import__
+        builtins.__import__ = self.profiled_import
+
+    def stop(self):
+        if not self.original_import is None:
+            builtins.__import__ = self.original_import
+            self.original_import = None
+
+    # Replaces builtins.__import__, timing the imports of modules not already loaded
+    def profiled_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        if level != 0 or (name in sys.modules and not fromlist):
+            return self.original_import(name, globals, locals, fromlist, level)
+
+        self.stack.append(0)
+        t_start = time.perf_counter()
+        try:
+            return self.original_import(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - t_start
+            nested = self.stack.pop()
+            if self.stack:
+                self.stack[-1] += elapsed
+            times = self.module_times.setdefault(name, [ 0, 0 ])
+            times[0] += elapsed
+            times[1] += elapsed - nested
+
+    # Return list of ( package, secs ) of the own import time of each top-level package, slowest first
+    def package_times(self):
+        packages = {}
+        for name, (inclusive, own) in self.module_times.items():
+            package = name.split(".")[0]
+            packages[package] = packages.get(package, 0) + own
+        return sorted(packages.items(), key=lambda item: item[1], reverse=True)
+
+PROFILER = ImportProfiler()
+
+MARKS = [] # ( stage name, secs since START_TIME )
+
+def start():
+    PROFILER.start()
+
+def mark(name):
+    MARKS.append(( name, time.perf_counter() - START_TIME ))
+
+# Stop the import profiling and print the startup stages and the slowest 'count' packages
+def report(count=15):
+    PROFILER.stop()
+
+    print("PROFILE_STARTUP stages (secs since start, process cpu {:.3f} secs)".format(time.process_time()))
+    for name, elapsed in MARKS:
+        print("    {: <24} {:8.3f}".format(name, elapsed))
+
+    package_times = PROFILER.package_times()
+    print("PROFILE_STARTUP imports {:.3f} secs, by package:".format(sum([ secs for package, secs in package_times ])))
+    for package, secs in package_times[:count]:
+        print("    {: <24} {:8.3f}".format(package, secs))
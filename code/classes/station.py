@@ -0,0 +1,308 @@
+"""
+A Station is one coffee pot served by the SensorHub, i.e. its sensors, Events, display and status.
+
+The SensorHub instantiates a Station for each entry in settings["STATIONS"], e.g.
+
+    "STATIONS": [ { "SENSOR_ID": "csn-pot-1", "WEIGHT_SENSOR_ID": "csn-pot-1-weight",
+                    "GRIND_SENSOR_ID": "csn-pot-1-grind", "BREW_SENSOR_ID": "csn-pot-1-brew" },
+                  { "SENSOR_ID": "csn-pot-2", "WEIGHT_SENSOR_ID": "csn-pot-2-weight",
+                    "GRIND_SENSOR_ID": "csn-pot-2-grind", "BREW_SENSOR_ID": "csn-pot-2-brew",
+                    "SENSORS": [ ... ] }
+                ]
+
+where each entry is overlaid on the node settings to give the station settings. So each station has its own
+SENSOR_ID (the acp_id and uplink topic of its events), sensor registry (see sensor_registry.py), Events and
+status, while the stations share the SensorHub uplink connection, clock and watchdog. Only the first station
+uses the LCD display. Without "STATIONS" there is one station with the node settings.
+
+    station.process_reading(ts, sensor_id) - test events for a reading from one of the station's sensors
+    station.watchdog(ts) - send the periodic COFFEE_STATUS
+"""
+
+import time
+import math
+
+from classes.events import Events, EventCode
+from classes.sensor_registry import load_sensor_registry
+from classes.config import Settings
+from classes.log import Log
+
+# Return the list of settings for each station, i.e. settings["STATIONS"] entries overlaid on 'settings'
+def load_stations(settings):
+    if not "STATIONS" in settings or settings["STATIONS"] is None:
+        return [ settings ]
+
+    station_settings_list = []
+    station_ids = set()
+    sensor_ids = set()
+    for index, station in enumerate(settings["STATIONS"]):
+        station_settings = { **settings, **station }
+        del station_settings["STATIONS"]
+
+        # The LCD display is for the first station
+        if index > 0:
+            station_settings["DISPLAY"] = False
+
+        if station_settings["SENSOR_ID"] in station_ids:
+            raise NameError("Bad STATIONS entry, duplicate SENSOR_ID: {}".format(station_settings["SENSOR_ID"]))
+        station_ids.add(station_settings["SENSOR_ID"])
+
+        for sensor in load_sensor_registry(station_settings):
+            if sensor["sensor_id"] in sensor_ids:
+                raise NameError("Bad STATIONS entry, sensor {} in two stations".format(sensor["sensor_id"]))
+            sensor_ids.add(sensor["sensor_id"])
+
+        station_settings_list.append(Settings(station_settings))
+
+    return station_settings_list
+
+# Stands in for the Display when settings["DISPLAY"] is False, so PIL and the LCD driver are not imported
+class NullDisplay(object):
+
+    def begin(self):
+        pass
+
+    def update_new(self, ts):
+        pass
+
+    def update_event(self, ts, event):
+        pass
+
+    def update(self, ts, sample_buffer):
+        pass
+
+    def finish(self):
+        pass
+
+class Station(object):
+
+    def __init__(self, settings=None, uplink=None):
+        self.settings = settings
+        self.station_id = settings["SENSOR_ID"]
+
+        # settings used on every reading
+        self.log_level = settings["LOG_LEVEL"]
+        self.log = Log("Station", settings)
+        self.weight_sensor_id = settings["WEIGHT_SENSOR_ID"]
+
+        print("Station __init__ {}".format(self.station_id))
+
+        # The uplink shared by all the stations of the SensorHub
+        self.uplink = uplink
+
+        self.new_status = None # timestamp, weight of current pot of coffee
+
+        self.grind_status = None # most recent timestamp, power from grinder
+
+        self.brew_status = None # most recent timestamp, power from brew machine
+
+        self.sensor_status = {} # most recent timestamp, value for each other sensor in the registry, by sensor_id
+
+        # LocalSensors with adaptive sampling, to be woken by GRINDING or BREWING events
+        self.activity_listeners = []
+
+        # The sensor_ids of this station, from its sensor registry
+        self.sensor_ids = [ sensor["sensor_id"] for sensor in load_sensor_registry(self.settings) ]
+
+        # LCD DISPLAY
+
+        if "DISPLAY" in self.settings and self.settings["DISPLAY"] == False:
+            self.display = NullDisplay()
+        else:
+            from classes.display import Display
+            self.display = Display(self.settings)
+
+        # EVENTS PATTERN MATCH
+
+        self.events = Events(settings=self.settings)
+
+    def begin(self):
+        self.display.begin()
+
+    # Shift every timestamp we hold by 'delta' seconds after a clock jump, see SensorHub.clock_jump()
+    def shift(self, delta):
+        self.events.shift(delta)
+
+        for status in [ self.new_status, self.grind_status, self.brew_status, *self.sensor_status.values() ]:
+            if not status is None:
+                status["acp_ts"] += delta
+
+        for listener in self.activity_listeners:
+            listener.shift(delta)
+
+    # Called by the SensorHub watchdog periodically
+    async def watchdog(self, ts):
+        # ------------------------------------------
+        # SEND 'STATUS' (WITH WEIGHT) TO PLATFORM
+        # ------------------------------------------
+        weight_sensor_id = self.weight_sensor_id
+
+        weight_sample_buffer = self.events.sensor_buffers[weight_sensor_id]["sample_buffer"]
+
+        sample_value, offset, duration, sample_count = weight_sample_buffer.median(0,2)
+
+        if not sample_value == None:
+            self.log.info("{:.3f} {} WEIGHT {:5.1f}", ts, self.station_id, sample_value)
+
+            await self.send_status(ts, sample_value)
+
+            self.log.debug("Station.watchdog() {} send status at {:.3f}", self.station_id, time.process_time())
+        else:
+            self.log.warn("Station.watchdog() {} status NOT SENT as data value None", self.station_id)
+
+        # Report the adaptive sampling statistics of the LocalSensors
+        if self.log_level <= 2:
+            for listener in self.activity_listeners:
+                status = listener.sampling_status()
+                self.log.info("{:.3f} SensorHub() {} sampling {} samples {} saved {} ({:.0%}) cpu saved {:.1f} secs max latency {:.2f}",
+                    ts,
+                    listener.sensor_id,
+                    status["mode"],
+                    status["samples"],
+                    status["saved_samples"],
+                    status["saved_ratio"],
+                    status.get("saved_process_time", 0),
+                    status["max_wake_latency"])
+
+    # send 'status' event (periodic)
+    async def send_status(self, ts, weight_g):
+        weight_event = { 'acp_id': self.settings["SENSOR_ID"],
+                         'acp_type': self.settings["SENSOR_TYPE"],
+                         'acp_ts': ts,
+                         'acp_units': 'GRAMS',
+                         'event_code': EventCode.STATUS,
+                         'weight': math.floor(weight_g+0.5), # rounded to integer grams
+                         'version': self.settings["VERSION"]
+                       }
+
+        # Add status (e.g. timestamp, weight) of latest brew if we have one
+        if not self.new_status is None:
+            weight_event["new_status"] = self.new_status
+
+        # Add status (e.g. timestamp, power) of latest grind if we have one
+        if not self.grind_status is None:
+            weight_event["grind_status"] = self.grind_status
+
+        # Add status (e.g. timestamp, power) of latest brewing if we have one
+        if not self.brew_status is None:
+            weight_event["brew_status"] = self.brew_status
+
+        # Add status of the other registry sensors if we have any
+        if len(self.sensor_status) > 0:
+            weight_event["sensor_status"] = self.sensor_status
+
+        # Add the uplink connection state (e.g. reconnects, queued messages) if the link reports one
+        uplink_status = self.uplink.status()
+        if not uplink_status is None:
+            weight_event["uplink_status"] = uplink_status
+
+        #send MQTT topic, message
+        await self.uplink.put(self.settings["SENSOR_ID"], weight_event)
+
+    # process_reading(ts, sensor_id) is called via the SensorHub by each of the station's sensors, i.e.
+    # LocalSensors and RemoteSensors, each time they have a reading to be
+    # processed.  The Events module can use 'sensor_id' to determine the
+    # source of the reading.  All events sent to the Platform are labelled
+    # with the SENSOR_ID of the station, not the individual sensor.
+    async def process_reading(self, ts, sensor_id):
+        t_start = time.process_time()
+
+        weight_sensor_id = self.weight_sensor_id
+        weight_sample_buffer = self.events.sensor_buffers[weight_sensor_id]["sample_buffer"]
+
+        # ---------------------------------
+        # TEST EVENTS AND SEND TO PLATFORM
+        # ---------------------------------
+        events_list = self.events.test(ts, sensor_id)
+
+        for event in events_list:
+            # display time of new brew is we have one
+
+            event_code = event["event_code"]
+
+            # Return LocalSensors to their full sample rate on GRINDING or BREWING
+            if event_code == EventCode.GRINDING or event_code == EventCode.BREWING:
+                for listener in self.activity_listeners:
+                    listener.wake(ts)
+
+            # If this event is a NEW POT then update display and record the time
+            if event_code == EventCode.NEW:
+                self.new_status = { "acp_ts": ts,
+                                    "weight": event["weight"],
+                                    "weight_new": event["weight_new"],
+                                    "acp_confidence": event["acp_confidence"]
+                                  }
+                self.display.update_new(ts)
+
+            # If this event is from the GRINDER then record the grind status for next COFFEE_STATUS event
+            elif event_code == EventCode.GRINDING or event_code == EventCode.GRIND_STATUS:
+                self.grind_status = { "acp_ts" : ts,
+                                      "power": event["power"],
+                                      "acp_units": "WATTS"
+                                    }
+                # For a 'status' message from a RemoteSensor we only store it and return.
+                if event_code == EventCode.GRIND_STATUS:
+                    return
+
+            # If this event is from the BREWER then record the brew status for the next COFFEE_STATUS event
+            elif event_code == EventCode.BREWING or event_code == EventCode.BREW_STATUS:
+                self.brew_status = { "acp_ts" : ts,
+                                     "power": event["power"],
+                                     "acp_units": "WATTS"
+                                    }
+                # For a 'status' message from a RemoteSensor we only store it and return.
+                if event_code == EventCode.BREW_STATUS:
+                    return
+
+            # For a 'status' reading from another registry sensor we only store it and return.
+            elif event_code == EventCode.SENSOR_STATUS:
+                self.sensor_status[event["sensor_id"]] = { "acp_ts": ts,
+                                                           "power": event["power"],
+                                                           "value": event["value"]
+                                                         }
+                return
+
+            # piggyback a weight property if the event doesn't already include it.
+            if not "weight" in event:
+                weight_stats_buffer = self.events.sensor_buffers[weight_sensor_id]["stats_buffer"]
+
+                # we'll add a weight value for events that don't include it
+                # (a RemoteSensor message may arrive before the first 1-second weight stats)
+                weight_stats = weight_stats_buffer.get(0)
+                default_weight = None if weight_stats is None else weight_stats["value"]["median"]
+
+                if default_weight is None:
+                    default_weight = 0
+
+                event["weight"] = math.floor(default_weight+0.5)
+
+            # also piggyback the timestamp of the most recent new brew
+            if not self.new_status is None:
+                event["new_status"] = self.new_status
+
+            # add acp_id, acp_ts, acp_type
+            event_params =  { "acp_ts": ts,
+                              "acp_id": self.settings["SENSOR_ID"],
+                              "acp_type": self.settings["SENSOR_TYPE"]
+                            }
+            #send MQTT topic, message
+            event_to_send = { **event, **event_params }
+
+            await self.uplink.put(self.settings["SENSOR_ID"], event_to_send)
+
+            self.display.update_event(ts, event)
+
+        #----------------
+        # UPDATE DISPLAY
+        # ---------------
+
+        self.display.update(ts, weight_sample_buffer)
+
+        if self.log_level == 1:
+            self.log.debug("WEIGHT,{:.3f},{:.3f}", ts, weight_sample_buffer.get(0)["value"])
+            self.log.debug("process_reading time (before sleep) {:.3f} secs.", time.process_time() - t_start)
+
+    def finish(self):
+        if not self.settings["SIMULATE_DISPLAY"]:
+
+            self.display.finish()
@@ -0,0 +1,201 @@
+# ----------------------------------------------------------------------
+# ----------------------------------------------------------------------
+# Sweep
+#
+# Support for evaluating a grid of Events detector parameters against recorded days.
+#
+# The Events tests spend nearly all their time calculating the same rolling median / deviation
+# windows of the weight sample_buffer (e.g. sample_buffer.median(0,1)) and those windows do not
+# depend on the detector thresholds. So for each recorded day we replay the data once with a
+# CachedTimeBuffer that records every median() and deviation() result, and pickle those results
+# (plus the readings) to a cache file. Each grid point then replays the readings with a
+# CachedTimeBuffer pre-loaded from that cache, so the per-parameter cost is only the threshold tests.
+#
+# A cache key is ( latest ts in the buffer, offset, duration [, avg] ) so the cached value is exactly
+# what TimeBuffer would have calculated. A threshold setting that asks for a window the first pass
+# didn't need simply calculates it (and adds it to the cache for the rest of that worker's run).
+#
+# score_events() compares detected events with labelled events (e.g. ../data/server_brews/all.csv)
+# ----------------------------------------------------------------------
+# ----------------------------------------------------------------------
+
+import os
+import csv
+import time
+import pickle
+import hashlib
+
+from classes.time_buffer import TimeBuffer, StatsBuffer
+from classes.events import EventCode
+from classes.replay import Replay, SAMPLE_BUFFER_SIZE, STATS_HISTORY_SIZE, STATS_DURATION
+
+CACHE_VERSION = 1 # Increment if the cached statistics change, to invalidate existing cache files
+
+# Event codes scored against the labelled events by default
+SCORE_EVENTS = [ EventCode.NEW, EventCode.POURED, EventCode.EMPTY ]
+
+class CachedTimeBuffer(TimeBuffer):
+    """
+    A TimeBuffer which memoizes median() and deviation() results in the dictionary 'cache'.
+    """
+
+    def __init__(self, size=1000, settings=None, stats_buffer=None, cache=None):
+        super().__init__(size=size, settings=settings, stats_buffer=stats_buffer)
+
+        self.cache = {} if cache is None else cache
+
+        self.latest_ts = None
+
+    def put(self, ts, value):
+        # latest_ts must be set before TimeBuffer.put() updates the stats_buffer
+        self.latest_ts = ts
+        super().put(ts, value)
+
+    def median(self, offset, duration):
+        key = (self.latest_ts, offset, duration)
+        stats = self.cache.get(key)
+        if stats is None:
+            stats = super().median(offset, duration)
+            self.cache[key] = stats
+        return stats
+
+    def deviation(self, offset, duration, avg):
+        key = (self.latest_ts, offset, duration, avg)
+        stats = self.cache.get(key)
+        if stats is None:
+            stats = super().deviation(offset, duration, avg)
+            self.cache[key] = stats
+        return stats
+
+# Return a Replay for 'day' using a CachedTimeBuffer with the given 'cache' dictionary
+def cached_replay(day, settings, cache, params=None):
+    stats_buffer = StatsBuffer(size=STATS_HISTORY_SIZE,
+                               duration=STATS_DURATION,
+                               settings=settings)
+
+    sample_buffer = CachedTimeBuffer(size=SAMPLE_BUFFER_SIZE,
+                                     settings=settings,
+                                     stats_buffer=stats_buffer,
+                                     cache=cache)
+
+    return Replay(day, settings, params=params, sample_buffer=sample_buffer, stats_buffer=stats_buffer)
+
+# Return the cache filename for the recording 'filenames', which changes if any file changes.
+def cache_filename(cache_dir, day, filenames):
+    h = hashlib.sha1(str(CACHE_VERSION).encode('utf-8'))
+    for filename in sorted(filenames):
+        file_stat = os.stat(filename)
+        h.update("{},{},{}".format(os.path.abspath(filename), file_stat.st_size, file_stat.st_mtime).encode('utf-8'))
+    return os.path.join(cache_dir, "{}_{}.pickle".format(day, h.hexdigest()[:16]))
+
+# Return the cached { "day":, "readings": [ (ts, value), ... ], "cache": { key: stats } } for a recording,
+# replaying the data to create the cache file if it doesn't already exist.
+def load_stats_cache(cache_dir, day, filenames, settings):
+    filename = cache_filename(cache_dir, day, filenames)
+
+    if os.path.isfile(filename):
+        with open(filename, "rb") as fp:
+            return pickle.load(fp)
+
+    t_start = time.process_time()
+
+    cache = {}
+    readings = []
+
+    replay = cached_replay(day, settings, cache)
+
+    # Collect the readings as they are played, so later replays don't need to parse the CSV files
+    process_sample = replay.process_sample
+    def record_sample(ts, value):
+        readings.append((ts, value))
+        process_sample(ts, value)
+    replay.process_sample = record_sample
+
+    for recording_filename in sorted(filenames):
+        replay.play_file(recording_filename)
+
+    stats_cache = { "day": day, "readings": readings, "cache": cache }
+
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(filename, "wb") as fp:
+        pickle.dump(stats_cache, fp, protocol=pickle.HIGHEST_PROTOCOL)
+
+    if settings["LOG_LEVEL"] <= 3:
+        print("Sweep cached {} readings, {} stats for {} in {:.1f} secs.".format(len(readings),
+                                                                               len(cache),
+                                                                               day,
+                                                                               time.process_time() - t_start))
+    return stats_cache
+
+# Replay the cached readings with the Events parameters 'params', return the replay result
+def replay_cached(stats_cache, settings, params=None):
+    replay = cached_replay(stats_cache["day"], settings, stats_cache["cache"], params=params)
+
+    process_sample = replay.process_sample
+    for ts, value in stats_cache["readings"]:
+        process_sample(ts, value)
+
+    return replay.finish()
+
+# Load labelled events as a list of (ts, event_code)
+# Accepts server event logs (<ts>,"<event_code>",<weight>...) e.g. ../data/server_brews/all.csv
+# or the event table written by replay_archive.py (day,ts,event_code,...)
+def load_labels(filename):
+    labels = []
+    with open(filename, "r", newline="") as fp:
+        ts_column = 0
+        for row in csv.reader(fp):
+            if len(row) < 2:
+                continue
+            if row[0] == "day":
+                # replay_archive.py header
+                ts_column = 1
+                continue
+            try:
+                ts = float(row[ts_column])
+            except ValueError:
+                continue
+            labels.append((ts, row[ts_column + 1]))
+    labels.sort()
+    return labels
+
+# Compare the detected events in a replay result with the labels within the time range of the replay.
+# A detected event matches the nearest unmatched label with the same event_code within 'tolerance' seconds.
+# Returns { "tp": <matched>, "fp": <detected, not labelled>, "fn": <labelled, not detected> }
+def score_events(result, labels, tolerance=30, event_codes=SCORE_EVENTS):
+    score = { "tp": 0, "fp": 0, "fn": 0 }
+
+    if result["begin_ts"] is None:
+        return score
+
+    # Labels within the recording (with a tolerance margin at each end)
+    unmatched = [ label for label in labels
+                  if ( label[1] in event_codes and
+                       label[0] >= result["begin_ts"] - tolerance and
+                       label[0] <= result["end_ts"] + tolerance ) ]
+
+    for event in result["events"]:
+        if not event["event_code"] in event_codes:
+            continue
+        best = None
+        for label in unmatched:
+            if label[1] == event["event_code"] and abs(label[0] - event["ts"]) <= tolerance:
+                if best is None or abs(label[0] - event["ts"]) < abs(best[0] - event["ts"]):
+                    best = label
+        if best is None:
+            score["fp"] += 1
+        else:
+            score["tp"] += 1
+            unmatched.remove(best)
+
+    score["fn"] = len(unmatched)
+
+    return score
+
+# Add precision, recall, f1 to a score dictionary
+def score_summary(score):
+    tp = score["tp"]
+    precision = tp / (tp + score["fp"]) if tp + score["fp"] > 0 else 0
+    recall = tp / (tp + score["fn"]) if tp + score["fn"] > 0 else 0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall > 0 else 0
+    return { **score, "precision": precision, "recall": recall, "f1": f1 }
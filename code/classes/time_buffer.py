@@ -34,12 +34,16 @@
 #       delta of time before calling the callback, otherwise if 'sleep' is non-zero (default=0.0) then
 #       play will sleep for that number of seconds before calling the callback.
 #
+# b.shift(delta): add 'delta' seconds to every timestamp in the buffer, e.g. after a clock jump.
+#
 # ----------------------------------------------------------------------------------------------------------
 # ----------------------------------------------------------------------------------------------------------
 
 import time
 from statistics import median
 
+from classes.log import Log
+
 DEFAULT_SETTINGS = { "LOG_LEVEL": 3 } # we need to pass this in the instantiation...
 
 class TimeBuffer(object):
@@ -52,6 +56,10 @@ class TimeBuffer(object):
         else:
             self.settings = settings
 
+        # read on every get(), so kept as an attribute
+        self.log_level = self.settings["LOG_LEVEL"]
+        self.log = Log("TimeBuffer", self.settings)
+
         self.stats_buffer = stats_buffer
 
         self.size = size
@@ -70,10 +78,8 @@ class TimeBuffer(object):
     # store the current value in the sample_history circular buffer
     def put(self, ts, value):
         self.sample_history[self.sample_history_index] = { 'ts': ts, 'value': value }
-        if self.settings["LOG_LEVEL"] == 1:
-            print("record sample_history[{}]:\n{},{}".format(self.sample_history_index,
-                                                        self.sample_history[self.sample_history_index]["ts"],
-                                                        self.sample_history[self.sample_history_index]["value"]))
+        if self.log_level == 1:
+            self.log.debug("record sample_history[{}]: {},{}", self.sample_history_index, ts, value)
 
         self.sample_history_index = (self.sample_history_index + 1) % self.SAMPLE_HISTORY_SIZE
 
@@ -91,28 +97,32 @@ class TimeBuffer(object):
         if offset == None:
             return None
         if offset >= self.SAMPLE_HISTORY_SIZE:
-            if self.settings["LOG_LEVEL"] == 1:
-                print("get offset too large, returning None")
+            if self.log_level == 1:
+                self.log.debug("get offset too large, returning None")
             return None
         index = (self.sample_history_index + self.SAMPLE_HISTORY_SIZE - offset - 1) % self.SAMPLE_HISTORY_SIZE
-        if self.settings["LOG_LEVEL"] == 1:
+        if self.log_level == 1:
             if self.sample_history[index] is not None:
-                debug_str = "get current {}, offset {} => {}: {:.2f} {}"
-                print(debug_str.format( self.sample_history_index,
-                                        offset,
-                                        index,
-                                        self.sample_history[index]["ts"],
-                                        self.sample_history[index]["value"]))
+                self.log.debug("get current {}, offset {} => {}: {:.2f} {}",
+                               self.sample_history_index,
+                               offset,
+                               index,
+                               self.sample_history[index]["ts"],
+                               self.sample_history[index]["value"])
             else:
-                debug_str = "get None @ current {}, offset {} => {}"
-                print(debug_str.format( self.sample_history_index,
-                                        offset,
-                                        index))
+                self.log.debug("get None @ current {}, offset {} => {}", self.sample_history_index, offset, index)
         return self.sample_history[index]
 
+    # Add 'delta' seconds to the timestamp of every entry in the buffer.
+    # Used by the SensorHub to absorb a wall-clock jump, so durations spanning the jump remain correct.
+    def shift(self, delta):
+        for sample in self.sample_history:
+            if not sample is None:
+                sample["ts"] += delta
+
     # load timestamp,reading values from a CSV file
     def load(self, filename):
-        if self.settings["LOG_LEVEL"] <= 2:
+        if self.log_level <= 2:
             print("loading readings file {}".format(filename))
 
         self.sample_history_index = 0
@@ -131,8 +141,8 @@ class TimeBuffer(object):
                         #self.sample_history[self.sample_history_index] = { "ts": ts,
                         #                                                "value": value }
                         self.put(ts,value)
-                        if self.settings["LOG_LEVEL"] == 1:
-                            print("{: >5} {:10.3f} {: >8}".format(self.sample_history_index,ts,value))
+                        if self.log_level == 1:
+                            self.log.debug("{: >5} {:10.3f} {: >8}", self.sample_history_index, ts, value)
                         #self.sample_history_index = (self.sample_history_index + 1) % self.SAMPLE_HISTORY_SIZE
                     line = fp.readline()
 
@@ -146,7 +156,7 @@ class TimeBuffer(object):
         finish_index = self.sample_history_index
         finished = False
         try:
-            if self.settings["LOG_LEVEL"] <= 3:
+            if self.log_level <= 3:
                 print("Saving TimeBuffer to {}".format(filename))
 
             with open(filename,"w+") as fp:
@@ -171,7 +181,7 @@ class TimeBuffer(object):
     # Pump all the <time, value> buffer samples through a provided processing function.
     # I.e. will call 'process_sample(ts, value)' for each sample in the buffer.
     def play(self, process_sample, realtime=False, sleep=0.0 ):
-        if self.settings["LOG_LEVEL"] <= 2:
+        if self.log_level <= 2:
             print("TimeBuffer.play() from buffer index:", self.sample_history_index)
         index = self.sample_history_index # index of oldest entry (could be None if buffer not wrapped)
         finish_index = self.sample_history_index
@@ -181,8 +191,8 @@ class TimeBuffer(object):
         # we will loop through the buffer until at latest value at sample_history_index-1
         while not finished:
 
-            if self.settings["LOG_LEVEL"] == 1:
-                print("TimeBuffer play index", index)
+            if self.log_level == 1:
+                self.log.debug("TimeBuffer play index {}", index)
 
             sample = self.sample_history[index]
 
@@ -205,14 +215,14 @@ class TimeBuffer(object):
             if index == finish_index:
                 finished = True
 
-        if self.settings["LOG_LEVEL"] <= 2:
+        if self.log_level <= 2:
             print("TimeBuffer play finished")
 
     # Iterate backwards through sample_history buffer from offset to find index of earlier sample at least 'duration'
     # seconds earlier.
     def time_to_offset(self, offset=0, duration=0):
-        if self.settings["LOG_LEVEL"] == 1:
-            print("time_to_offset {} {}".format(offset,duration))
+        if self.log_level == 1:
+            self.log.debug("time_to_offset {} {}", offset, duration)
 
         sample = self.get(offset)
         if sample == None:
@@ -227,8 +237,8 @@ class TimeBuffer(object):
         while sample_time > time_limit:
             current_offset += 1
             if current_offset >= self.SAMPLE_HISTORY_SIZE:
-                if self.settings["LOG_LEVEL"] <= 2:
-                    print("time_to_offset ({}) exceeded buffer size".format(offset))
+                if self.log_level <= 2:
+                    self.log.info("time_to_offset ({}) exceeded buffer size", offset)
                 return None
             sample = self.get(current_offset)
             if sample == None:
@@ -276,8 +286,8 @@ class TimeBuffer(object):
             sample_count += 1
             begin_time = sample["ts"]
 
-        if self.settings["LOG_LEVEL"] == 1:
-            print("mean {} duration {} with {} samples".format( total_value/sample_count, end_time - begin_time, sample_count))
+        if self.log_level == 1:
+            self.log.debug("mean {} duration {} with {} samples", total_value/sample_count, end_time - begin_time, sample_count)
         return total_value / sample_count, next_offset, end_time - begin_time, sample_count
 
     # Return the median sample value for a time period.
@@ -299,13 +309,13 @@ class TimeBuffer(object):
         next_offset = offset
 
         begin_limit = sample["ts"] - duration
-        if self.settings["LOG_LEVEL"] == 1:
-            print("median begin_limit={}".format(begin_limit))
+        if self.log_level == 1:
+            self.log.debug("median begin_limit={}", begin_limit)
 
         begin_time = sample["ts"] # this will be updated as we loop, to find duration available
         end_time = sample["ts"]
 
-        #if self.settings["LOG_LEVEL"] == 1:
+        #if self.log_level == 1:
         #    print("median_time begin_time {:.3f}".format(begin_time))
 
         value_list = [ sample["value"] ]
@@ -319,8 +329,8 @@ class TimeBuffer(object):
             sample = self.get(next_offset)
 
             if sample == None:
-                if self.settings["LOG_LEVEL"] == 1:
-                    print("median looked back to None value")
+                if self.log_level == 1:
+                    self.log.debug("median looked back to None value")
                 # we've exhausted the values in the partially filled buffer
                 break
 
@@ -334,17 +344,18 @@ class TimeBuffer(object):
 
         # If we didn't get enough samples, return with error
         if len(value_list) < 3:
-            if self.settings["LOG_LEVEL"] == 1:
-                print("median not enough samples ({})".format(len(value_list)))
+            if self.log_level == 1:
+                self.log.debug("median not enough samples ({})", len(value_list))
             return None, None, None, None
 
         # Now we have a list of samples with the required duration
         median_value = median(value_list)
 
-        if self.settings["LOG_LEVEL"] == 1:
-            print("median_value for {:.3f} seconds with {} samples = {}".format(end_time - begin_time,
-                                                                                len(value_list),
-                                                                                median_value))
+        if self.log_level == 1:
+            self.log.debug("median_value for {:.3f} seconds with {} samples = {}",
+                           end_time - begin_time,
+                           len(value_list),
+                           median_value)
 
         return median_value, next_offset, end_time - begin_time, len(value_list)
 
@@ -393,8 +404,8 @@ class TimeBuffer(object):
         # Using sample_count (not sample_count - 1) as divisor in case user wants deviation of 1 sample.
         deviation = (total_variance / sample_count) ** 0.5
 
-        if self.settings["LOG_LEVEL"] == 1:
-            print("deviation {} duration {} with {} samples".format(deviation, actual_duration, sample_count))
+        if self.log_level == 1:
+            self.log.debug("deviation {} duration {} with {} samples", deviation, actual_duration, sample_count)
 
         return deviation, next_offset, actual_duration, sample_count
 
@@ -421,6 +432,7 @@ class TimeBuffer(object):
         period_begin = period_end - duration
         sample_count = 0
         actual_duration = 0
+        found = False
 
         while sample["ts"] >= period_begin:
             sample_count += 1
@@ -448,8 +460,8 @@ class TimeBuffer(object):
 
             sample = next_sample
 
-        if self.settings["LOG_LEVEL"] == 1:
-            print("TimeBuffer.find() {} duration {} with {} samples".format(found, actual_duration, sample_count))
+        if self.log_level == 1:
+            self.log.debug("TimeBuffer.find() {} duration {} with {} samples", found, actual_duration, sample_count)
 
         # A chance to use Python's quirky conditional expression syntax...
         return_sample = sample if found else None
@@ -490,21 +502,46 @@ class TimeBuffer(object):
 # time has passed such that the required data is available in the sample_buffer. This update()
 # method can most simply be called each time a sample is added to the sample_buffer.
 #
+# If the sample_buffer values are not numbers (e.g. a RemoteSensor stores each Tasmota message),
+# a 'value_fn' given on instantiation extracts the number from each sample value (or returns None
+# to skip it). The extracted values are stored in a local TimeBuffer (self.value_buffer) so value_fn
+# is called once per sample, and the stats are calculated from the value_buffer. With 'duration' None
+# no stats records are made, i.e. the StatsBuffer only extracts the values into the value_buffer (e.g.
+# the power of each RemoteSensor message, which the Events detectors read).
+#
+# If 'min_samples' is given, a stats record whose 'duration' holds fewer samples (e.g. a LocalSensor
+# sampling at its idle rate) is instead calculated from the latest 'min_samples' samples, provided they
+# are within 'max_duration' seconds. The record's "duration" and "sample_count" are then those of the
+# longer period, so the detectors' stats tests still apply.
 #
 # -----------------------------------------------------------------------------------------
 
 class StatsBuffer(TimeBuffer):
 
     # Initialize a new StatsBuffer object
-    def __init__(self, size=100, duration=1, settings=None):
+    # 'stats_buffer' is an optional RollupBuffer to be updated with each stats record
+    # 'value_fn' is an optional function returning the numeric value (or None) of a sample value
+    # 'duration' None makes no stats records, i.e. only the value_fn values are kept in the value_buffer
+    # 'min_samples' / 'max_duration' optionally extend the stats period when 'duration' has too few samples
+    def __init__(self, size=100, duration=1, settings=None, stats_buffer=None, value_fn=None, value_buffer_size=1000,
+                 min_samples=None, max_duration=None):
 
         self.settings = settings
 
         # initialize TimeBuffer
-        super().__init__(size=size,settings=settings)
+        super().__init__(size=size,settings=settings,stats_buffer=stats_buffer)
 
         self.duration = duration
 
+        self.min_samples = min_samples
+        self.max_duration = duration if max_duration is None else max_duration
+
+        self.value_fn = value_fn
+        if value_fn is None:
+            self.value_buffer = None
+        else:
+            self.value_buffer = TimeBuffer(size=value_buffer_size, settings=settings)
+
         # initialize property to record start time of current stats period
         self.start_ts = None
 
@@ -519,6 +556,18 @@ class StatsBuffer(TimeBuffer):
 
         ts = sample["ts"]
 
+        # Extract the numeric value of this sample, the stats will be calculated from the value_buffer
+        if not self.value_fn is None:
+            value = self.value_fn(sample["value"])
+            if value is None:
+                return
+            self.value_buffer.put(ts, value)
+            sample_buffer = self.value_buffer
+
+        # No stats records, only the value_buffer
+        if self.duration is None:
+            return
+
         # Initialize start_ts for the first stats peroid
         if self.start_ts is None:
             self.start_ts = ts
@@ -527,6 +576,14 @@ class StatsBuffer(TimeBuffer):
             self.put_stats(sample_buffer)
             self.start_ts = ts
 
+    # Shift the stats timestamps and the start of the current stats period by 'delta' seconds
+    def shift(self, delta):
+        super().shift(delta)
+        if not self.value_buffer is None:
+            self.value_buffer.shift(delta)
+        if not self.start_ts is None:
+            self.start_ts += delta
+
 
     # Add a new stats record to this TimeBuffer
     def put_stats(self, sample_buffer):
@@ -538,8 +595,18 @@ class StatsBuffer(TimeBuffer):
 
         ts = sample["ts"]
 
-        med, offset, duration, sample_count = sample_buffer.median(0, self.duration)
-        dev, offset, duration, sample_count = sample_buffer.deviation(0, self.duration, med)
+        stats_duration = self.duration
+
+        med, offset, duration, sample_count = sample_buffer.median(0, stats_duration)
+
+        # Too few samples in 'duration', so use the latest 'min_samples' if they are recent enough
+        if not self.min_samples is None and (sample_count is None or sample_count < self.min_samples):
+            oldest = sample_buffer.get(self.min_samples - 1)
+            if not oldest is None and ts - oldest["ts"] <= self.max_duration:
+                stats_duration = ts - oldest["ts"]
+                med, offset, duration, sample_count = sample_buffer.median(0, stats_duration)
+
+        dev, offset, duration, sample_count = sample_buffer.deviation(0, stats_duration, med)
 
         stats_value = { "median": med,
                         "deviation": dev,
@@ -552,3 +619,147 @@ class StatsBuffer(TimeBuffer):
 
 
 
+
+# -----------------------------------------------------------------------------------------
+#
+# RollupBuffer
+#
+# RollupBuffer is a sub-class of TimeBuffer which stores a summary record for each fixed period
+# (e.g. each minute, or each hour) of the values or records put into a source buffer, so a day or
+# a week of history is kept in a constant (small) amount of memory.
+#
+# Rollup buffers are cascaded like StatsBuffer, via the 'stats_buffer' link of the buffer below:
+#
+#   hour_buffer = RollupBuffer(size=168, duration=3600, settings=settings)
+#   minute_buffer = RollupBuffer(size=1440, duration=60, settings=settings, stats_buffer=hour_buffer)
+#   stats_buffer = StatsBuffer(size=1000, duration=1, settings=settings, stats_buffer=minute_buffer)
+#
+# so each 1-second stats record updates the current minute, and each completed minute updates the current hour.
+# Values can also be added directly with rollup_buffer.add(ts, value), e.g. the weight of each cup poured.
+#
+# Periods are aligned with the clock (i.e. a 60-second period starts on the minute) and a period's
+# record is put into the buffer, with the ts of the period start, when the first value of a later
+# period arrives. The record is:
+#     { "count": number of values (e.g. weight samples) in the period,
+#       "sum": sum of the values (for stats records, median * sample_count),
+#       "min":, "max": minimum and maximum value,
+#       "median": median of the source medians (or values) in the period,
+#       "first":, "last": first and last value in the period
+#     }
+#
+# The queries are O(1) per tier:
+#   b.current() returns the record for the period in progress (or None)
+#   b.get(offset) returns the completed period records, as TimeBuffer
+# -----------------------------------------------------------------------------------------
+
+class RollupBuffer(TimeBuffer):
+
+    # 'capacity' is the number of source values per period kept for the median (e.g. 60 seconds per minute)
+    def __init__(self, size=1440, duration=60, settings=None, stats_buffer=None, capacity=None):
+
+        super().__init__(size=size, settings=settings, stats_buffer=stats_buffer)
+
+        self.duration = duration
+
+        self.capacity = 120 if capacity is None else capacity
+        self.medians = [ 0.0 ] * self.capacity
+
+        self.period = None # index (ts // duration) of the period in progress
+        self.reset_period()
+
+    # Clear the accumulated values of the current period
+    def reset_period(self):
+        self.count = 0
+        self.sum = 0
+        self.min = None
+        self.max = None
+        self.first = None
+        self.last = None
+        self.median_count = 0
+
+    # Called by the source buffer (via TimeBuffer.put()) with each new stats or rollup record
+    def update(self, source_buffer):
+        sample = source_buffer.get(0)
+        if sample is None:
+            return
+
+        value = sample["value"]
+
+        if not isinstance(value, dict):
+            self.add(sample["ts"], value)
+            return
+
+        median = value["median"]
+        if median is None:
+            return
+
+        if "count" in value:
+            # a record from another RollupBuffer
+            self.add(sample["ts"], median, value["count"], value["sum"],
+                     value["min"], value["max"], value["first"], value["last"])
+        else:
+            # a record from a StatsBuffer
+            count = value["sample_count"] if not value["sample_count"] is None else 1
+            self.add(sample["ts"], median, count, median * count)
+
+    # Accumulate 'value' (summarizing 'count' values) into the period containing 'ts'
+    def add(self, ts, value, count=1, total=None, v_min=None, v_max=None, first=None, last=None):
+        period = int(ts // self.duration)
+
+        if self.period is None:
+            self.period = period
+        elif period != self.period:
+            record = self.current()
+            if not record is None:
+                self.put(self.period * self.duration, record)
+            self.period = period
+            self.reset_period()
+
+        self.count += count
+        self.sum += value if total is None else total
+
+        v_min = value if v_min is None else v_min
+        v_max = value if v_max is None else v_max
+        if self.min is None or v_min < self.min:
+            self.min = v_min
+        if self.max is None or v_max > self.max:
+            self.max = v_max
+
+        if self.first is None:
+            self.first = value if first is None else first
+        self.last = value if last is None else last
+
+        # keep the values for the median, overwriting the oldest if over capacity
+        self.medians[self.median_count % self.capacity] = value
+        self.median_count += 1
+
+    # Return the record for the period in progress, or None if no values yet
+    def current(self):
+        if self.count == 0:
+            return None
+
+        n = min(self.median_count, self.capacity)
+        sorted_values = sorted(self.medians[:n])
+        if n % 2 == 1:
+            median = sorted_values[n // 2]
+        else:
+            median = (sorted_values[n // 2 - 1] + sorted_values[n // 2]) / 2
+
+        return { "count": self.count,
+                 "sum": self.sum,
+                 "min": self.min,
+                 "max": self.max,
+                 "median": median,
+                 "first": self.first,
+                 "last": self.last
+               }
+
+    # Return the unix timestamp of the start of the period in progress, or None
+    def current_ts(self):
+        return None if self.period is None else self.period * self.duration
+
+    # Shift the stored records and the period in progress by 'delta' seconds
+    def shift(self, delta):
+        super().shift(delta)
+        if not self.period is None:
+            self.period = int((self.period * self.duration + delta) // self.duration)
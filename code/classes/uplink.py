@@ -0,0 +1,130 @@
+"""
+Uplink - the interface shared by the links to the MQTT brokers, and the registry of link transports
+
+link = load_uplink(settings, "UPLINK", "SIMULATE_UPLINK") - instantiate the link named by settings["UPLINK"]
+
+await link.start(server_settings) - CONNECT to host, server_settings e.g. "host", "port", "user", "password"
+
+await link.finish() - cleanup, e.g. DISCONNECT from host
+
+await link.put(sensor_id, event) - SENDS message to host
+
+await link.subscribe(subscription_settings) - requests SUBSCRIPTION from host, settings { topic: }
+
+await link.get() - async GETS next message from host, i.e. the message dictionary with its "topic"
+
+link.stop_get() - a pending (or the next) get() will return None, e.g. to end a message loop
+
+link.set_receiver(receiver) - instead of queueing the decoded messages for get(), call receiver(topic, payload)
+                              with the bytes of each message as it arrives, returns False if the link can't
+                              (only the gmqtt, memory and unix links can), see SensorSubscriber
+
+link.status() - dictionary of the connection state, e.g. "state", "connects", "queued", or None if the link
+                has no connection to report (added to the STATUS events as "uplink_status")
+
+The transports in UPLINKS are:
+    "gmqtt"     - MQTT using gmqtt (link_gmqtt.py), the default
+    "hbmqtt"    - MQTT using hbmqtt (link_hbmqtt.py)
+    "simulator" - no connection, put() prints the event and subscribe() generates a message every 10 seconds
+    "memory"    - a LocalBroker in the same process, named by the "host" (link_memory.py)
+    "unix"      - a LocalBroker listening on the Unix socket at the "host" path (link_unix.py)
+
+The SensorHub uplink is chosen by settings["UPLINK"] and the SensorSubscriber link by settings["SENSOR_LINK"],
+else "simulator" if SIMULATE_UPLINK (or SIMULATE_SENSORS), else "gmqtt". Each link module is only imported
+when it is used, e.g. gmqtt isn't imported for the simulator.
+
+The messages are decoded with orjson if it is installed (parsing the bytes directly, several times faster),
+else simplejson.
+"""
+
+import importlib
+
+import simplejson as json
+
+from classes.log import Log
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# The link class for each transport, as "<module>.<class>"
+UPLINKS = { "gmqtt": "classes.link_gmqtt.LinkGMQTT",
+            "hbmqtt": "classes.link_hbmqtt.LinkHBMQTT",
+            "simulator": "classes.link_simulator.LinkSimulator",
+            "memory": "classes.link_memory.LinkMemory",
+            "unix": "classes.link_unix.LinkUnix"
+          }
+
+DEFAULT_UPLINK = "gmqtt"
+
+class Uplink(object):
+
+    def __init__(self, settings=None):
+        self.settings = settings
+        self.log = Log(type(self).__name__, settings)
+
+    async def start(self, server_settings):
+        raise NotImplementedError
+
+    async def put(self, sensor_id, event):
+        raise NotImplementedError
+
+    async def subscribe(self, subscribe_settings):
+        raise NotImplementedError
+
+    async def get(self):
+        raise NotImplementedError
+
+    # Links whose get() can't be interrupted ignore stop_get()
+    def stop_get(self):
+        pass
+
+    def set_receiver(self, receiver):
+        return False
+
+    def status(self):
+        return None
+
+    async def finish(self):
+        pass
+
+# Return the link class for transport 'name', importing its module
+def uplink_class(name):
+    if not name in UPLINKS:
+        raise NameError("Bad uplink: {}, not one of {}".format(name, ", ".join(UPLINKS)))
+
+    module_name, class_name = UPLINKS[name].rsplit(".", 1)
+    return getattr(importlib.import_module(module_name), class_name)
+
+# Return the name of the transport given by settings[setting_name], or "simulator" if settings[simulate_name]
+def uplink_name(settings, setting_name, simulate_name):
+    if setting_name in settings and not settings[setting_name] is None:
+        return settings[setting_name]
+    if simulate_name in settings and settings[simulate_name]:
+        return "simulator"
+    return DEFAULT_UPLINK
+
+# Return a new link for the transport chosen by settings[setting_name] or settings[simulate_name]
+def load_uplink(settings, setting_name, simulate_name):
+    return uplink_class(uplink_name(settings, setting_name, simulate_name))(settings=settings)
+
+# Return the message dictionary for MQTT message bytes 'payload' on 'topic', adding the "topic"
+def decode_message(topic, payload):
+    try:
+        if orjson is None:
+            message_dict = json.loads(payload.decode('utf-8'))
+        else:
+            message_dict = orjson.loads(payload)
+    except ValueError: # including the JSONDecodeErrors and UnicodeDecodeError
+        message = payload.decode('utf-8', 'replace')
+        message_dict = { "message": message }
+        print("Uplink json msg error: {} => {}".format(topic,message))
+
+    # e.g. a JSON list or number
+    if not isinstance(message_dict, dict):
+        message_dict = { "message": message_dict }
+
+    message_dict["topic"] = topic
+
+    return message_dict
@@ -6,9 +6,23 @@
 
 import time
 import simplejson as json
+import numpy as np
 from hx711_ijl20.hx711 import HX711
 
 from classes.utils import list_to_string
+from classes.calibration import RawBuffer, CalibrationModel
+
+# Temperature used for the CalibrationModel drift term, default is the Raspberry Pi SoC sensor (millidegrees C)
+TEMPERATURE_FILENAME = "/sys/class/thermal/thermal_zone0/temp"
+TEMPERATURE_PERIOD = 10 # seconds between temperature readings
+
+# (dout, pd_sck) GPIO pins of the HX711 for each of the four load cells
+HX711_PINS = [ [ 5, 6 ], [ 12, 13 ], [ 19, 26 ], [ 16, 20 ] ]
+
+# Background tare tracking defaults, can be overridden in settings
+TARE_STABLE_SECONDS = 10  # pot must be removed with a stable weight for this long to update the tare
+TARE_SMOOTHING = 0.25     # weight given to each new tare measurement in the per-cell offset average
+TARE_SAVE_PERIOD = 3600   # seconds between writes of an updated tare to TARE_FILENAME
 
 class WeightSensor(object):
     """
@@ -17,6 +31,20 @@ class WeightSensor(object):
 
         Methods:
             weight_sensor.get_value() # returns weight in grams
+            weight_sensor.update_tare(events, sensor_id) # refine the tare while the pot is removed
+
+        Properties:
+            weight_sensor.acquisition_ts # time.monotonic() the latest get_value() reading was acquired
+            weight_sensor.raw_buffer     # RawBuffer of the raw per-cell readings + temperature
+            weight_sensor.calibration    # CalibrationModel converting raw readings to grams
+
+        Optional settings:
+            CALIBRATION_FILENAME # json CalibrationModel fitted by calibrate.py, default 1/WEIGHT_FACTOR per cell
+            RAW_CSV_FILE         # append the raw readings to this CSV file each time the raw_buffer fills
+            TEMPERATURE_FILENAME # temperature source for the calibration drift term
+            HX711_PINS           # list of [ dout, pd_sck ] GPIO pins for each HX711 (default HX711_PINS)
+            TARE_TRACKING        # False to disable background tare tracking (default True)
+            TARE_STABLE_SECONDS, TARE_SMOOTHING, TARE_SAVE_PERIOD # see update_tare()
     """
 
     # Initialize scales, return hx711 objects
@@ -26,14 +54,16 @@ class WeightSensor(object):
 
         self.settings = settings
 
+        # Monotonic acquisition time of the latest reading, set by get_value()
+        self.acquisition_ts = None
+
         t_start = time.process_time()
 
         # initialize HX711 objects for each of the load cells
-        self.hx_list = [ HX711(5, 6),
-                        HX711(12, 13),
-                        HX711(19, 26),
-                        HX711(16, 20)
-                       ]
+        # The (dout, pd_sck) GPIO pins of each HX711 can be given in settings["HX711_PINS"],
+        # e.g. for the second station of a multi-pot node
+        hx_pins = self.setting("HX711_PINS", HX711_PINS)
+        self.hx_list = [ HX711(dout, pd_sck) for dout, pd_sck in hx_pins ]
 
         if self.settings["LOG_LEVEL"] == 1:
             print("init_scales HX objects created at {:.3f} secs.".format(time.process_time() - t_start))
@@ -52,11 +82,134 @@ class WeightSensor(object):
 
             hx.reset()
 
-        self.tare_scales()
+        # Per-cell raw readings plus temperature, in parallel with the LocalSensor sample_buffer
+        self.raw_buffer = RawBuffer(channels=len(self.hx_list) + 1)
+
+        self.temperature = None
+        self.temperature_ts = None
+        if "TEMPERATURE_FILENAME" in self.settings:
+            self.temperature_filename = self.settings["TEMPERATURE_FILENAME"]
+        else:
+            self.temperature_filename = TEMPERATURE_FILENAME
+
+        self.calibration = CalibrationModel(settings=self.settings, cell_count=len(self.hx_list))
+        if "CALIBRATION_FILENAME" in self.settings:
+            self.calibration.load(self.settings["CALIBRATION_FILENAME"])
+
+        # Background tare tracking, see update_tare()
+        self.tare_tracking = self.setting("TARE_TRACKING", True)
+        self.tare_stable_seconds = self.setting("TARE_STABLE_SECONDS", TARE_STABLE_SECONDS)
+        self.tare_smoothing = self.setting("TARE_SMOOTHING", TARE_SMOOTHING)
+        self.tare_save_period = self.setting("TARE_SAVE_PERIOD", TARE_SAVE_PERIOD)
+        self.tare_window_ts = None  # monotonic time of the end of the latest raw window used for the tare
+        self.tare_saved_ts = time.time()
+        self.tare_changed = False   # True if the tare has been updated since it was saved
+        self.tare_update_count = 0
+
+        # Start immediately with the persisted tare, which will be refined by update_tare().
+        # Only if there is no tare file do we wait for a full tare_scales().
+        tare_dictionary = self.read_tare_file()
+        if "tares" in tare_dictionary:
+            self.set_tare(tare_dictionary["tares"])
+        else:
+            self.set_tare(self.tare_scales())
 
         if self.settings["LOG_LEVEL"] == 1:
             print("init_scales HX objects reset at {:.3f} secs.".format(time.process_time() - t_start))
 
+    # Return settings[name] if it is set, otherwise the default
+    def setting(self, name, default):
+        if not name in self.settings:
+            return default
+        return self.settings[name]
+
+    # Use 'tare_list' as the per-cell offsets
+    def set_tare(self, tare_list):
+        self.tare_list = list(tare_list)
+
+        # The tare readings are the per-cell offsets of the calibration
+        self.calibration.set_offset(self.tare_list)
+
+        # And keep the HX711 objects consistent, e.g. for hx.get_weight_A()
+        for hx, tare in zip(self.hx_list, self.tare_list):
+            hx.set_offset_A(tare)
+
+    # Background tare tracking, called (e.g. by LocalSensor once per second) with the Events detector
+    # and our sensor_id, so we can use the detector's view of whether the pot is removed.
+    #
+    # When the pot has been removed (Events.is_removed) with a stable weight for TARE_STABLE_SECONDS,
+    # the median of each cell's raw readings over that window is a new measurement of the cell's tare.
+    # Each per-cell offset moves TARE_SMOOTHING of the way to the new measurement, providing the
+    # measurement passes tare_ok(). Successive measurements use non-overlapping windows, and the
+    # updated tare is written to TARE_FILENAME every TARE_SAVE_PERIOD seconds.
+    def update_tare(self, events, sensor_id):
+        if not self.tare_tracking:
+            return
+
+        removed, next_offset, m, confidence = events.is_removed(0, sensor_id)
+        if not removed:
+            return
+
+        # Check every stats record in the window is 'removed' and stable
+        stats_buffer = events.sensor_buffers[sensor_id]["stats_buffer"]
+        unstable_test = lambda stats_sample: ( stats_sample["value"]["deviation"] is None or
+                                               stats_sample["value"]["deviation"] > events.STABLE_DEVIATION or
+                                               not events.removed_value(stats_sample["value"]["median"])[0] )
+
+        unstable, next_offset, duration, sample_count = stats_buffer.find(0, self.tare_stable_seconds, unstable_test)
+        if not unstable is None or duration is None or duration < self.tare_stable_seconds - 1:
+            return
+
+        # The raw readings in the same window, not overlapping the window used for the previous update
+        raw_ts, raw_values = self.raw_buffer.latest()
+        window_end = raw_ts[-1]
+        window_begin = window_end - self.tare_stable_seconds
+        if not self.tare_window_ts is None and window_begin < self.tare_window_ts:
+            return
+
+        window_values = raw_values[raw_ts >= window_begin, :len(self.hx_list)]
+        measured_list = np.median(window_values, axis=0).tolist()
+
+        self.tare_window_ts = window_end
+
+        if not self.tare_ok(measured_list):
+            return
+
+        tare_list = [ tare + self.tare_smoothing * (measured - tare)
+                      for tare, measured in zip(self.tare_list, measured_list) ]
+
+        if self.settings["LOG_LEVEL"] <= 2:
+            print("{:.3f} WeightSensor update_tare [ {} ] => [ {} ]".format(time.time(),
+                                                                           list_to_string(self.tare_list, "{:+.0f}"),
+                                                                           list_to_string(tare_list, "{:+.0f}")))
+        self.set_tare(tare_list)
+        self.tare_changed = True
+        self.tare_update_count += 1
+
+        if time.time() - self.tare_saved_ts > self.tare_save_period:
+            self.write_tare_file(self.tare_list)
+            self.tare_saved_ts = time.time()
+            self.tare_changed = False
+
+    # Return the temperature (degrees C) for the calibration drift term, or None if not available.
+    # The temperature changes slowly so is only read every TEMPERATURE_PERIOD seconds.
+    def read_temperature(self, ts):
+        if self.temperature_filename is None:
+            return None
+
+        if self.temperature_ts is None or ts - self.temperature_ts > TEMPERATURE_PERIOD:
+            self.temperature_ts = ts
+            try:
+                with open(self.temperature_filename, "r") as fp:
+                    self.temperature = int(fp.read()) / 1000
+            except Exception as e:
+                print("WeightSensor temperature not available from {}".format(self.temperature_filename))
+                print(e)
+                self.temperature_filename = None
+                self.temperature = None
+
+        return self.temperature
+
 
     # Read the TARE_FILENAME defined in CONFIG, return the contained json as a python dictionary
     def read_tare_file(self):
@@ -83,7 +236,7 @@ class WeightSensor(object):
 
         tare_json = """
         {{ "acp_ts": {:.3f},
-            "tares": [ {:.1f}, {:.1f}, {:.1f}, {:1f} ]
+            "tares": [ {:.1f}, {:.1f}, {:.1f}, {:.1f} ]
         }}
         """.format(acp_ts, *tare_list)
 
@@ -161,6 +314,13 @@ class WeightSensor(object):
         # The new tare readings are out of range, so use persisted values
         tare_dictionary = self.read_tare_file()
 
+        # With no persisted tare (e.g. first boot, or the tare file lost) we can only use the measured values,
+        # already set in the HX711 objects, and they are not written to the tare file.
+        if not "tares" in tare_dictionary:
+            output_string = "tare_scales WARNING readings out of range and no persisted tare, using readings [ {} ]"
+            print(output_string.format(list_to_string(tare_list,"{:+.0f}")))
+            return tare_list
+
         tare_list = tare_dictionary["tares"]
 
         # As the measured tare values are not acceptable, we now update the HX711 objects with the persisted values.
@@ -174,21 +334,33 @@ class WeightSensor(object):
 
         return tare_list
 
-    # Return the weight in grams, combined from both load cells
+    # Return the weight in grams, combined from all the load cells via the calibration model
     def get_value(self):
         t_start = time.process_time()
 
-        total_reading = 0
         reading_list = []
+        ready_total = 0
         for hx in self.hx_list:
-            # get_weight accepts a parameter 'number of times to sample weight and then average'
-            reading = hx.get_weight_A(1)
-            reading_list.append(reading)
-            total_reading = total_reading + reading
+            # raw reading, the offset (tare) and gain are applied by the calibration model
+            reading_list.append(hx.read_long())
+            ready_total += hx.ready_ts
+
+        # The load cells are read in turn, so the acquisition time is the mean of their DOUT-ready times
+        self.acquisition_ts = ready_total / len(self.hx_list)
+
+        temperature = self.read_temperature(self.acquisition_ts)
+
+        self.raw_buffer.put(self.acquisition_ts, reading_list + [ float("nan") if temperature is None else temperature ])
+
+        # Each time the raw_buffer fills, optionally append it to the RAW_CSV_FILE for offline calibration
+        if self.raw_buffer.index == 0 and "RAW_CSV_FILE" in self.settings:
+            self.raw_buffer.save(self.settings["RAW_CSV_FILE"], ts_offset=time.time() - time.monotonic())
+
+        weight = float(self.calibration.apply(reading_list, temperature))
 
         if self.settings["LOG_LEVEL"] == 1:
             output_string = "get_weight readings [ {} ] completed at {:.3f} secs."
             print( output_string.format(list_to_string(reading_list, "{:+.0f}"), time.process_time() - t_start))
 
-        return total_reading / self.settings["WEIGHT_FACTOR"] # grams
+        return weight # grams
 
@@ -0,0 +1,109 @@
+# display_benchmark.py
+
+"""
+Measures how long the Display calls made by the sensor loop (Display.update() for each weight reading,
+and update_event() for the events) block the caller, with and without the display RenderThread
+(see classes/render_thread.py), using a fake spidev that takes as long as the real 9 MHz SPI bus.
+
+Usage (from the 'code' directory):
+
+    python3 display_benchmark.py [--config <settings overlay>] [--readings N] [--rate HZ] [--chart] <csv file>
+
+The recorded <ts>,<weight> readings of <csv file> (the first N, default 600) are put in a sample buffer
+and passed to Display.update() at 'rate' readings per second (default 10, the weight sensor rate), with
+an event every 50 readings. The table shows the time per call in the caller, and for the RenderThread the
+posts and draws, i.e. how many region updates were replaced by a newer one before being drawn.
+
+E.g.
+    python3 display_benchmark.py --chart ../data/2019-12-18/save_1576677425.258.csv
+"""
+
+import time
+import argparse
+
+import st7735_ijl20.st7735 as st7735
+
+from classes.config import Config
+from classes.display import Display
+from classes.events import EventCode
+from classes.time_buffer import TimeBuffer
+from classes.replay import count_lines
+
+from lcd_fill_benchmark import FakeSpiDev, FakeGPIO
+
+EVENT_PERIOD = 50 # readings between events
+
+# A fake spidev that sleeps for the transfer time at SPI_CLOCK_HZ
+class SlowSpiDev(FakeSpiDev):
+
+    def record(self, data):
+        time.sleep(len(data) * 8 / st7735.SPI_CLOCK_HZ)
+
+# Return ( sorted list of secs per call, renderer ) for 'readings' passed to a Display with 'settings'
+def run(settings, readings, rate):
+    gpio = FakeGPIO()
+    st7735.GPIO = gpio
+    st7735.SPI = SlowSpiDev(gpio)
+
+    display = Display(settings)
+    display.begin()
+
+    sample_buffer = TimeBuffer(size=1000, settings=settings)
+
+    call_times = []
+    for i, (ts, value) in enumerate(readings):
+        sample_buffer.put(ts, value)
+
+        t_start = time.perf_counter()
+        display.update(ts, sample_buffer)
+        if i % EVENT_PERIOD == EVENT_PERIOD - 1:
+            display.update_event(ts, { "event_code": EventCode.POURED, "weight_poured": i })
+        call_times.append(time.perf_counter() - t_start)
+
+        time.sleep(max(0, 1 / rate - call_times[-1]))
+
+    renderer = display.renderer
+    display.finish()
+
+    return sorted(call_times), renderer
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Measure the time the Display blocks the sensor loop")
+    parser.add_argument("filename", help="csv file of recorded <ts>,<weight> readings")
+    parser.add_argument("--config", default=None, help="settings file to overlay on config/sensor_config.json")
+    parser.add_argument("--readings", type=int, default=600, help="number of readings")
+    parser.add_argument("--rate", type=float, default=10, help="readings per second")
+    parser.add_argument("--chart", action="store_true", help="with the real-time weight chart")
+    args = parser.parse_args()
+
+    settings = Config(args.config).settings
+    settings = settings.replace(SIMULATE_DISPLAY=False,
+                                DISPLAY=True,
+                                DISPLAY_CHART=args.chart,
+                                LOG_LEVEL=3)
+
+    st7735.SIMULATION_MODE = False
+
+    recording = TimeBuffer(size=count_lines(args.filename), settings=settings)
+    recording.load(args.filename)
+    readings = []
+    recording.play(lambda ts, value: readings.append((ts, value)))
+    readings = readings[:args.readings]
+
+    results = []
+    for threaded in [ False, True ]:
+        call_times, renderer = run({ **settings, "DISPLAY_THREAD": threaded }, readings, args.rate)
+        results.append(( "thread" if threaded else "inline", call_times, renderer ))
+
+    print("{} readings at {} Hz{}".format(len(readings), args.rate, ", with chart" if args.chart else ""))
+    print("{: <8} {: >10} {: >10} {: >10} {: >10} {: >8} {: >8}".format("display", "mean ms", "p50 ms", "p99 ms",
+                                                                   "max ms", "posts", "draws"))
+    for name, call_times, renderer in results:
+        count = len(call_times)
+        print("{: <8} {: >10.3f} {: >10.3f} {: >10.3f} {: >10.3f} {: >8} {: >8}".format(name,
+                    1000 * sum(call_times) / count,
+                    1000 * call_times[count // 2],
+                    1000 * call_times[min(count - 1, int(count * 0.99))],
+                    1000 * call_times[-1],
+                    "" if renderer is None else renderer.posts,
+                    "" if renderer is None else renderer.draws))
@@ -0,0 +1,148 @@
+# display_memory_check.py
+
+"""
+Checks that the steady-state Display updates don't allocate PIL images, i.e. that each display region
+reuses its image (see RegionImage in classes/display.py), and reports the memory traced by tracemalloc.
+
+Usage (from the 'code' directory):
+
+    python3 display_memory_check.py [--config <settings overlay>] [--seconds SECS] [--chart] <csv file> ...
+
+The recorded <ts>,<weight> readings of the csv files (repeated if necessary to fill --seconds, default
+3600) are passed to Display.update(), with an event every 30 seconds and a new pot every 20 minutes, drawing
+to a fake LCD. After the first WARMUP_SECONDS (so the fonts, text sizes etc. are loaded) the PIL images
+created are counted and tracemalloc compares the memory at the start and end of the replay. The check fails
+(exit code 1) if any images are created.
+
+E.g.
+    python3 display_memory_check.py ../data/2019-12-18/*.csv
+"""
+
+import sys
+import time
+import argparse
+import tracemalloc
+
+from PIL import Image
+
+import st7735_ijl20.st7735 as st7735
+
+from classes.config import Config
+from classes.display import Display
+from classes.events import EventCode
+from classes.time_buffer import TimeBuffer
+from classes.replay import count_lines
+
+from lcd_fill_benchmark import FakeSpiDev, FakeGPIO
+
+WARMUP_SECONDS = 300
+EVENT_PERIOD = 30  # seconds
+NEW_PERIOD = 1200  # seconds
+
+# A fake spidev that only counts the transfers
+class NullSpiDev(FakeSpiDev):
+
+    def record(self, data):
+        self.calls += 1
+
+# Counts the PIL Image objects created
+class ImageCounter(object):
+
+    def __init__(self):
+        self.count = 0
+        self.original_init = None
+
+    def start(self):
+        self.original_init = Image.Image.__init__
+        counter = self
+        def counted_init(image, *args, **kwargs):
+            counter.count += 1
+            counter.original_init(image, *args, **kwargs)
+        Image.Image.__init__ = counted_init
+
+    def stop(self):
+        Image.Image.__init__ = self.original_init
+
+# Return list of (ts, value) readings from the csv 'filenames', repeated to cover 'seconds'
+def load_readings(filenames, settings, seconds):
+    recorded = []
+    for filename in filenames:
+        recording = TimeBuffer(size=count_lines(filename), settings=settings)
+        recording.load(filename)
+        recording.play(lambda ts, value: recorded.append((ts, value)))
+
+    readings = []
+    offset = 0
+    while True:
+        for ts, value in recorded:
+            if ts + offset - recorded[0][0] > seconds:
+                return readings
+            readings.append((ts + offset, value))
+        offset = readings[-1][0] - recorded[0][0] + 0.1
+
+def replay(display, sample_buffer, readings):
+    prev_event_ts = readings[0][0]
+    prev_new_ts = readings[0][0]
+    for ts, value in readings:
+        sample_buffer.put(ts, value)
+        display.update(ts, sample_buffer)
+        if ts - prev_event_ts > EVENT_PERIOD:
+            display.update_event(ts, { "event_code": EventCode.POURED, "weight_poured": int(value) % 500 })
+            prev_event_ts = ts
+        if ts - prev_new_ts > NEW_PERIOD:
+            display.update_new(ts)
+            prev_new_ts = ts
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Check the Display reuses its images, with tracemalloc")
+    parser.add_argument("filenames", nargs="+", help="csv files of recorded <ts>,<weight> readings")
+    parser.add_argument("--config", default=None, help="settings file to overlay on config/sensor_config.json")
+    parser.add_argument("--seconds", type=float, default=3600, help="seconds of readings to replay")
+    parser.add_argument("--chart", action="store_true", help="with the real-time weight chart")
+    args = parser.parse_args()
+
+    settings = Config(args.config).settings
+    settings = settings.replace(SIMULATE_DISPLAY=False,
+                                DISPLAY=True,
+                                DISPLAY_THREAD=False,
+                                DISPLAY_CHART=args.chart,
+                                LOG_LEVEL=3)
+
+    st7735.SIMULATION_MODE = False
+    gpio = FakeGPIO()
+    st7735.GPIO = gpio
+    st7735.SPI = NullSpiDev(gpio)
+
+    readings = load_readings(args.filenames, settings, args.seconds)
+    warmup_count = len([ 1 for ts, value in readings if ts - readings[0][0] <= WARMUP_SECONDS ])
+
+    display = Display(settings)
+    display.begin()
+    sample_buffer = TimeBuffer(size=1000, settings=settings)
+
+    replay(display, sample_buffer, readings[:warmup_count])
+
+    images = ImageCounter()
+    images.start()
+    tracemalloc.start()
+    snapshot_start = tracemalloc.take_snapshot()
+    t_start = time.perf_counter()
+
+    replay(display, sample_buffer, readings[warmup_count:])
+
+    elapsed = time.perf_counter() - t_start
+    snapshot_end = tracemalloc.take_snapshot()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    images.stop()
+
+    print("{} readings ({:.0f} secs) replayed in {:.1f} secs after {} secs warmup".format(
+                len(readings) - warmup_count, readings[-1][0] - readings[warmup_count][0], elapsed, WARMUP_SECONDS))
+    print("PIL images created: {}".format(images.count))
+    print("tracemalloc current {} bytes, peak {} bytes, largest changes:".format(current, peak))
+    for stat in snapshot_end.compare_to(snapshot_start, "lineno")[:5]:
+        print("    {}".format(stat))
+
+    if images.count > 0:
+        print("display_memory_check FAILED, steady-state display updates created images")
+        sys.exit(1)
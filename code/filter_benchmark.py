@@ -0,0 +1,171 @@
+# filter_benchmark.py
+
+"""
+Compares the sample filters (classes/filters.py) by replaying recorded days through the Events
+detector with each filter, reporting COFFEE_POURED detection accuracy and latency.
+
+Usage (from the 'code' directory):
+
+    python3 filter_benchmark.py [--config <settings overlay>] [--labels <labels.csv>] [--filter <name> ...]
+                                [--spikes <fraction>] [--spike-size <grams>] [--seed N] [--workers N]
+                                <day> [<day> ...]
+
+<day> is a directory of <ts>,<weight> CSV files or a single CSV file, as for replay_archive.py.
+
+Spikes (a single reading offset by +/- --spike-size grams) are added to a fraction --spikes of the
+readings (default 0.01), as seen from the load cells. The reference events are the --labels
+(as for sweep.py) or, by default, the events detected in the original recording with no filter
+and no spikes. For each filter the table shows the matched (tp), extra (fp) and missed (fn)
+POURED events, the mean and max delay of the matched events, and the filter cpu time per reading.
+
+E.g.
+    python3 filter_benchmark.py ../data/2019-* ../data/2020-*
+"""
+
+import sys
+import time
+import random
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+from classes.config import Config
+from classes.events import EventCode
+from classes.filters import FILTERS
+from classes.replay import Replay, count_lines
+from classes.time_buffer import TimeBuffer
+from classes.sweep import load_labels
+from replay_archive import find_days
+
+TOLERANCE = 30 # seconds between a detected and a reference event for a match
+
+# Return list of (ts, value) readings from the CSV files of one day
+def load_readings(filenames, settings):
+    readings = []
+    for filename in sorted(filenames):
+        line_count = count_lines(filename)
+        if line_count == 0:
+            continue
+        recording = TimeBuffer(size=line_count, settings=settings)
+        recording.load(filename)
+        recording.play(lambda ts, value: readings.append((ts, value)))
+    return readings
+
+# Return a copy of 'readings' with spikes added to 'rate' of the readings
+def add_spikes(readings, rate, size, seed):
+    rng = random.Random(seed)
+    return [ (ts, value + rng.choice([ -size, size ]) if rng.random() < rate else value)
+             for ts, value in readings ]
+
+# Replay 'readings' with a new filter 'filter_name' (or None), return ( events, filter cpu secs per reading )
+def replay_readings(day, readings, settings, filter_name):
+    sample_filter = None if filter_name is None else FILTERS[filter_name]()
+
+    replay = Replay(day, settings, sample_filter=sample_filter)
+    for ts, value in readings:
+        replay.process_sample(ts, value)
+
+    filter_time = 0
+    if not sample_filter is None and len(readings) > 0:
+        timing_filter = FILTERS[filter_name]()
+        t_start = time.process_time()
+        for ts, value in readings:
+            timing_filter.filter(ts, value)
+        filter_time = (time.process_time() - t_start) / len(readings)
+
+    return replay.finish()["events"], filter_time
+
+# Match detected events to reference (ts, event_code) events of 'event_code'
+# Returns { "tp":, "fp":, "fn":, "delays": [ detected ts - reference ts for each match ] }
+def match_events(events, reference, event_code):
+    unmatched = [ ts for ts, code in reference if code == event_code ]
+    result = { "tp": 0, "fp": 0, "fn": 0, "delays": [] }
+    for event in events:
+        if event["event_code"] != event_code:
+            continue
+        best = None
+        for ts in unmatched:
+            if abs(ts - event["ts"]) <= TOLERANCE and (best is None or abs(ts - event["ts"]) < abs(best - event["ts"])):
+                best = ts
+        if best is None:
+            result["fp"] += 1
+        else:
+            result["tp"] += 1
+            result["delays"].append(event["ts"] - best)
+            unmatched.remove(best)
+    result["fn"] = len(unmatched)
+    return result
+
+# Benchmark every filter on one day, return { filter_name: match result + "filter_time" }
+def benchmark_day(day, filenames, settings, filter_names, labels, spike_rate, spike_size, seed):
+    readings = load_readings(filenames, settings)
+    if len(readings) == 0:
+        return {}
+
+    if labels is None:
+        events, filter_time = replay_readings(day, readings, settings, None)
+        reference = [ (event["ts"], event["event_code"]) for event in events ]
+    else:
+        reference = [ label for label in labels
+                      if label[0] >= readings[0][0] - TOLERANCE and label[0] <= readings[-1][0] + TOLERANCE ]
+
+    spiked_readings = add_spikes(readings, spike_rate, spike_size, seed)
+
+    results = {}
+    for filter_name in filter_names:
+        events, filter_time = replay_readings(day, spiked_readings, settings, filter_name)
+        results[filter_name] = { **match_events(events, reference, EventCode.POURED), "filter_time": filter_time }
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare sample filters on POURED detection")
+    parser.add_argument("paths", nargs="+", help="day directories or CSV files of <ts>,<weight> readings")
+    parser.add_argument("--config", default=None, help="settings file to overlay on config/sensor_config.json")
+    parser.add_argument("--labels", default=None, help="labelled events CSV (default: unfiltered replay)")
+    parser.add_argument("--filter", action="append", default=None, help="filter name (default: none + all)")
+    parser.add_argument("--spikes", type=float, default=0.01, help="fraction of readings given a spike")
+    parser.add_argument("--spike-size", type=float, default=2000, help="spike size in grams")
+    parser.add_argument("--seed", type=int, default=1, help="random seed for the spikes")
+    parser.add_argument("--workers", type=int, default=None, help="number of processes (default: cpu count)")
+    args = parser.parse_args()
+
+    settings = Config(args.config).settings
+    settings = settings.replace(LOG_LEVEL=3)
+
+    filter_names = [ None ] + sorted(FILTERS.keys()) if args.filter is None else args.filter
+
+    labels = None if args.labels is None else load_labels(args.labels)
+
+    days = find_days(args.paths)
+
+    t_start = time.time()
+
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = [ executor.submit(benchmark_day, day, filenames, settings, filter_names, labels,
+                                    args.spikes, args.spike_size, args.seed + i)
+                    for i, (day, filenames) in enumerate(days.items()) ]
+        day_results = [ future.result() for future in futures ]
+
+    print("{: <8} {: >4} {: >4} {: >4} {: >10} {: >10} {: >12}".format("filter", "tp", "fp", "fn",
+                                                                     "mean delay", "max delay", "us/reading"))
+    for filter_name in filter_names:
+        total = { "tp": 0, "fp": 0, "fn": 0, "delays": [] }
+        filter_times = []
+        for results in day_results:
+            if not filter_name in results:
+                continue
+            for key in total:
+                total[key] += results[filter_name][key]
+            filter_times.append(results[filter_name]["filter_time"])
+
+        delays = total["delays"]
+        print("{: <8} {: >4} {: >4} {: >4} {: >10.2f} {: >10.2f} {: >12.2f}".format(str(filter_name),
+                                                                                 total["tp"],
+                                                                                 total["fp"],
+                                                                                 total["fn"],
+                                                                                 sum(delays) / len(delays) if delays else 0,
+                                                                                 max(delays) if delays else 0,
+                                                                                 1e6 * sum(filter_times) / len(filter_times) if filter_times else 0))
+
+    print("filter_benchmark {} days, spikes {} x {}g, in {:.1f} secs".format(len(days), args.spikes, args.spike_size,
+                                                                          time.time() - t_start),
+          file=sys.stderr)
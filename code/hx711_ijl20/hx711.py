@@ -17,6 +17,9 @@ class HX711:
 
         self.DEBUG_LOG = False
 
+        # time.monotonic() when the HX711 signalled the latest sample was ready (DOUT low)
+        self.ready_ts = None
+
         if SIMULATION_MODE:
             return
 
@@ -131,6 +134,9 @@ class HX711:
         while not self.is_ready():
            pass
 
+        # Record the acquisition time of this sample, before the time spent clocking out the bits
+        self.ready_ts = time.monotonic()
+
         if self.DEBUG_LOG:
             print('hx711 readRawBytes is_ready at {:.3f}'.format(time.process_time()-t_start))
 
@@ -160,6 +166,7 @@ class HX711:
     def read_long(self):
         # Get a sample from the HX711 in the form of raw bytes.
         if SIMULATION_MODE:
+            self.ready_ts = time.monotonic()
             return 7
 
         dataBytes = self.readRawBytes()
@@ -0,0 +1,132 @@
+# idle_pour_check.py
+
+"""
+Checks that a cup POURED just after the LocalSensor has dropped to its idle sample rate (SAMPLE_ADAPTIVE,
+see classes/local_sensor.py) is detected as it is at the full rate.
+
+Usage (from the 'code' directory):
+
+    python3 idle_pour_check.py [--config <settings overlay>]
+
+A pot of FLAT_WEIGHT grams stands on the scale for FLAT_SECONDS (long enough for the sensor to go idle),
+then the pump is pushed (PUSH_WEIGHT) for PUSH_SECONDS and a cup is poured, leaving POURED_WEIGHT. The
+readings (with a little noise) are timestamped at the sensor's current sample period, as by the
+LocalSensor.start() loop but without the sleeps, and passed through a single station's SensorHub.
+
+The weight is replayed with SAMPLE_ADAPTIVE false and true. The check fails (exit code 1) unless the
+adaptive run went idle before the push and both runs send one COFFEE_POURED event, with weight_poured within
+POURED_TOLERANCE grams of each other. The classes' own logging is sent to /dev/null.
+"""
+
+import os
+import sys
+import random
+import asyncio
+import argparse
+import contextlib
+
+from classes.config import Config
+from classes.sensor_hub import SensorHub
+from classes.local_sensor import LocalSensor
+from classes.events import EventCode
+
+T_START = 1600000000.0
+
+FLAT_WEIGHT = 3000
+FLAT_SECONDS = 200
+PUSH_WEIGHT = 5600
+PUSH_SECONDS = 10
+POURED_WEIGHT = 2850
+POURED_SECONDS = 60
+
+NOISE = 2 # grams
+
+# The idle stats are medians of fewer readings, so the weight_poured may differ by a few grams
+POURED_TOLERANCE = 5 # grams
+
+# Return the weight on the scale at 'ts'
+def weight_at(ts):
+    t = ts - T_START
+    if t < FLAT_SECONDS:
+        return FLAT_WEIGHT
+    if t < FLAT_SECONDS + PUSH_SECONDS:
+        return PUSH_WEIGHT
+    return POURED_WEIGHT
+
+# Return ( events sent, True if the sensor was idle before the push, readings ) for one replay
+async def run(settings):
+    sensor_hub = SensorHub(settings=settings)
+
+    events = []
+    async def put(sensor_id, event):
+        events.append(event)
+    sensor_hub.uplink.put = put
+
+    local_sensor = LocalSensor(settings=settings, sensor_id=settings["WEIGHT_SENSOR_ID"], sensor_hub=sensor_hub)
+    sensor_id = local_sensor.sensor_id
+    sample_buffer = local_sensor.sample_buffer
+
+    noise = random.Random(1)
+    idle_before_push = False
+    readings = 0
+
+    ts = T_START
+    prev_ts = None
+    while ts < T_START + FLAT_SECONDS + PUSH_SECONDS + POURED_SECONDS:
+        value = weight_at(ts) + noise.uniform(-NOISE, NOISE)
+
+        sample_buffer.put(ts, value)
+        await sensor_hub.process_reading(ts, sensor_id)
+        readings += 1
+
+        if local_sensor.adaptive:
+            local_sensor.update_sample_rate(ts, value, prev_ts)
+
+        if local_sensor.idle and ts - T_START < FLAT_SECONDS:
+            idle_before_push = True
+
+        prev_ts = ts
+        ts += local_sensor.idle_period if local_sensor.idle else local_sensor.active_period
+
+    return events, idle_before_push, readings
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Check a pour just after the sensor goes idle is detected")
+    parser.add_argument("--config", default=None, help="settings file to overlay on config/sensor_config.json")
+    args = parser.parse_args()
+
+    settings = Config(args.config).settings.replace(LOG_LEVEL=3,
+                                                    SIMULATE_UPLINK=True,
+                                                    SIMULATE_SENSORS=True,
+                                                    SIMULATE_DISPLAY=True,
+                                                    DISPLAY=False,
+                                                    SAMPLE_PERIOD=0.1,
+                                                    SAMPLE_IDLE_PERIOD=1.0,
+                                                    SAMPLE_IDLE_SECONDS=60)
+
+    out = sys.stdout
+    poured = {}
+    failed = False
+    for adaptive in [ False, True ]:
+        with open(os.devnull, "w") as log, contextlib.redirect_stdout(log):
+            events, idle_before_push, readings = asyncio.run(run(settings.replace(SAMPLE_ADAPTIVE=adaptive)))
+
+        poured[adaptive] = [ event["weight_poured"] for event in events if event["event_code"] == EventCode.POURED ]
+        print("SAMPLE_ADAPTIVE={} readings {} idle before push {} COFFEE_POURED {}".format(adaptive,
+                                                                                         readings,
+                                                                                         idle_before_push,
+                                                                                         poured[adaptive]), file=out)
+        if adaptive and not idle_before_push:
+            print("idle_pour_check FAILED: the sensor did not go idle before the push", file=out)
+            failed = True
+
+    if ( len(poured[False]) != 1 or
+         len(poured[True]) != 1 or
+         abs(poured[True][0] - poured[False][0]) > POURED_TOLERANCE ):
+        print("idle_pour_check FAILED: the adaptive COFFEE_POURED differs from the full rate", file=out)
+        failed = True
+
+    if failed:
+        sys.exit(1)
+
+    print("idle_pour_check passed", file=out)
@@ -0,0 +1,173 @@
+# ingest_service.py
+
+"""
+Runs the IngestService (classes/ingest.py), a local stand-in for the platform receiving the sensor nodes'
+events, which validates each event and reports the receive latency, optionally with hundreds of simulated
+nodes publishing recorded traffic to find how many coffee stations one platform instance can absorb.
+
+Usage (from the 'code' directory):
+
+    python3 ingest_service.py [--config <settings overlay>] [--host HOST] [--port PORT] [--topic TOPIC]
+                              [--broker] [--report SECS]
+                              [--nodes N] [--workers W] [--speed X] [--seconds SECS] [<day> ...]
+
+The service subscribes to --topic (default "#") on the MQTT broker at --host and --port (default
+PLATFORM_HOST and PLATFORM_PORT), with the link given by "INGEST_LINK" (default "gmqtt"), and prints the
+events received, the invalid events, the nodes seen and the latency percentiles every --report secs (default
+10). With --broker a LocalBroker (classes/local_broker.py) is run in this process on --host (default
+127.0.0.1) and --port.
+
+With --nodes N, and recorded <day>s of <ts>,<weight> readings (directories of csv files, as replay_archive.py),
+N simulated nodes ("ingest-node-000" ...) publish the events those readings produce (COFFEE_STATUS every
+WATCHDOG_PERIOD and the detected events) --speed times faster than recorded (default 60), for --seconds
+(default 60), spread over W worker processes (default 2, or 0 to run them in this process). A node sends
+the recorded events 'speed' times as often, so the last line gives the number of nodes sending at the recorded
+rate that the service absorbed. Increase --nodes and --speed until the latency grows or events are lost to
+find the capacity of the service (and broker).
+
+E.g.
+    python3 ingest_service.py --broker --port 18840 --nodes 200 --speed 120 --seconds 30 ../data/2019-11-22
+    python3 ingest_service.py --host 127.0.0.1 --port 1883   # events from real nodes, until Ctrl-C
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+import contextlib
+import multiprocessing
+
+from classes.config import Config
+from classes.ingest import IngestService, node_traffic, simulate_nodes
+from classes.local_broker import get_broker
+
+from replay_archive import find_days
+
+def print_report(report, elapsed):
+    def ms(secs):
+        return "" if secs is None else "{:.1f}".format(1000 * secs)
+    invalid = sum(report["invalid"].values())
+    print("{: >7.1f} {: >8} {: >8.1f} {: >6} {: >8} {: >8} {: >8} {: >8}  {}".format(elapsed,
+            report["received"],
+            report["received"] / report["secs"],
+            report["nodes"],
+            invalid,
+            ms(report["latency_p50"]),
+            ms(report["latency_p99"]),
+            ms(report["latency_max"]),
+            " ".join("{} {}".format(reason, count) for reason, count in report["invalid"].items())),
+          file=sys.stderr)
+
+def print_header():
+    print("{: >7} {: >8} {: >8} {: >6} {: >8} {: >8} {: >8} {: >8}".format("secs", "events", "ev/sec", "nodes",
+                                                                          "invalid", "p50 ms", "p99 ms", "max ms"),
+          file=sys.stderr)
+
+# Run simulate_nodes() in a worker process, with the links' logging sent to /dev/null, setting 'sent' to
+# the count of events sent
+def node_worker(settings, server_settings, traffic, node_ids, speed, seconds, sent):
+    with open(os.devnull, "w") as log, contextlib.redirect_stdout(log):
+        sent.value = asyncio.run(simulate_nodes(settings, server_settings, traffic, node_ids, speed, seconds))
+
+async def run(settings, args, server_settings, traffic):
+    if args.broker:
+        broker = get_broker(server_settings["host"])
+        await broker.start_mqtt(server_settings["host"], server_settings["port"])
+
+    service = IngestService(settings)
+    service_task = asyncio.ensure_future(service.start(server_settings, args.topic))
+    await asyncio.sleep(0.5) # let the subscription reach the broker
+
+    node_ids = [ "ingest-node-{:03d}".format(i) for i in range(args.nodes) ]
+
+    workers = [] # [ process, sent count ]
+    nodes_task = None
+    if len(node_ids) > 0 and args.workers > 0:
+        for w in range(args.workers):
+            sent = multiprocessing.Value("i", 0)
+            worker = multiprocessing.Process(target=node_worker,
+                                             args=(settings, server_settings, traffic, node_ids[w::args.workers],
+                                                   args.speed, args.seconds, sent))
+            worker.start()
+            workers.append([ worker, sent ])
+    elif len(node_ids) > 0:
+        nodes_task = asyncio.ensure_future(simulate_nodes(settings, server_settings, traffic, node_ids,
+                                                          args.speed, args.seconds))
+
+    print_header()
+    t_start = time.time()
+    service.report()
+    totals = { "received": 0 }
+    try:
+        while True:
+            await asyncio.sleep(args.report)
+            report = service.report()
+            print_report(report, time.time() - t_start)
+            totals["received"] += report["received"]
+            if len(node_ids) > 0 and time.time() - t_start > args.seconds + 2:
+                break
+    except asyncio.CancelledError:
+        pass
+
+    sent = 0
+    if not nodes_task is None:
+        sent = await nodes_task
+    for worker, worker_sent in workers:
+        worker.join()
+        sent += worker_sent.value
+
+    await service.finish()
+    await service_task
+
+    if args.broker:
+        await broker.finish()
+
+    if len(node_ids) > 0:
+        node_rate = len(traffic) / (traffic[-1][0] + 1) # events per sec per node at the recorded rate
+        print("{} events sent in {:.1f} secs by {} nodes at {}x, {} received ({} lost), i.e. {:.0f} nodes at the recorded rate".format(
+                sent, args.seconds, len(node_ids), args.speed, totals["received"], sent - totals["received"],
+                totals["received"] / args.seconds / node_rate),
+              file=sys.stderr)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run a local event ingestion service, optionally with simulated nodes")
+    parser.add_argument("days", nargs="*", help="recorded days of readings for the simulated nodes' traffic")
+    parser.add_argument("--config", default=None, help="settings file to overlay on config/sensor_config.json")
+    parser.add_argument("--host", default=None, help="broker host, default PLATFORM_HOST (127.0.0.1 with --broker)")
+    parser.add_argument("--port", type=int, default=None, help="broker port, default PLATFORM_PORT")
+    parser.add_argument("--topic", default="#", help="topic filter of the node events")
+    parser.add_argument("--broker", action="store_true", help="run a LocalBroker in this process")
+    parser.add_argument("--report", type=float, default=10, help="secs between reports")
+    parser.add_argument("--nodes", type=int, default=0, help="number of simulated nodes")
+    parser.add_argument("--workers", type=int, default=2, help="processes for the simulated nodes")
+    parser.add_argument("--speed", type=float, default=60, help="speed-up of the recorded traffic")
+    parser.add_argument("--seconds", type=float, default=60, help="secs of simulated traffic")
+    args = parser.parse_args()
+
+    settings = Config(args.config).settings
+
+    host = args.host
+    if host is None:
+        host = "127.0.0.1" if args.broker else settings["PLATFORM_HOST"]
+    port = settings["PLATFORM_PORT"] if args.port is None else args.port
+    server_settings = { "host": host, "port": port,
+                        "user": settings["PLATFORM_USER"], "password": settings["PLATFORM_PASSWORD"] }
+
+    traffic = []
+    if args.nodes > 0:
+        days = find_days(args.days)
+        if len(days) == 0:
+            print("ingest_service --nodes needs the recorded days of readings for their traffic", file=sys.stderr)
+            sys.exit(1)
+        for day, filenames in sorted(days.items()):
+            day_traffic = node_traffic(filenames, settings)
+            offset = traffic[-1][0] + 1 if len(traffic) > 0 else 0
+            traffic += [ [ offset + secs, event ] for secs, event in day_traffic ]
+        print("{} events of recorded traffic over {:.1f} hours".format(len(traffic), traffic[-1][0] / 3600),
+              file=sys.stderr)
+
+    try:
+        asyncio.run(run(settings, args, server_settings, traffic))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,209 @@
+# lcd_chart_benchmark.py
+
+"""
+Benchmarks the real-time weight chart (st7735_ijl20/chart.py, enabled in the Display with
+"DISPLAY_CHART": true) against the previous Chart that built each column as a Python list of bytes,
+using the fake spidev and RPi.GPIO of lcd_fill_benchmark.py, so no display is needed.
+
+Usage (from the 'code' directory):
+
+    python3 lcd_chart_benchmark.py [--points N] [--rate HZ] [--scroll]
+
+Adds N points with chart.add_time() at 'rate' readings per second (default 10, i.e. the weight sensor
+rate) to the Display's 101x36 chart, and shows the SPI transfers, bytes and wall time per point
+for the previous ('list') and current ('numpy') charts. The chart area left on the display by the
+two charts is checked to be the same.
+
+With --scroll the chart is full height (101x128, as needed by the hardware scroll) and the hardware
+scroll chart ("scroll": True) is added to the table.
+"""
+
+import math
+import time
+import random
+import argparse
+
+import numpy as np
+
+import st7735_ijl20.st7735 as st7735
+from st7735_ijl20.st7735 import ST7735
+from st7735_ijl20.chart import Chart
+
+from classes.display import CHART_SETTINGS, DISPLAY_SETTINGS
+
+from lcd_fill_benchmark import FakeSpiDev, FakeGPIO
+
+# The previous Chart, building lists of bytes for each column and clear()
+class LegacyChart(Chart):
+
+    def make_area(self, width, height, by):
+        bg = self.settings["bg_color"]
+        fg = self.settings["fg_color"]
+        bar_width = self.settings["bar_width"]
+        cursor_width = self.settings["cursor_width"]
+
+        cursor_bytes = self.settings["cursor_color"] * cursor_width
+
+        blank_bytes = bg * (width - cursor_width)
+        blank_bytes.extend(cursor_bytes)
+
+        bar_bytes = bg * (width - bar_width - cursor_width)
+        bar_bytes.extend(fg * bar_width)
+        bar_bytes.extend(cursor_bytes)
+
+        pixelbytes = []
+        for row in range(height):
+            if height - row > by:
+                pixelbytes.extend(blank_bytes)
+            elif self.settings["point_height"] is None:
+                pixelbytes.extend(bar_bytes)
+            else:
+                if height - row > by - self.settings["point_height"]:
+                    pixelbytes.extend(bar_bytes)
+                else:
+                    pixelbytes.extend(blank_bytes)
+
+        return pixelbytes
+
+    def clear(self, cx=0, cw=None):
+        if cw is None:
+            cw = self.settings["w"]
+        x = self.settings["x"] + cx
+        pixelbytes = self.settings["bg_color"] * cw * self.settings["h"]
+        self.lcd.set_window( x, self.settings["y"], cw, self.settings["h"] )
+        self.lcd.send_data(pixelbytes)
+
+    def add(self, bx, by):
+        area_width = self.settings["bar_width"]+self.settings["cursor_width"]
+        if bx + area_width > self.settings["w"]:
+            return
+        x1 = self.settings["x"] + bx
+        y1 = self.settings["y"]
+        self.lcd.set_window( x1, y1, area_width, self.settings["h"] )
+        pixelbytes = self.make_area(area_width, self.settings["h"], by)
+        self.lcd.send_data(pixelbytes)
+
+    def add_time(self, ts, by):
+        if self.prev_bx is None:
+            bx = 0
+        else:
+            x_adj = math.floor((ts - self.prev_ts) / self.settings["time_scale"] + 0.5)
+            bx = self.prev_bx + x_adj
+            if bx < self.settings["w"]:
+                cx = self.prev_bx + self.settings["bar_width"]
+                cw = bx - self.prev_bx - self.settings["bar_width"]
+                self.clear(cx,cw)
+            else:
+                if bx - self.settings["w"] < self.prev_bx:
+                    cx = self.prev_bx + self.settings["bar_width"]
+                    cw = self.settings["w"] - self.prev_bx + self.settings["bar_width"]
+                    self.clear(cx,cw)
+                    bx = bx - self.settings["w"]
+                else:
+                    bx = bx % self.settings["w"]
+                    cx = bx + self.settings["bar_width"]
+                    cw = self.settings["w"] - bx - self.settings["bar_width"]
+                    self.clear(cx,cw)
+                self.clear(0,bx)
+        self.add(bx,by)
+        self.prev_bx = bx
+        self.prev_ts = ts
+
+# An LCD that just keeps the pixels sent to each window (with a margin, as the previous Chart could
+# overspill the chart area), to compare what the charts leave on the display.
+class FrameLCD(object):
+
+    def __init__(self):
+        self.frame = np.zeros((st7735.LCD_HEIGHT, 2 * st7735.LCD_WIDTH), dtype='u2')
+
+    def set_window(self, x, y, w, h):
+        self.window = ( x, y, w, h )
+
+    def send_data(self, data):
+        x, y, w, h = self.window
+        if w <= 0 or h <= 0 or len(data) == 0:
+            return
+        pixels = np.frombuffer(bytes(data), dtype='>u2').reshape(h, w)
+        self.frame[y:y+h, x:x+w] = pixels
+
+# Return a list of ( ts, bar_height ) for 'points' weight readings at 'rate' per second, with gaps
+def make_points(points, rate, h):
+    random.seed(1)
+    ts = 1576677425.0
+    points_list = []
+    for i in range(points):
+        ts += 1 / rate
+        # an occasional missed reading, and a rare long gap
+        if random.random() < 0.02:
+            ts += 1.5
+        elif random.random() < 0.001:
+            ts += 30
+        points_list.append(( ts, max(1, math.floor(h * (0.5 + 0.4 * math.sin(i / 50))))))
+    return points_list
+
+# Return ( spi calls, spi bytes, secs ) per point for chart class 'chart_class'
+def run_chart(chart_class, chart_settings, points):
+    gpio = FakeGPIO()
+    spi = FakeSpiDev(gpio)
+    st7735.GPIO = gpio
+    st7735.SPI = spi
+
+    chart = chart_class(ST7735(), chart_settings)
+    chart.clear()
+    spi.calls = 0
+    spi.stream = []
+
+    t_start = time.perf_counter()
+    for ts, by in points:
+        chart.add_time(ts, by)
+    elapsed = time.perf_counter() - t_start
+
+    spi_bytes = sum([ len(data) for dc, data in spi.stream ])
+
+    return spi.calls / len(points), spi_bytes / len(points), elapsed / len(points)
+
+# Return the chart area of a FrameLCD after adding 'points' with chart class 'chart_class'
+def chart_frame(chart_class, chart_settings, points):
+    lcd = FrameLCD()
+    chart = chart_class(lcd, chart_settings)
+    chart.clear()
+    for ts, by in points:
+        chart.add_time(ts, by)
+    x, y, w, h = chart_settings["x"], chart_settings["y"], chart_settings["w"], chart_settings["h"]
+    return lcd.frame[y:y+h, x:x+w]
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the LCD weight chart with a fake spidev")
+    parser.add_argument("--points", type=int, default=2000, help="points added to the chart")
+    parser.add_argument("--rate", type=float, default=10, help="readings per second")
+    parser.add_argument("--scroll", action="store_true", help="full height chart, including the hardware scroll chart")
+    args = parser.parse_args()
+
+    st7735.SIMULATION_MODE = False
+
+    chart_settings = { **CHART_SETTINGS,
+                       "x": DISPLAY_SETTINGS["CHART_X"],
+                       "y": DISPLAY_SETTINGS["CHART_Y"],
+                       "w": DISPLAY_SETTINGS["CHART_WIDTH"],
+                       "h": DISPLAY_SETTINGS["CHART_HEIGHT"] }
+
+    if args.scroll:
+        chart_settings["y"] = 0
+        chart_settings["h"] = st7735.LCD_HEIGHT
+
+    points = make_points(args.points, args.rate, chart_settings["h"])
+
+    if not np.array_equal(chart_frame(LegacyChart, chart_settings, points), chart_frame(Chart, chart_settings, points)):
+        print("lcd_chart_benchmark ERROR charts differ")
+
+    results = [ ( "list", run_chart(LegacyChart, chart_settings, points) ),
+                ( "numpy", run_chart(Chart, chart_settings, points) ) ]
+
+    if args.scroll:
+        results.append(( "scroll", run_chart(Chart, { **chart_settings, "scroll": True }, points) ))
+
+    print("{} points at {} Hz on a {}x{} chart".format(len(points), args.rate, chart_settings["w"], chart_settings["h"]))
+    print("{: <8} {: >10} {: >10} {: >10} {: >12}".format("chart", "spi/point", "bytes", "ms/point", "% of period"))
+    for name, ( spi_calls, spi_bytes, secs ) in results:
+        print("{: <8} {: >10.2f} {: >10.0f} {: >10.3f} {: >12.2f}".format(name, spi_calls, spi_bytes,
+                    1000 * secs, 100 * secs * args.rate))
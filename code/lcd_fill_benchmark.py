@@ -0,0 +1,143 @@
+# lcd_fill_benchmark.py
+
+"""
+Benchmarks the ST7735 solid color fills (ST7735.set_rectangle_color(), used by clear(), the Pot level
+and the VerticalBar) against the previous per-pixel SPI writes, using a fake spidev and RPi.GPIO that
+count the calls, so no display is needed.
+
+Usage (from the 'code' directory):
+
+    python3 lcd_fill_benchmark.py [--repeat N]
+
+For each fill the table shows the SPI transfers, GPIO writes and wall time per fill for the
+previous ('per-pixel') and current ('block') methods. The bytes sent to the display by the
+two methods are checked to be the same.
+"""
+
+import time
+import argparse
+
+import st7735_ijl20.st7735 as st7735
+from st7735_ijl20.st7735 import ST7735
+
+# Common fills: ( name, x, y, w, h )
+FILLS = [ ( "clear", 0, 0, st7735.LCD_X_MAXPIXEL, st7735.LCD_Y_MAXPIXEL ),
+          ( "vertical bar", 0, 0, 40, 128 ),
+          ( "pot level 5px", 9, 60, 41, 5 ),
+          ( "pot level 1px", 9, 60, 41, 1 ),
+          ( "pixel", 10, 10, 1, 1 )
+        ]
+
+# Counts the SPI transfers, and records the bytes sent as a list of [ dc, bytearray ]
+class FakeSpiDev(object):
+
+    def __init__(self, gpio):
+        self.gpio = gpio
+        self.calls = 0
+        self.stream = []
+
+    def record(self, data):
+        self.calls += 1
+        dc = self.gpio.pins.get(st7735.LCD_DC_PIN)
+        if len(self.stream) == 0 or self.stream[-1][0] != dc:
+            self.stream.append([ dc, bytearray() ])
+        self.stream[-1][1].extend(data)
+
+    def writebytes(self, data):
+        if len(data) > st7735.SPI_BLOCK_SIZE:
+            raise OverflowError("writebytes of {} bytes".format(len(data)))
+        self.record(data)
+
+    def writebytes2(self, data):
+        self.record(data)
+
+    def close(self):
+        pass
+
+class FakeGPIO(object):
+    HIGH = True
+    LOW = False
+    BCM = 11
+    OUT = 0
+
+    def __init__(self):
+        self.calls = 0
+        self.pins = {}
+
+    def setmode(self, mode):
+        pass
+
+    def setwarnings(self, flag):
+        pass
+
+    def setup(self, pin, mode):
+        pass
+
+    def output(self, pin, value):
+        self.calls += 1
+        self.pins[pin] = bool(value)
+
+# The ST7735 with the previous per-pixel fill and per-byte CASET, for comparison
+class LegacyST7735(ST7735):
+
+    def WriteData_NLen16Bit(self, Data, DataLen):
+        st7735.GPIO.output(self._dc, st7735.GPIO.HIGH)
+        for i in range(0, DataLen):
+            st7735.SPI.writebytes([Data >> 8])
+            st7735.SPI.writebytes([Data & 0xff])
+
+    def fill(self, color, count):
+        self.WriteData_NLen16Bit(color, count)
+
+    def set_window(self, x, y, w, h ):
+        x_end = x + w
+        y_end = y + h
+        self.send_command( st7735.ST7735_CASET )
+        self.send_byte( 0x00 )
+        self.send_byte( (x & 0xff) + self.LCD_X_Adjust)
+        self.send_byte( 0x00 )
+        self.send_byte( (( x_end - 1 ) & 0xff) + self.LCD_X_Adjust)
+        self.send_command( st7735.ST7735_RASET )
+        self.send_data([ 0x00, (y & 0xff) + self.LCD_Y_Adjust,
+                         0x00, ( (y_end - 1) & 0xff )+ self.LCD_Y_Adjust ])
+        self.send_command( st7735.ST7735_RAMWR )
+
+# Return ( spi calls, gpio calls, secs, stream ) per fill of 'lcd' repeated 'repeat' times
+def run_fill(lcd_class, x, y, w, h, repeat):
+    gpio = FakeGPIO()
+    spi = FakeSpiDev(gpio)
+    st7735.GPIO = gpio
+    st7735.SPI = spi
+
+    lcd = lcd_class()
+
+    t_start = time.perf_counter()
+    for i in range(repeat):
+        lcd.set_rectangle_color(x, y, w, h, st7735.ST7735_BLUE)
+    elapsed = time.perf_counter() - t_start
+
+    return spi.calls / repeat, gpio.calls / repeat, elapsed / repeat, spi.stream
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the ST7735 solid color fills with a fake spidev")
+    parser.add_argument("--repeat", type=int, default=20, help="fills of each size")
+    args = parser.parse_args()
+
+    st7735.SIMULATION_MODE = False
+
+    results = []
+    for name, x, y, w, h in FILLS:
+        legacy = run_fill(LegacyST7735, x, y, w, h, args.repeat)
+        block = run_fill(ST7735, x, y, w, h, args.repeat)
+
+        if legacy[3] != block[3]:
+            print("lcd_fill_benchmark ERROR {} fill sent different bytes".format(name))
+
+        results.append(( name, w * h, legacy, block ))
+
+    print("{: <14} {: >8} {: >14} {: >10} {: >10} {: >10} {: >10} {: >10}".format("fill", "pixels",
+                    "per-pixel spi", "gpio", "ms", "block spi", "gpio", "ms"))
+    for name, pixels, legacy, block in results:
+        print("{: <14} {: >8} {: >14.0f} {: >10.0f} {: >10.3f} {: >10.0f} {: >10.0f} {: >10.3f}".format(name, pixels,
+                    legacy[0], legacy[1], 1000 * legacy[2],
+                    block[0], block[1], 1000 * block[2]))
@@ -0,0 +1,127 @@
+# log_benchmark.py
+
+"""
+Measures the cpu time of the logging (see classes/log.py) while replaying a recorded day through a
+SensorHub, at a given LOG_LEVEL (default 2, as the nodes run).
+
+Usage (from the 'code' directory):
+
+    python3 log_benchmark.py [--config <settings overlay>] [--level N] [<day>]
+
+The <ts>,<weight> readings of <day> (a directory of csv files, as replay_archive.py, default
+../data/2019-12-18) are processed as by the LocalSensor loop of a single station (TimeBuffer.put() then
+SensorHub.process_reading()), with the SIMULATE_UPLINK link (which logs each event sent) and a SensorHub
+watchdog (COFFEE_STATUS) every WATCHDOG_PERIOD of the recorded time.
+
+The day is replayed twice:
+    print - the messages are printed (i.e. without LOG_FILE), to a temporary file rather than the console
+    file  - the messages go to the LogWriter ring buffer, written to a temporary LOG_FILE by its thread
+
+For each, the table gives the lines logged, the messages lost from a full ring buffer, and the cpu
+microseconds per reading of the thread running the readings (i.e. the event loop) and of the whole process
+(including the LogWriter thread).
+
+E.g.
+    python3 log_benchmark.py --level 2 ../data/2019-12-18
+    python3 log_benchmark.py --level 1 ../data/2019-11-22
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+import contextlib
+
+from classes.config import Config
+from classes.sensor_hub import SensorHub
+from classes.local_sensor import LocalSensor
+from classes.log import close_logs, WRITERS
+
+from replay_archive import find_days
+from station_benchmark import load_readings
+
+MODES = [ "print", "file" ]
+
+# Return ( loop thread cpu secs, process cpu secs, messages lost ) for the 'readings' processed by a single station
+async def run(settings, readings):
+    sensor_hub = SensorHub(settings=settings)
+    await sensor_hub.start(readings[0][0])
+
+    local_sensor = LocalSensor(settings=settings, sensor_id=settings["WEIGHT_SENSOR_ID"], sensor_hub=sensor_hub)
+    sensor_id = local_sensor.sensor_id
+    sample_buffer = local_sensor.sample_buffer
+
+    watchdog_period = settings["WATCHDOG_PERIOD"]
+    next_watchdog_ts = readings[0][0] + watchdog_period
+
+    t_thread = time.thread_time()
+    t_process = time.process_time()
+    for ts, value in readings:
+        sample_buffer.put(ts, value)
+        await sensor_hub.process_reading(ts, sensor_id)
+        if ts >= next_watchdog_ts:
+            await sensor_hub.watchdog()
+            next_watchdog_ts = ts + watchdog_period
+    thread_secs = time.thread_time() - t_thread
+
+    # the LogWriter's cpu time is included
+    lost = sum(writer.dropped for writer in WRITERS.values())
+    close_logs()
+    process_secs = time.process_time() - t_process
+
+    await sensor_hub.finish()
+
+    return thread_secs, process_secs, lost
+
+def count_lines(filename):
+    with open(filename) as f:
+        return sum(1 for line in f)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Measure the cpu time of the logging while replaying a day")
+    parser.add_argument("day", nargs="?", default="../data/2019-12-18", help="recorded day of readings")
+    parser.add_argument("--config", default=None, help="settings file to overlay on config/sensor_config.json")
+    parser.add_argument("--level", type=int, default=2, help="LOG_LEVEL")
+    args = parser.parse_args()
+
+    settings = Config(args.config).settings.replace(LOG_LEVEL=args.level,
+                                                    SIMULATE_UPLINK=True,
+                                                    SIMULATE_SENSORS=True,
+                                                    SIMULATE_DISPLAY=True,
+                                                    DISPLAY=False,
+                                                    VERSION="log_benchmark")
+
+    days = find_days([ args.day ])
+    readings = []
+    for day, filenames in sorted(days.items()):
+        for filename in sorted(filenames):
+            readings += load_readings(filename, settings, float("inf"))
+    if len(readings) < 2:
+        print("log_benchmark no readings in {}".format(args.day), file=sys.stderr)
+        sys.exit(1)
+
+    out = sys.stdout
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for mode in MODES:
+            print_filename = os.path.join(tmp_dir, mode + ".out")
+            log_filename = os.path.join(tmp_dir, mode + ".log")
+            mode_settings = settings.replace(LOG_FILE=log_filename) if mode == "file" else settings
+
+            with open(print_filename, "w") as log, contextlib.redirect_stdout(log):
+                thread_secs, process_secs, lost = asyncio.run(run(mode_settings, readings))
+
+            lines = count_lines(print_filename)
+            if os.path.exists(log_filename):
+                lines += count_lines(log_filename)
+            results.append(( mode, lines, lost, thread_secs, process_secs ))
+
+    print("{} readings, LOG_LEVEL {}".format(len(readings), args.level), file=out)
+    print("{: <8} {: >8} {: >8} {: >16} {: >16}".format("mode", "lines", "lost", "loop us/reading",
+                                                        "total us/reading"), file=out)
+    for mode, lines, lost, thread_secs, process_secs in results:
+        print("{: <8} {: >8} {: >8} {: >16.1f} {: >16.1f}".format(mode, lines, lost,
+                                                         1000000 * thread_secs / len(readings),
+                                                         1000000 * process_secs / len(readings)), file=out)
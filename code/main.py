@@ -4,12 +4,14 @@
 This is the startup program that launches the async SensorNode.
 """
 
+# startup_profile is imported first, to record the start time for settings["PROFILE_STARTUP"]
+from classes import startup_profile
+
 import sys
 import asyncio
 import signal
 
 from classes.config import Config
-from classes.sensor_node import SensorNode
 from classes.utils import list_to_string
 
 VERSION = "0.84"
@@ -34,7 +36,19 @@ if __name__ == '__main__':
 
     settings = config.settings
 
-    settings["VERSION"] = VERSION
+    settings = settings.replace(VERSION=VERSION)
+
+    profile_startup = "PROFILE_STARTUP" in settings and settings["PROFILE_STARTUP"]
+    if profile_startup:
+        startup_profile.mark("config loaded")
+        startup_profile.start()
+
+    # SensorNode is imported after the config is loaded, so that it (and SensorHub etc.) only
+    # import the modules needed for the configured features, e.g. no gmqtt with SIMULATE_UPLINK
+    from classes.sensor_node import SensorNode
+
+    if profile_startup:
+        startup_profile.mark("SensorNode imported")
 
     sensor_node = SensorNode(settings=settings, finish_event=FINISH_EVENT)
 
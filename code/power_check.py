@@ -0,0 +1,117 @@
+# power_check.py
+
+"""
+Checks the RemoteSensor power detectors (test_grind, test_brew and test_power in classes/events.py) with
+Tasmota messages at the rate the plugs send them, i.e. every TelePeriod (120 seconds) plus a message when the
+power changes by PowerDelta (see remote_sensors/tasmota/README.md).
+
+Usage (from the 'code' directory):
+
+    python3 power_check.py [--config <settings overlay>]
+
+Each sensor's messages (the tele/SENSOR "ENERGY" of a Tasmota plug) are put into a sample_buffer and
+power StatsBuffer as by RemoteSensor, and passed to Events.test():
+    grinder - idle at 2 W, a 20-second grind at 450 W (a single PowerDelta message) and back to 1 W
+    brewer  - idle at 0 W, a 6-minute brew at 2000 W (PowerDelta message, then the telemetry) and back to 0 W
+    fridge  - a "power" detector sensor, its compressor on at 80 W for 10 minutes
+
+The check fails (exit code 1) unless the grinder sends one COFFEE_GRINDING, the brewer a COFFEE_BREWING for
+each message of the brew, and the fridge one SENSOR_POWER_ON and one SENSOR_POWER_OFF. The classes' own
+logging is sent to /dev/null.
+"""
+
+import os
+import sys
+import argparse
+import contextlib
+
+from classes.config import Config
+from classes.events import Events, EventCode
+from classes.time_buffer import TimeBuffer, StatsBuffer
+from classes.remote_sensor import tasmota_power, POWER_HISTORY_SIZE
+
+T_START = 1600000000.0
+
+TELE_PERIOD = 120 # seconds, the Tasmota TelePeriod
+
+# sensor_id -> [ ( secs after T_START, power ) ] of the PowerDelta messages, the telemetry fills in the rest
+POWER_CHANGES = { "grinder": [ ( 1100, 450 ), ( 1120, 1 ) ],
+                  "brewer": [ ( 1500, 2000 ), ( 1860, 0 ) ],
+                  "fridge": [ ( 2000, 80 ), ( 2600, 3 ) ]
+                }
+
+IDLE_POWER = { "grinder": 2, "brewer": 0, "fridge": 3 }
+
+DURATION = 3600 # seconds of messages
+
+# sensor_id -> ( event code, number of events expected )
+EXPECTED = { "grinder": [ ( EventCode.GRINDING, 1 ) ],
+             "brewer": [ ( EventCode.BREWING, 4 ) ],
+             "fridge": [ ( EventCode.SENSOR_POWER_ON, 1 ), ( EventCode.SENSOR_POWER_OFF, 1 ) ]
+           }
+
+# Return the [ ( ts, message ) ] of the Tasmota plug 'sensor_id', in time order
+def tasmota_messages(sensor_id):
+    changes = POWER_CHANGES[sensor_id]
+
+    # the power at 't' secs after T_START
+    def power_at(t):
+        power = IDLE_POWER[sensor_id]
+        for change_t, change_power in changes:
+            if change_t <= t:
+                power = change_power
+        return power
+
+    times = sorted(set(list(range(0, DURATION, TELE_PERIOD)) + [ t for t, power in changes ]))
+
+    return [ ( T_START + t, { "ENERGY": { "Power": power_at(t) } } ) for t in times ]
+
+# Return the event codes from Events.test() for each of the messages of 'sensor_id'
+def replay(events, settings, sensor_id):
+    # the buffers of a RemoteSensor
+    stats_buffer = StatsBuffer(duration=None,
+                               settings=settings,
+                               value_fn=tasmota_power,
+                               value_buffer_size=POWER_HISTORY_SIZE)
+    sample_buffer = TimeBuffer(size=1000, settings=settings, stats_buffer=stats_buffer)
+    events.sensor_buffers[sensor_id] = { "sample_buffer": sample_buffer, "stats_buffer": stats_buffer }
+
+    codes = []
+    for ts, message in tasmota_messages(sensor_id):
+        sample_buffer.put(ts, message)
+        codes += [ event["event_code"] for event in events.test(ts, sensor_id) ]
+    return codes
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Check the power detectors with Tasmota message timing")
+    parser.add_argument("--config", default=None, help="settings file to overlay on config/sensor_config.json")
+    args = parser.parse_args()
+
+    settings = Config(args.config).settings.replace(LOG_LEVEL=3,
+                                                    SENSORS=[ { "sensor_id": "grinder", "type": "remote",
+                                                                "detectors": [ "grind" ] },
+                                                              { "sensor_id": "brewer", "type": "remote",
+                                                                "detectors": [ "brew" ] },
+                                                              { "sensor_id": "fridge", "type": "remote",
+                                                                "detectors": [ "power" ] }
+                                                            ])
+
+    out = sys.stdout
+    failed = False
+    with open(os.devnull, "w") as log, contextlib.redirect_stdout(log):
+        events = Events(settings=settings)
+
+    for sensor_id, expected in EXPECTED.items():
+        with open(os.devnull, "w") as log, contextlib.redirect_stdout(log):
+            codes = replay(events, settings, sensor_id)
+
+        for event_code, count in expected:
+            print("{} {} {} (expected {})".format(sensor_id, event_code, codes.count(event_code), count), file=out)
+            if codes.count(event_code) != count:
+                print("power_check FAILED: {} sent {} {}".format(sensor_id, codes.count(event_code), event_code), file=out)
+                failed = True
+
+    if failed:
+        sys.exit(1)
+
+    print("power_check passed", file=out)
@@ -0,0 +1,115 @@
+# replay_archive.py
+
+"""
+Replays recorded weight data through the Events detector, one process per recorded day.
+
+Usage (from the 'code' directory):
+
+    python3 replay_archive.py [--config <settings overlay>] [--workers N] [--events <output.csv>] <day> [<day> ...]
+
+Each <day> is either a directory of <ts>,<weight> CSV files (e.g. ../data/2019-11-22) or a single
+CSV file. Each day is replayed with its own TimeBuffer / StatsBuffer / Events state, with the days
+shared across a ProcessPoolExecutor.
+
+The merged event table is written as CSV (day,ts,event_code,weight,weight_poured,weight_new) to
+stdout or the --events file, followed by a per-day summary of NEW/POURED/EMPTY counts and the
+time of each new pot.
+
+E.g.
+    python3 replay_archive.py ../data/2019-* ../data/2020-*
+"""
+
+import sys
+import os
+import glob
+import time
+import argparse
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+from classes.config import Config
+from classes.replay import replay_day, summarize
+
+# Build the { day: [ filenames ] } dictionary from the command-line paths
+def find_days(paths):
+    days = {}
+    for path in paths:
+        if os.path.isdir(path):
+            filenames = sorted(glob.glob(os.path.join(path, "*.csv")))
+            if len(filenames) > 0:
+                days[os.path.basename(os.path.normpath(path))] = filenames
+        elif os.path.isfile(path) and path.endswith(".csv"):
+            days[os.path.basename(path)] = [ path ]
+        else:
+            print("replay_archive skipping {}, not a directory or CSV file".format(path), file=sys.stderr)
+    return days
+
+def ts_to_str(ts, format_string="%Y-%m-%d %H:%M:%S"):
+    if ts is None:
+        return ""
+    return datetime.utcfromtimestamp(ts).strftime(format_string)
+
+def write_events(fp, results):
+    fp.write("day,ts,event_code,weight,weight_poured,weight_new\n")
+    for result in results:
+        for event in result["events"]:
+            fp.write("{},{:.3f},{},{},{},{}\n".format(result["day"],
+                                                     event["ts"],
+                                                     event["event_code"],
+                                                     event.get("weight",""),
+                                                     event.get("weight_poured",""),
+                                                     event.get("weight_new","")))
+
+def print_summary(results, elapsed):
+    print("{: <28} {: >8} {: >4} {: >6} {: >5} {: >7}  {}".format("day", "samples", "NEW", "POURED",
+                                                                 "EMPTY", "cpu", "new pot times (UTC)"),
+          file=sys.stderr)
+    total_samples = 0
+    for result in results:
+        summary = summarize(result)
+        total_samples += summary["samples"]
+        new_times = " ".join([ ts_to_str(ts, "%H:%M") for ts in summary["new_times"] ])
+        print("{: <28} {: >8} {: >4} {: >6} {: >5} {: >7.1f}  {}".format(summary["day"],
+                                                                        summary["samples"],
+                                                                        summary["NEW"],
+                                                                        summary["POURED"],
+                                                                        summary["EMPTY"],
+                                                                        summary["process_time"],
+                                                                        new_times),
+              file=sys.stderr)
+
+    print("replay_archive replayed {} samples from {} days in {:.1f} seconds".format(total_samples,
+                                                                                    len(results),
+                                                                                    elapsed),
+          file=sys.stderr)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Replay recorded days through the Events detector")
+    parser.add_argument("paths", nargs="+", help="day directories or CSV files of <ts>,<weight> readings")
+    parser.add_argument("--config", default=None, help="settings file to overlay on config/sensor_config.json")
+    parser.add_argument("--workers", type=int, default=None, help="number of processes (default: cpu count)")
+    parser.add_argument("--events", default=None, help="write the event table to this file (default: stdout)")
+    args = parser.parse_args()
+
+    settings = Config(args.config).settings
+
+    # Only warnings from the detector, we're replaying a lot of data
+    settings = settings.replace(LOG_LEVEL=3)
+
+    days = find_days(args.paths)
+
+    t_start = time.time()
+
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = [ executor.submit(replay_day, day, filenames, settings) for day, filenames in days.items() ]
+        results = [ future.result() for future in futures ]
+
+    results.sort(key=lambda result: (result["begin_ts"] is None, result["begin_ts"]))
+
+    if args.events is None:
+        write_events(sys.stdout, results)
+    else:
+        with open(args.events, "w") as fp:
+            write_events(fp, results)
+
+    print_summary(results, time.time() - t_start)
@@ -0,0 +1,44 @@
+# run_broker.py
+
+"""
+Runs a LocalBroker (see classes/local_broker.py), e.g. for testing a SensorNode without an MQTT server.
+
+Usage (from the 'code' directory):
+
+    python3 run_broker.py [--host HOST] [--port PORT] [--unix PATH]
+
+Accepts MQTT clients on HOST:PORT (default 127.0.0.1:1883) and, with --unix, LinkUnix clients on the Unix
+socket PATH. E.g. to run a SensorNode with the Unix socket uplink:
+
+    python3 run_broker.py --unix /tmp/coffee_pot.sock
+
+with settings "UPLINK": "unix", "PLATFORM_HOST": "/tmp/coffee_pot.sock". Stop with Ctrl-C.
+"""
+
+import asyncio
+import argparse
+
+from classes.local_broker import get_broker
+
+async def run(args):
+    broker = get_broker(args.host)
+    await broker.start_mqtt(args.host, args.port)
+    if not args.unix is None:
+        await broker.start_unix(args.unix)
+    try:
+        while True:
+            await asyncio.sleep(3600)
+    finally:
+        await broker.finish()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run a LocalBroker for MQTT and Unix socket clients")
+    parser.add_argument("--host", default="127.0.0.1", help="MQTT host address to listen on")
+    parser.add_argument("--port", type=int, default=1883, help="MQTT port")
+    parser.add_argument("--unix", default=None, help="Unix socket path for LinkUnix clients")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(run(args))
+    except KeyboardInterrupt:
+        pass
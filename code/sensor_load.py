@@ -0,0 +1,181 @@
+# sensor_load.py
+
+"""
+Load test of the SensorHub with many RemoteSensors, to check the hub keeps up with the
+messages from a registry of extra sensors (see classes/sensor_registry.py).
+
+Usage (from the 'code' directory):
+
+    python3 sensor_load.py [--config <settings overlay>] [--sensors N] [--rate HZ] [--duration SECS]
+
+Runs a SensorNode's SensorHub, SensorSubscriber and weight LocalSensor (using the WeightSimulator)
+with N (default 50) extra remote sensors, each with the "power" and "status" detectors, plus the
+usual grinder and brew machine. A generated message stream replaces the MQTT link, with each sensor
+sending a Tasmota "tele/SENSOR" message at --rate (default 1 Hz), spread evenly, and its power
+switching on and off every 30 seconds.
+
+Reports the messages processed, the latency from the scheduled send time to the end of
+processing, the maximum backlog in the subscriber queue, the cpu time per message, and the
+events sent to the (simulated) uplink. The hub keeps up if the backlog stays small and
+the latency stays below the message interval.
+"""
+
+import sys
+import time
+import asyncio
+import argparse
+
+from classes.config import Config
+from classes.sensor_hub import SensorHub
+from classes.sensor_subscriber import SensorSubscriber
+from classes.remote_sensor import RemoteSensor
+from classes.local_sensor import LocalSensor
+from classes.weight_simulator import WeightSimulator
+from classes.sensor_registry import load_sensor_registry, WEIGHT_DETECTORS
+from classes.uplink import Uplink
+
+POWER_CYCLE_SECONDS = 30 # each sensor's power is on, then off, for this long
+
+# A link for the SensorSubscriber generating the messages for 'sensor_ids' at 'rate' Hz each
+class LoadLink(Uplink):
+
+    def __init__(self, sensor_ids, rate):
+        super().__init__()
+        self.sensor_ids = sensor_ids
+        self.rate = rate
+        self.queue = asyncio.Queue()
+        self.max_backlog = 0
+        self.sent = 0
+        self.quit = False
+
+    async def start(self, server_settings):
+        pass
+
+    async def subscribe(self, subscribe_settings):
+        self.task = asyncio.ensure_future(self.send_messages())
+
+    async def get(self):
+        self.max_backlog = max(self.max_backlog, self.queue.qsize())
+        return await self.queue.get()
+
+    def stop_get(self):
+        self.queue.put_nowait(None)
+
+    async def finish(self):
+        self.quit = True
+
+    # Put the messages in the queue at their scheduled times, i.e. each sensor in turn
+    async def send_messages(self):
+        interval = 1 / self.rate / len(self.sensor_ids)
+        t_start = time.monotonic()
+        count = 0
+        while not self.quit:
+            scheduled = t_start + count * interval
+            delay = scheduled - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            index = count % len(self.sensor_ids)
+            sensor_id = self.sensor_ids[index]
+            on = int((scheduled - t_start) / POWER_CYCLE_SECONDS + index / len(self.sensor_ids)) % 2 == 1
+            self.queue.put_nowait({ "ENERGY": { "Power": 120 if on else 1, "Voltage": 240, "Current": 0.5 if on else 0 },
+                                    "topic": "csn/"+sensor_id+"/tele/SENSOR",
+                                    "scheduled": scheduled })
+            self.sent += 1
+            count += 1
+
+# Return async handler calling 'handler', recording the latency of each message in 'latencies'
+def timed_handler(handler, latencies):
+    async def timed(message):
+        await handler(message)
+        latencies.append(time.monotonic() - message["scheduled"])
+    return timed
+
+async def run(settings, sensor_count, rate, duration):
+    load_ids = [ "load-{:02d}".format(i) for i in range(sensor_count) ]
+
+    sensors = [ { "sensor_id": settings["WEIGHT_SENSOR_ID"], "type": "weight", "detectors": WEIGHT_DETECTORS },
+                { "sensor_id": settings["GRIND_SENSOR_ID"], "type": "remote", "detectors": [ "grind" ] },
+                { "sensor_id": settings["BREW_SENSOR_ID"], "type": "remote", "detectors": [ "brew" ] }
+              ] + [ { "sensor_id": sensor_id, "type": "remote", "detectors": [ "power", "status" ],
+                      "params": { "power_threshold": 50 } } for sensor_id in load_ids ]
+    settings = settings.replace(SENSORS=sensors)
+
+    sensor_hub = SensorHub(settings=settings)
+    await sensor_hub.start(time.time())
+
+    # Count the events sent to the platform, rather than printing them
+    sent_events = {}
+    async def count_put(sensor_id, event):
+        sent_events[event["event_code"]] = sent_events.get(event["event_code"], 0) + 1
+    sensor_hub.uplink.put = count_put
+
+    sensor_subscriber = SensorSubscriber(settings=settings)
+    load_link = LoadLink(load_ids, rate)
+    sensor_subscriber.sensor_link = load_link
+
+    remote_sensors = [ RemoteSensor(settings=settings, sensor_id=sensor["sensor_id"],
+                                    sensor_hub=sensor_hub, sensor_subscriber=sensor_subscriber)
+                       for sensor in load_sensor_registry(settings) if sensor["type"] == "remote" ]
+
+    local_sensor = LocalSensor(settings=settings, sensor_id=settings["WEIGHT_SENSOR_ID"],
+                               sensor=WeightSimulator(settings=settings), sensor_hub=sensor_hub)
+
+    latencies = []
+    for topic, handler in sensor_subscriber.handlers.items():
+        sensor_subscriber.handlers[topic] = timed_handler(handler, latencies)
+
+    async def stop():
+        await asyncio.sleep(duration)
+        for remote_sensor in remote_sensors:
+            await remote_sensor.finish()
+        await sensor_subscriber.finish()
+        await local_sensor.finish()
+
+    t_start = time.process_time()
+    await asyncio.gather(sensor_subscriber.start(), local_sensor.start(), stop())
+    process_time = time.process_time() - t_start
+
+    return latencies, load_link, process_time, sent_events
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Load test the SensorHub with many remote sensors")
+    parser.add_argument("--config", default=None, help="settings file to overlay on config/sensor_config.json")
+    parser.add_argument("--sensors", type=int, default=50, help="number of extra remote sensors")
+    parser.add_argument("--rate", type=float, default=1, help="messages per second from each sensor")
+    parser.add_argument("--duration", type=float, default=60, help="seconds to run")
+    args = parser.parse_args()
+
+    settings = Config(args.config).settings
+    settings = settings.replace(LOG_LEVEL=3,
+                                SIMULATE_UPLINK=True,
+                                SIMULATE_WEIGHT=True,
+                                SIMULATE_DISPLAY=True,
+                                DISPLAY=False)
+
+    latencies, load_link, process_time, sent_events = asyncio.run(run(settings, args.sensors, args.rate, args.duration))
+
+    latencies.sort()
+    count = len(latencies)
+    if count == 0:
+        print("sensor_load no messages processed", file=sys.stderr)
+        sys.exit(1)
+
+    interval = 1 / args.rate
+    p99 = latencies[int(count * 0.99)]
+
+    print("sensor_load {} sensors at {} Hz for {:.0f} secs".format(args.sensors, args.rate, args.duration))
+    print("messages sent {} processed {} ({:.1f}/sec)".format(load_link.sent, count, count / args.duration))
+    print("latency ms mean {:.2f} p99 {:.2f} max {:.2f}".format(1000 * sum(latencies) / count,
+                                                                1000 * p99,
+                                                                1000 * latencies[-1]))
+    print("max backlog {} messages".format(load_link.max_backlog))
+    print("cpu {:.1f}% of elapsed, {:.0f} us per message (including the weight sensor)".format(100 * process_time / args.duration,
+                                                                                             1e6 * process_time / count))
+    print("events sent {}".format(", ".join([ "{} {}".format(code, n) for code, n in sorted(sent_events.items()) ])))
+
+    if p99 < interval and load_link.max_backlog < args.sensors:
+        print("sensor_load OK, the hub keeps up")
+    else:
+        print("sensor_load FAILED, the hub is falling behind")
+        sys.exit(1)
@@ -0,0 +1,146 @@
+# sensor_receive_benchmark.py
+
+"""
+Measures the cpu time and latency of receiving the remote sensors' Tasmota messages over MQTT, from the
+LinkGMQTT on_message callback to the RemoteSensor handler, comparing the receive paths of the
+SensorSubscriber (classes/sensor_subscriber.py).
+
+Usage (from the 'code' directory):
+
+    python3 sensor_receive_benchmark.py [--rate HZ] [--seconds SECS] [--sensors N] [--unrouted FRACTION]
+
+A LocalBroker (classes/local_broker.py) in the same process publishes "tele/SENSOR" messages at --rate
+(default 1000) per second for --seconds (default 5), in batches every 5 ms, spread over --sensors (default
+4) registered sensors plus a --unrouted fraction (default 0.25) for Tasmota devices without a handler. A
+SensorSubscriber with the gmqtt link receives them over MQTT (TCP on 127.0.0.1), with handlers that only
+record the latency.
+
+The paths compared are:
+    before  - the get() message loop, with per-message logging (LOG_LEVEL 1) and simplejson
+    get     - the get() message loop at LOG_LEVEL 2, with orjson if it is installed
+    receive - the link calls SensorSubscriber.receive(), which routes each message before parsing it
+
+The cpu time (of the whole process, including the broker) is per message published. The logging is sent to
+/dev/null.
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+import contextlib
+
+import classes.uplink as uplink
+from classes.sensor_subscriber import SensorSubscriber
+from classes.local_broker import get_broker
+
+MODES = [ "before", "get", "receive" ]
+
+TICK = 0.005 # secs between the batches of messages published
+
+# A Tasmota "tele/SENSOR" message, with "seq" added to time it
+PAYLOAD = ( '{{"Time":"2020-01-30T02:12:47","ENERGY":{{"TotalStartTime":"2019-12-28T13:42:45","Total":2.489,'
+            '"Yesterday":0.877,"Today":0.003,"Period":0,"Power":{},"ApparentPower":9,"ReactivePower":9,'
+            '"Factor":0.18,"Voltage":246,"Current":0.035}},"seq":{}}}' )
+
+def topic(sensor_id):
+    return "csn/"+sensor_id+"/tele/SENSOR"
+
+# Return ( cpu secs, sorted latencies, messages published, routed messages ) for the SensorSubscriber 'mode'
+async def run(mode, broker, args, orjson):
+    settings = { "LOG_LEVEL": 1 if mode == "before" else 2,
+                 "SENSOR_LINK": "gmqtt",
+                 "SENSOR_HOST": "127.0.0.1",
+                 "SENSOR_PORT": broker.mqtt_port,
+                 "SENSOR_USER": "bench",
+                 "SENSOR_PASSWORD": "bench"
+               }
+    uplink.orjson = None if mode == "before" else orjson
+
+    sensor_ids = [ "bench-{:02d}".format(i) for i in range(args.sensors) ]
+    unrouted_ids = [ "other-{:02d}".format(i) for i in range(args.sensors) ]
+
+    subscriber = SensorSubscriber(settings=settings)
+    if mode != "receive":
+        subscriber.sensor_link.set_receiver = lambda receiver: False
+
+    sent = []
+    latencies = []
+    async def handler(message):
+        latencies.append(time.perf_counter() - sent[message["seq"]])
+    for sensor_id in sensor_ids:
+        subscriber.add_handler(topic(sensor_id), handler)
+
+    subscriber_task = asyncio.ensure_future(subscriber.start())
+    await asyncio.sleep(0.5) # let the subscription reach the broker
+
+    count = int(args.rate * args.seconds)
+    routed = 0
+    t_cpu = time.process_time()
+    t_start = time.perf_counter()
+    # publish the messages due every TICK secs
+    i = 0
+    while i < count:
+        due = min(count, int((time.perf_counter() - t_start) * args.rate) + 1)
+        while i < due:
+            if (i * args.unrouted) % 1 < args.unrouted:
+                sensor_id = unrouted_ids[i % len(unrouted_ids)]
+            else:
+                sensor_id = sensor_ids[i % len(sensor_ids)]
+                routed += 1
+            sent.append(time.perf_counter())
+            broker.publish(topic(sensor_id), PAYLOAD.format(i % 100, i).encode('utf-8'))
+            i += 1
+        await asyncio.sleep(TICK)
+
+    # wait for the last messages
+    t_end = time.perf_counter() + 5
+    while len(latencies) < routed and time.perf_counter() < t_end:
+        await asyncio.sleep(0.01)
+    cpu = time.process_time() - t_cpu
+
+    await subscriber.finish()
+    await subscriber_task
+
+    return cpu, sorted(latencies), count, routed
+
+async def main(args, out):
+    try:
+        import orjson
+    except ImportError:
+        orjson = None
+        print("orjson not installed, 'get' and 'receive' use simplejson", file=out)
+
+    broker = get_broker("bench")
+    await broker.start_mqtt("127.0.0.1", 0)
+
+    results = []
+    for mode in args.modes.split(","):
+        results.append(( mode, await run(mode, broker, args, orjson) ))
+
+    await broker.finish()
+
+    print("{} messages/sec for {} secs, {} sensors, {:.0%} unrouted".format(args.rate, args.seconds, args.sensors,
+                                                                            args.unrouted), file=out)
+    print("{: <8} {: >8} {: >8} {: >12} {: >10} {: >10}".format("path", "sent", "received", "cpu us/msg",
+                                                               "mean ms", "p99 ms"), file=out)
+    for mode, (cpu, latencies, count, routed) in results:
+        received = len(latencies)
+        print("{: <8} {: >8} {: >8} {: >12.1f} {: >10.2f} {: >10.2f}".format(mode, count, received,
+                    1000000 * cpu / count,
+                    1000 * sum(latencies) / max(1, received),
+                    1000 * latencies[min(received - 1, int(received * 0.99))] if received > 0 else 0), file=out)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Measure the SensorSubscriber MQTT receive path")
+    parser.add_argument("--rate", type=float, default=1000, help="messages published per second")
+    parser.add_argument("--seconds", type=float, default=5, help="secs of publishing")
+    parser.add_argument("--sensors", type=int, default=4, help="number of registered sensors")
+    parser.add_argument("--unrouted", type=float, default=0.25, help="fraction of messages with no handler")
+    parser.add_argument("--modes", default=",".join(MODES), help="receive paths to compare")
+    args = parser.parse_args()
+
+    out = sys.stdout
+    with open(os.devnull, "w") as log, contextlib.redirect_stdout(log):
+        asyncio.run(main(args, out))
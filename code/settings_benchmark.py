@@ -0,0 +1,144 @@
+# settings_benchmark.py
+
+"""
+Measures the per-sample overhead of reading the settings (see Settings in classes/config.py) in the sensor
+loop, i.e. the settings lookups made for each weight reading and the cpu time per reading.
+
+Usage (from the 'code' directory):
+
+    python3 settings_benchmark.py [--config <settings overlay>] [--seconds SECS] <csv file>
+
+First the cost of a single read of LOG_LEVEL is timed, as a dict lookup, a Settings lookup and attribute,
+and an attribute of the reading object (as the classes now keep their hot-path settings).
+
+Then the recorded <ts>,<weight> readings of <csv file> (up to --seconds of them, default 1800) are
+processed as by the LocalSensor loop of a single station (TimeBuffer.put() then SensorHub.process_reading(),
+as station_benchmark.py) and by a Replay (classes/replay.py, the Events detector alone), with settings that
+count their lookups (settings["X"], "X" in settings and settings.get("X")). The table shows the lookups and
+the cpu microseconds per reading.
+
+E.g.
+    python3 settings_benchmark.py ../data/2019-12-18/save_1576677425.258.csv
+"""
+
+import os
+import sys
+import time
+import timeit
+import asyncio
+import argparse
+import contextlib
+
+from classes.config import Config
+from classes.sensor_hub import SensorHub
+from classes.local_sensor import LocalSensor
+from classes.replay import Replay
+
+from station_benchmark import load_readings
+
+TIMEIT_NUMBER = 1000000
+
+# Settings that count the lookups made
+class CountingSettings(dict):
+
+    def __init__(self, settings):
+        super().__init__(settings)
+        self.lookups = 0
+
+    def __getitem__(self, key):
+        self.lookups += 1
+        return super().__getitem__(key)
+
+    def __contains__(self, key):
+        self.lookups += 1
+        return super().__contains__(key)
+
+    def get(self, key, default=None):
+        self.lookups += 1
+        return super().get(key, default)
+
+# A reading object keeping its hot-path setting as an attribute
+class Reader(object):
+
+    def __init__(self, settings):
+        self.settings = settings
+        self.log_level = settings["LOG_LEVEL"]
+
+# Print the time of one read of LOG_LEVEL for each way of reading it
+def time_lookups(settings, out):
+    tests = [ ( "dict lookup", 'reader.settings["LOG_LEVEL"] == 1', Reader(dict(settings)) ),
+              ( "Settings lookup", 'reader.settings["LOG_LEVEL"] == 1', Reader(settings) ),
+              ( "Settings attribute", 'reader.settings.log_level == 1', Reader(settings) ),
+              ( "reader attribute", 'reader.log_level == 1', Reader(settings) )
+            ]
+    print("{: <20} {: >8}".format("LOG_LEVEL read", "ns"), file=out)
+    for name, statement, reader in tests:
+        secs = min(timeit.repeat(statement, globals={ "reader": reader }, number=TIMEIT_NUMBER, repeat=3))
+        print("{: <20} {: >8.1f}".format(name, 1000000000 * secs / TIMEIT_NUMBER), file=out)
+
+# Return ( lookups, cpu secs ) for the 'readings' processed by a single station's LocalSensor loop
+async def run_station(settings, readings):
+    settings = CountingSettings(settings)
+
+    sensor_hub = SensorHub(settings=settings)
+    async def count_put(sensor_id, event):
+        pass
+    sensor_hub.uplink.put = count_put
+
+    local_sensor = LocalSensor(settings=settings, sensor_id=settings["WEIGHT_SENSOR_ID"], sensor_hub=sensor_hub)
+    sensor_id = local_sensor.sensor_id
+    sample_buffer = local_sensor.sample_buffer
+
+    settings.lookups = 0
+    t_start = time.process_time()
+    for ts, value in readings:
+        sample_buffer.put(ts, value)
+        await sensor_hub.process_reading(ts, sensor_id)
+
+    return settings.lookups, time.process_time() - t_start
+
+# Return ( lookups, cpu secs ) for the 'readings' played through a Replay
+def run_replay(settings, readings):
+    settings = CountingSettings(settings)
+
+    replay = Replay("benchmark", settings)
+
+    settings.lookups = 0
+    t_start = time.process_time()
+    for ts, value in readings:
+        replay.process_sample(ts, value)
+
+    return settings.lookups, time.process_time() - t_start
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Measure the per-sample overhead of reading the settings")
+    parser.add_argument("filename", help="CSV file of <ts>,<weight> readings")
+    parser.add_argument("--config", default=None, help="settings file to overlay on config/sensor_config.json")
+    parser.add_argument("--seconds", type=float, default=1800, help="seconds of readings to process")
+    args = parser.parse_args()
+
+    settings = Config(args.config).settings.replace(LOG_LEVEL=3,
+                                                    SIMULATE_UPLINK=True,
+                                                    SIMULATE_SENSORS=True,
+                                                    SIMULATE_DISPLAY=True,
+                                                    DISPLAY=False)
+
+    readings = load_readings(args.filename, settings, args.seconds)
+    if len(readings) < 2:
+        print("settings_benchmark no readings in {}".format(args.filename), file=sys.stderr)
+        sys.exit(1)
+
+    out = sys.stdout
+    time_lookups(settings, out)
+
+    # the classes' logging is sent to /dev/null
+    with open(os.devnull, "w") as log, contextlib.redirect_stdout(log):
+        results = [ ( "station", *asyncio.run(run_station(settings, readings)) ),
+                    ( "replay", *run_replay(settings, readings) )
+                  ]
+
+    print("{} readings".format(len(readings)), file=out)
+    print("{: <10} {: >16} {: >12}".format("path", "lookups/reading", "us/reading"), file=out)
+    for name, lookups, process_time in results:
+        print("{: <10} {: >16.1f} {: >12.1f}".format(name, lookups / len(readings),
+                                                     1000000 * process_time / len(readings)), file=out)
@@ -8,11 +8,24 @@ with samples or time on the x-axis.
 
 Is designed to be efficient when adding one point at a time by updating the minimum screen area.
 
+The chart keeps a NumPy RGB565 'ring' image of the whole chart area (self.image, h rows x w columns of
+big-endian 16-bit pixels, as sent to the LCD). A new column (and the cursor to its right) is written into
+the image by slicing, and only the changed columns are sent to the LCD, as one contiguous bytes buffer
+for a single window. When add_time() steps along from the previous point the cleared gap, the new column
+and the cursor are sent together.
+
+With "scroll": True in the settings the chart uses the ST7735 hardware scroll instead (see
+ST7735.set_scroll_area()). self.image is then a ring of columns in the LCD frame memory, each new value
+writes just its column (and any blank gap since the previous value) and the band is scrolled so the newest
+column is at the right. The controller scrolls whole display columns, so a scrolling chart must be the
+full height of the display.
+
 Note that variables (x,y) generally refer to DISPLAY AREA coordinates (i.e. within 160x128)
 while variables (bx,by) refer to coordinates within the CHART AREA.
 """
 
 import math
+import numpy as np
 
 # Default settings for Bar object
 DEFAULT_CHART = { "x": 0, "y": 0, "w": 160, "h": 40, # 'pixels' top-left coords and width, height.
@@ -21,11 +34,16 @@ DEFAULT_CHART = { "x": 0, "y": 0, "w": 160, "h": 40, # 'pixels' top-left coords
                 "bar_width": 1,        # 'pixels', width of value column
                 "point_height": None,  # 'pixels', will display point of this height, not column to x-axis
                 "cursor_width": 2,     # 'pixels', width of scrolling cursor
+                "scroll": False,       # use the ST7735 hardware scroll, chart must be full display height
                 "fg_color": [ 0xFF, 0xE0 ],    # yellow 565 RGB
                 "bg_color": [ 0x00, 0x1F ],    # blue 565 RGB
                 "cursor_color": [ 0x00, 0x00 ] # black 565 RGB
               }
 
+# Convert a [ MSB, LSB ] 565 RGB color byte pair from the settings to a 16-bit value
+def color_value(color_bytes):
+    return (color_bytes[0] << 8) | color_bytes[1]
+
 # Draw a bar chart across the LCD
 # For each value will draw a vertical bar plus a blank vertical margin to the right of it, as the
 # use-case is expected to be a horizontal scroll of new bars.
@@ -41,60 +59,72 @@ class Chart(object):
         else:
             self.settings = settings
 
+        self.bg = color_value(self.settings["bg_color"])
+        self.fg = color_value(self.settings["fg_color"])
+        self.cursor = color_value(self.settings["cursor_color"])
+
+        # The RGB565 image of the chart area, rows top-to-bottom, in the byte order sent to the LCD
+        self.image = np.full((self.settings["h"], self.settings["w"]), self.bg, dtype='>u2')
+
         self.prev_time = None # will hold timestamp of previous add_time() value
         self.prev_bx = None    # will hold x offset (pixels) for previous add_time() value
 
         # Initial x offset for next() column
         self.next_bx = 0
 
-    # Build a list of RGB 565 color byte pairs designed to fill an area of the chart
-    # e.g with width = 12, height = 7, bar_width = 2, cursor_width = 3, point_height = 2, by (value) = 4
-    # if b = bg_color, F = fg_color and C = cursor_color, each pixel as *pair* of bytes
-    # b b b b b b b b b b C C C
-    # b b b b b b b b b b C C C
-    # b b b b b b b b b b C C C
-    # b b b b b b b b F F C C C
-    # b b b b b b b b F F C C C
-    # b b b b b b b b b b C C C
-    # b b b b b b b b b b C C C
-    # Entire array is returned as list of bytes, left-to-right, top-to-bottom.
-    def make_area(self, width, height, by):
-        # convenient short names
-        bg = self.settings["bg_color"]
-        fg = self.settings["fg_color"]
+        # Hardware scroll mode, where self.scroll_bx is the ring column for the next value
+        self.scroll = "scroll" in self.settings and self.settings["scroll"]
+        if self.scroll:
+            if self.settings["y"] != 0 or self.settings["h"] != lcd.height:
+                raise ValueError("Chart scroll needs the full display height, not y={} h={}".format(
+                                    self.settings["y"], self.settings["h"]))
+            self.scroll_bx = 0
+            self.lcd.set_scroll_area(self.settings["x"], self.settings["w"])
+
+    # Send chart columns cx..cx+cw of self.image to the LCD as a single window
+    def send(self, cx, cw):
+        if cw <= 0:
+            return
+        self.lcd.set_window( self.settings["x"] + cx, self.settings["y"], cw, self.settings["h"] )
+        # the column slice is copied to one contiguous buffer (row by row, as the LCD fills the window)
+        self.lcd.send_data(self.image[:, cx:cx+cw].tobytes())
+
+    # Fill chart columns cx..cx+cw of self.image with bg_color, clipped to the chart width,
+    # returning the clipped ( cx, cw )
+    def clear_area(self, cx, cw):
+        cw = min(cw, self.settings["w"] - cx)
+        if cw > 0:
+            self.image[:, cx:cx+cw] = self.bg
+        return cx, cw
+
+    # Write the column (or point) for value 'by' at 'bx', and the cursor to its right, into self.image.
+    # e.g with height = 7, bar_width = 2, cursor_width = 3, point_height = 2, by (value) = 4
+    # if b = bg_color, F = fg_color and C = cursor_color, the columns bx..bx+5 are
+    # b b C C C
+    # b b C C C
+    # b b C C C
+    # F F C C C
+    # F F C C C
+    # b b C C C
+    # b b C C C
+    def draw_column(self, bx, by):
+        h = self.settings["h"]
         bar_width = self.settings["bar_width"]
         cursor_width = self.settings["cursor_width"]
 
-        # make short horizontal stripe of bytes for cursor
-        cursor_bytes = self.settings["cursor_color"] * cursor_width
-
-        # make horizontal stripe for 'blank' rows (i.e. above column or below point)
-        # i.e. background bytes followed by cursor bytes.
-        blank_bytes = bg * (width - cursor_width)
-        blank_bytes.extend(cursor_bytes)
-
-        # make horizontal stripe of color bytes for column or point
-        # i.e. background bytes followed by foreground bytes followed by cursor bytes.
-        bar_bytes = bg * (width - bar_width - cursor_width)
-        bar_bytes.extend(fg * bar_width)
-        bar_bytes.extend(cursor_bytes)
-
-        # iterate rows of area from top to bottom,
-        # appending appropriate list of pixels for each row
-        pixelbytes = []
-        for row in range(height):
-            if height - row > by:
-                pixelbytes.extend(blank_bytes)
-            elif self.settings["point_height"] is None:
-                pixelbytes.extend(bar_bytes)
-            else:
-                if height - row > by - self.settings["point_height"]:
-                    pixelbytes.extend(bar_bytes)
-                else:
-                    pixelbytes.extend(blank_bytes)
+        # rows (from the top) of the column: from the value down to the x-axis or point_height below it
+        top = max(h - by, 0)
+        if self.settings["point_height"] is None:
+            bottom = h
+        else:
+            bottom = min(max(h - by + self.settings["point_height"], 0), h)
 
-        return pixelbytes
+        column = self.image[:, bx:bx+bar_width]
+        column[:top] = self.bg
+        column[top:bottom] = self.fg
+        column[bottom:] = self.bg
 
+        self.image[:, bx+bar_width:bx+bar_width+cursor_width] = self.cursor
 
     # Clear the chart from bx to bx+w with bg_color
     # Defaults to clearing whole chart area
@@ -102,13 +132,7 @@ class Chart(object):
         if cw is None:
             cw = self.settings["w"]
 
-        # Convert chart bx coordinate to screen x coordinate:
-        x = self.settings["x"] + cx
-
-        # Build list of required number of bytes (2 bytes = 1 pixel in 565 RGB)
-        pixelbytes = self.settings["bg_color"] * cw * self.settings["h"]
-        self.lcd.set_window( x, self.settings["y"], cw, self.settings["h"] )
-        self.lcd.send_data(pixelbytes)
+        self.send(*self.clear_area(cx, cw))
 
     # Display an image in the bar.
     # It must be exactly chart w x h
@@ -128,20 +152,43 @@ class Chart(object):
         if bx + area_width > self.settings["w"]:
             return
 
-        # Define a small window to contain just this column
-        # Note these x,y offsets are for the *LCD* not just the barchart area
-        x1 = self.settings["x"] + bx
-        y1 = self.settings["y"]
-        self.lcd.set_window( x1, y1, area_width, self.settings["h"] )
+        self.draw_column(bx, by)
+
+        self.send(bx, area_width)
+
+    # Scroll mode: write 'gap' blank columns then the column for value 'by' at self.scroll_bx in the
+    # ring, and scroll so this column is at the right of the chart.
+    def scroll_add(self, gap, by):
+        w = self.settings["w"]
+        bar_width = self.settings["bar_width"]
+
+        # columns to write, i.e. from the previous column to the new one, at most the whole ring
+        gap = min(gap, w - bar_width)
+        cw = gap + bar_width
+
+        # the ring columns as a list of ( cx, cw ) windows, two if they wrap past the end
+        cx = self.scroll_bx
+        if cx + cw <= w:
+            windows = [ ( cx, cw ) ]
+        else:
+            windows = [ ( cx, w - cx ), ( 0, cx + cw - w ) ]
+
+        for wx, ww in windows:
+            self.clear_area(wx, ww)
+        bx = (cx + gap) % w
+        self.draw_column(bx, by)
 
-        # Build a list containing all the pixelbytes
-        pixelbytes = self.make_area(area_width, self.settings["h"], by)
+        for wx, ww in windows:
+            self.send(wx, ww)
 
-        # Send the pixelbytes to the LCD
-        self.lcd.send_data(pixelbytes)
+        self.scroll_bx = (cx + cw) % w
+        self.lcd.scroll(self.scroll_bx)
 
     # 'Samples' on x-axis Add an incremental column and shift
     def next(self, by):
+        if self.scroll:
+            self.scroll_add(max(self.settings["step"] - self.settings["bar_width"], 0), by)
+            return
         # Add bar to display
         self.add(self.next_bx, by)
         # Increment the position for the next bar
@@ -149,9 +196,16 @@ class Chart(object):
 
     # Add a column (or point) to the chart, given the timestamp and 'by' value
     def add_time(self, ts, by):
+        if self.scroll:
+            self.scroll_add_time(ts, by)
+            return
+
+        area_width = self.settings["bar_width"] + self.settings["cursor_width"]
+
         # If this is the first value on the chart, start at x offset = 0.
         if self.prev_bx is None:
             bx = 0
+            self.add(bx, by)
 
         # We will fill in an area from the previous point to this one.
         else:
@@ -162,35 +216,65 @@ class Chart(object):
             bx = self.prev_bx + x_adj
 
             # we now need to clear areas, and add new point
-            if bx < self.settings["w"]:
+            if x_adj < 0:
+                # A timestamp before the previous point (e.g. after a clock jump) restarts the chart
+                self.clear()
+                bx = 0
+                self.add(bx, by)
+            elif bx < self.settings["w"]:
                 # New point is a simple follow-on from prev_bx within chart width, we
-                # clear from the prev_bx to the new bx and draw new point at bx.
+                # clear from the prev_bx to the new bx and draw new point at bx, sending
+                # the cleared gap, the new column and the cursor as one window.
                 cx = self.prev_bx + self.settings["bar_width"]
-                cw = bx - self.prev_bx - self.settings["bar_width"]
-                self.clear(cx,cw)
+                cx, cw = self.clear_area(cx, bx - cx)
+                if bx + area_width > self.settings["w"]:
+                    self.send(cx, cw)
+                elif bx >= cx:
+                    self.draw_column(bx, by)
+                    self.send(cx, bx + area_width - cx)
+                else:
+                    # the new point overlaps the previous one
+                    self.add(bx, by)
             else:
                 # New point has wrapped off end of chart
                 if bx - self.settings["w"] < self.prev_bx:
                     # New point is beyond w but less than a full chart width further.
                     # so we clear from prev_bx + bar_width to w
                     cx = self.prev_bx + self.settings["bar_width"]
-                    cw = self.settings["w"] - self.prev_bx + self.settings["bar_width"]
-                    self.clear(cx,cw)
+                    self.clear(cx, self.settings["w"] - cx)
                     bx = bx - self.settings["w"]
                 else:
                     # New point is a whole chart width wrapped around from previous point.
                     # So we clear from bx % chart width to w
                     bx = bx % self.settings["w"]
                     cx = bx + self.settings["bar_width"]
-                    cw = self.settings["w"] - bx - self.settings["bar_width"]
-                    self.clear(cx,cw)
-
-                # clear from left edge up to wrapped point
-                self.clear(0,bx)
+                    self.clear(cx, self.settings["w"] - cx)
 
-        # add point
-        self.add(bx,by)
+                # clear from left edge up to wrapped point, and add the point
+                self.clear_area(0, bx)
+                if bx + area_width > self.settings["w"]:
+                    self.send(0, bx)
+                else:
+                    self.draw_column(bx, by)
+                    self.send(0, bx + area_width)
 
         self.prev_bx = bx
         self.prev_ts = ts
 
+    # Scroll mode add_time(), scrolling by the time since the previous value
+    def scroll_add_time(self, ts, by):
+        bar_width = self.settings["bar_width"]
+
+        if self.prev_bx is None:
+            self.scroll_add(0, by)
+        else:
+            x_adj = math.floor((ts - self.prev_ts) / self.settings["time_scale"] + 0.5)
+            if x_adj <= 0:
+                # Same column as the previous value (or an earlier timestamp), so redraw that column
+                self.scroll_bx = (self.scroll_bx - bar_width) % self.settings["w"]
+                self.scroll_add(0, by)
+            else:
+                self.scroll_add(max(x_adj - bar_width, 0), by)
+
+        self.prev_bx = self.scroll_bx
+        self.prev_ts = ts
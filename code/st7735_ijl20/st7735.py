@@ -22,6 +22,8 @@ except:
 
 SPI_CLOCK_HZ = 9000000 # 9 MHz
 
+SPI_BLOCK_SIZE = 4096 # bytes per SPI transfer (the spidev default bufsiz)
+
 # ------------------------------------------
 # ST7735 display controller chip command set
 # ------------------------------------------
@@ -55,7 +57,9 @@ ST7735_RAMWR       = 0x2C
 ST7735_RAMRD       = 0x2E
 
 ST7735_PTLAR       = 0x30
+ST7735_VSCRDEF     = 0x33
 ST7735_MADCTL      = 0x36
+ST7735_VSCRSADD    = 0x37
 # ST7735_PIXFMT      = 0x3A
 ST7735_COLMOD       = 0x3A
 
@@ -173,6 +177,12 @@ class ST7735(object):
         self.LCD_X_Adjust = LCD_X
         self.LCD_Y_Adjust = LCD_Y
 
+        # Solid color SPI_BLOCK_SIZE byte patterns for fill(), by color
+        self.fill_patterns = {}
+
+        # ( top fixed lines, scroll lines ) from set_scroll_area()
+        self.scroll_area = None
+
         # set up i/o pins
         self.GPIO_init()
 
@@ -202,9 +212,12 @@ class ST7735(object):
         """Generator function to convert a PIL image to 16-bit 565 RGB bytes."""
         # NumPy is much faster at doing this. NumPy code provided by:
         # Keith (https://www.blogger.com/profile/02555547344016007163)
-        pb = np.array(image.convert('RGB')).astype('uint16')
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        pb = np.asarray(image).astype('uint16')
         color = ((pb[:,:,0] & 0xF8) << 8) | ((pb[:,:,1] & 0xFC) << 3) | (pb[:,:,2] >> 3)
-        return np.dstack(((color >> 8) & 0xFF, color & 0xFF)).flatten().tolist()
+        # big-endian 16-bit pixels as bytes, i.e. MSB, LSB for each pixel, sent with one writebytes2()
+        return color.astype('>u2').tobytes()
 
     def send(self, data, is_data=True, chunk_size=4096):
         """Write a byte or array of bytes to the display. Is_data parameter
@@ -220,6 +233,10 @@ class ST7735(object):
         # Convert scalar argument to list so either can be passed as parameter.
         if isinstance(data, numbers.Number):
             data = [data & 0xFF]
+        # bytes (e.g. cached sprites) can go straight to writebytes2(), which does its own chunking
+        if isinstance(data, (bytes, bytearray, memoryview)) and hasattr(SPI, "writebytes2"):
+            SPI.writebytes2(data)
+            return
         # Write data a chunk at a time.
         for start in range(0, len(data), chunk_size):
             end = min(start+chunk_size, len(data))
@@ -240,10 +257,30 @@ class ST7735(object):
         SPI.writebytes([byte])
 
     def WriteData_NLen16Bit(self, Data, DataLen):
+        self.fill(Data, DataLen)
+
+    # Return SPI_BLOCK_SIZE bytes of the 16-bit 'color' repeated, cached for each color
+    def fill_pattern(self, color):
+        pattern = self.fill_patterns.get(color)
+        if pattern is None:
+            pattern = bytes([ MSB(color), LSB(color) ]) * (SPI_BLOCK_SIZE // 2)
+            self.fill_patterns[color] = pattern
+        return pattern
+
+    # Send 'count' pixels of 16-bit 'color' to the current window, in SPI_BLOCK_SIZE transfers
+    def fill(self, color, count):
+        if SIMULATION_MODE:
+            return
+
+        pattern = self.fill_pattern(color)
+
         GPIO.output(self._dc, GPIO.HIGH)
-        for i in range(0, DataLen):
-            SPI.writebytes([Data >> 8])
-            SPI.writebytes([Data & 0xff])
+
+        blocks, remainder = divmod(count * 2, SPI_BLOCK_SIZE)
+        for i in range(blocks):
+            SPI.writebytes(pattern)
+        if remainder > 0:
+            SPI.writebytes(pattern[:remainder])
 
     """    Common register initialization    """
     def setup(self):
@@ -429,20 +466,10 @@ class ST7735(object):
         x_end = x + w
         y_end = y + h
 
-        # set the X coordinates
+        # set the X coordinates, i.e. start high octet, start low octet, end high octet, end low octet
         self.send_command( ST7735_CASET )
-
-                # Set the horizontal starting point to the high octet
-        self.send_byte( 0x00 )
-
-                # Set the horizontal starting point to the low octet
-        self.send_byte( (x & 0xff) + self.LCD_X_Adjust)
-
-                # Set the horizontal end to the high octet
-        self.send_byte( 0x00 )
-
-                # Set the horizontal end to the low octet
-        self.send_byte( (( x_end - 1 ) & 0xff) + self.LCD_X_Adjust)
+        self.send_data([ 0x00, (x & 0xff) + self.LCD_X_Adjust,
+                         0x00, ( (x_end - 1) & 0xff ) + self.LCD_X_Adjust ])
 
         #set the Y coordinates
         self.send_command( ST7735_RASET )
@@ -451,6 +478,39 @@ class ST7735(object):
 
         self.send_command( ST7735_RAMWR )
 
+    #/********************************************************************************
+    #function:  Define the hardware scroll area (VSCRDEF)
+    #parameter:
+    #   x,w  :   left display column and width of the scrolling band
+    #
+    # The controller scrolls along its 162 frame memory lines, which with the default
+    # U2D_R2L scan (MADCTL MV set) are the display *columns*, so the scroll area is a band
+    # of columns x..x+w-1 across the full height of the display. The columns either side
+    # are fixed.
+    #********************************************************************************/
+    def set_scroll_area(self, x, w):
+        top_fixed = x + self.LCD_X_Adjust
+        bottom_fixed = LCD_Y_MAXPIXEL - top_fixed - w
+        self.scroll_area = ( top_fixed, w )
+
+        self.send_command( ST7735_VSCRDEF )
+        self.send_data([ MSB(top_fixed), LSB(top_fixed),
+                         MSB(w), LSB(w),
+                         MSB(bottom_fixed), LSB(bottom_fixed) ])
+
+    #/********************************************************************************
+    #function:  Scroll the band set by set_scroll_area() (VSCRSADD)
+    #parameter:
+    #   offset :   the column of the band (0..w-1, as written with set_window) to show
+    #              at the left of the band, the columns before it wrap round to the right
+    #********************************************************************************/
+    def scroll(self, offset):
+        top_fixed, w = self.scroll_area
+        line = top_fixed + offset % w
+
+        self.send_command( ST7735_VSCRSADD )
+        self.send_data([ MSB(line), LSB(line) ])
+
     # -------------------------------------
     # ----- RESET THE LCD DISPLAY  --------
     # -------------------------------------
@@ -484,7 +544,7 @@ class ST7735(object):
         # Unfortunate that this copy has to occur, but the SPI byte writing
         # function needs to take an array of bytes and PIL doesn't natively
         # store images in 16-bit 565 RGB format.
-        pixelbytes = list(self.image_to_data(image))
+        pixelbytes = self.image_to_data(image)
         # Write data to hardware.
         self.send_data(pixelbytes)
 
@@ -501,7 +561,7 @@ class ST7735(object):
         # Unfortunate that this copy has to occur, but the SPI byte writing
         # function needs to take an array of bytes and PIL doesn't natively
         # store images in 16-bit 565 RGB format.
-        pixelbytes = list(self.image_to_data(image))
+        pixelbytes = self.image_to_data(image)
         # Write data to hardware.
         self.send_data(pixelbytes)
 
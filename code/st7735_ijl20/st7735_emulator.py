@@ -58,6 +58,10 @@ class ST7735_EMULATOR(object):
         self.width = width
         self.height = height
 
+        # Hardware scroll band ( x, w ) from set_scroll_area(), and offset from scroll()
+        self.scroll_area = None
+        self.scroll_offset = 0
+
         # Dimensions of display window (self.screen)
         self.screen_width = width * scale
         self.screen_height = height * scale
@@ -80,7 +84,7 @@ class ST7735_EMULATOR(object):
         self.screen_update()
 
     def screen_update(self):
-        self.screen.blit(pg.transform.scale(self.lcd,(self.screen_width, self.screen_height)),[0,0])
+        self.screen.blit(pg.transform.scale(self.scrolled_lcd(),(self.screen_width, self.screen_height)),[0,0])
         pg.display.update()
         for e in pg.event.get():
             pass
@@ -198,6 +202,29 @@ class ST7735_EMULATOR(object):
         self.window_w = w
         self.window_h = h
 
+    # Define the scrolling band of columns x..x+w-1, as ST7735.set_scroll_area()
+    def set_scroll_area(self, x, w):
+        self.scroll_area = ( x, w )
+        self.scroll_offset = 0
+        self.screen_update()
+
+    # Show column 'offset' of the scroll band at its left edge, as ST7735.scroll()
+    def scroll(self, offset):
+        self.scroll_offset = offset % self.scroll_area[1]
+        self.screen_update()
+
+    # Return the displayed LCD, i.e. self.lcd (the frame memory) with the scroll band rotated
+    def scrolled_lcd(self):
+        if self.scroll_area is None or self.scroll_offset == 0:
+            return self.lcd
+
+        x, w = self.scroll_area
+        s = self.scroll_offset
+        lcd = self.lcd.copy()
+        lcd.blit(self.lcd, (x, 0), (x + s, 0, w - s, self.height))
+        lcd.blit(self.lcd, (x + w - s, 0), (x, 0, s, self.height))
+        return lcd
+
     # -------------------------------------
     # ----- RESET THE LCD DISPLAY  --------
     # -------------------------------------
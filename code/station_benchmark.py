@@ -0,0 +1,128 @@
+# station_benchmark.py
+
+"""
+Measures the cpu cost per coffee station of a SensorHub serving several stations (see classes/station.py).
+
+Usage (from the 'code' directory):
+
+    python3 station_benchmark.py [--config <settings overlay>] [--stations N,N,...] [--seconds SECS] <csv file>
+
+For each number of stations (default 1 2 5 10 20) a SensorHub is created with that many stations, each with
+a weight LocalSensor and the grinder and brew machine RemoteSensors. The recorded <ts>,<weight> readings
+of <csv file> (up to --seconds of them, default 1800) are processed by every station as they would be in
+the LocalSensor loop, with a grinder and brew machine message every 10 seconds. The readings go straight
+to SensorHub.process_reading(), i.e. as fast as possible rather than in real time, and the events are
+counted rather than sent.
+
+The table shows the cpu seconds per station per hour of readings, and the % of one cpu each station uses
+when running in real time, so the number of stations a gateway can serve is about 100 / that %.
+
+E.g.
+    python3 station_benchmark.py ../data/2019-12-18/save_1576677425.258.csv
+"""
+
+import sys
+import time
+import asyncio
+import argparse
+
+from classes.config import Config
+from classes.sensor_hub import SensorHub
+from classes.sensor_subscriber import SensorSubscriber
+from classes.remote_sensor import RemoteSensor
+from classes.local_sensor import LocalSensor
+from classes.time_buffer import TimeBuffer
+from classes.replay import count_lines
+
+REMOTE_PERIOD = 10 # seconds between the Tasmota messages from the grinder and brew machine
+
+# Return the settings for 'count' stations
+def station_settings(settings, count):
+    stations = []
+    for i in range(count):
+        station_id = "csn-pot-{:02d}".format(i)
+        stations.append({ "SENSOR_ID": station_id,
+                          "WEIGHT_SENSOR_ID": station_id+"-weight",
+                          "GRIND_SENSOR_ID": station_id+"-grind",
+                          "BREW_SENSOR_ID": station_id+"-brew" })
+    return { **settings, "STATIONS": stations }
+
+# Return list of (ts, value) readings from 'filename', up to 'seconds' long
+def load_readings(filename, settings, seconds):
+    recording = TimeBuffer(size=count_lines(filename), settings=settings)
+    recording.load(filename)
+    readings = []
+    recording.play(lambda ts, value: readings.append((ts, value)))
+    return [ (ts, value) for ts, value in readings if ts - readings[0][0] <= seconds ]
+
+# Process 'readings' at every station of a new SensorHub, return ( cpu seconds, events sent )
+async def run(settings, readings):
+    sensor_hub = SensorHub(settings=settings)
+
+    sent_events = [ 0 ]
+    async def count_put(sensor_id, event):
+        sent_events[0] += 1
+    sensor_hub.uplink.put = count_put
+
+    sensor_subscriber = SensorSubscriber(settings=settings)
+
+    stations = []
+    for station in sensor_hub.stations.values():
+        local_sensor = LocalSensor(settings=station.settings, sensor_id=station.settings["WEIGHT_SENSOR_ID"],
+                                   sensor_hub=sensor_hub)
+        remote_sensors = [ RemoteSensor(settings=station.settings, sensor_id=station.settings[name],
+                                        sensor_hub=sensor_hub, sensor_subscriber=sensor_subscriber)
+                           for name in [ "GRIND_SENSOR_ID", "BREW_SENSOR_ID" ] ]
+        stations.append((local_sensor, remote_sensors))
+
+    message = { "ENERGY": { "Power": 2 } }
+    next_remote_ts = readings[0][0]
+
+    t_start = time.process_time()
+    for ts, value in readings:
+        for local_sensor, remote_sensors in stations:
+            local_sensor.sample_buffer.put(ts, value)
+            await sensor_hub.process_reading(ts, local_sensor.sensor_id)
+
+        if ts >= next_remote_ts:
+            next_remote_ts += REMOTE_PERIOD
+            for local_sensor, remote_sensors in stations:
+                for remote_sensor in remote_sensors:
+                    remote_sensor.sample_buffer.put(ts, message)
+                    await sensor_hub.process_reading(ts, remote_sensor.sensor_id)
+
+    return time.process_time() - t_start, sent_events[0]
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the SensorHub cpu cost per station")
+    parser.add_argument("filename", help="CSV file of <ts>,<weight> readings")
+    parser.add_argument("--config", default=None, help="settings file to overlay on config/sensor_config.json")
+    parser.add_argument("--stations", default="1,2,5,10,20", help="comma-separated numbers of stations")
+    parser.add_argument("--seconds", type=float, default=1800, help="seconds of readings to process")
+    args = parser.parse_args()
+
+    settings = Config(args.config).settings
+    settings = settings.replace(LOG_LEVEL=3,
+                                SIMULATE_UPLINK=True,
+                                SIMULATE_SENSORS=True,
+                                SIMULATE_DISPLAY=True,
+                                DISPLAY=False)
+
+    readings = load_readings(args.filename, settings, args.seconds)
+    if len(readings) < 2:
+        print("station_benchmark no readings in {}".format(args.filename), file=sys.stderr)
+        sys.exit(1)
+
+    hours = (readings[-1][0] - readings[0][0]) / 3600
+
+    results = []
+    for count in [ int(x) for x in args.stations.split(",") ]:
+        process_time, event_count = asyncio.run(run(station_settings(settings, count), readings))
+        results.append((count, process_time, event_count))
+
+    print("{} readings, {:.2f} hours at each station".format(len(readings), hours))
+    print("{: >8} {: >10} {: >8} {: >18} {: >14}".format("stations", "cpu secs", "events", "cpu secs/station/h", "cpu %/station"))
+    for count, process_time, event_count in results:
+        per_station_hour = process_time / count / hours
+        print("{: >8} {: >10.2f} {: >8} {: >18.2f} {: >14.3f}".format(count, process_time, event_count,
+                                                                    per_station_hour, 100 * per_station_hour / 3600))
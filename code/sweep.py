@@ -0,0 +1,133 @@
+# sweep.py
+
+"""
+Evaluates a grid of Events detector parameters against recorded days, scoring each grid
+point against labelled events.
+
+Usage (from the 'code' directory):
+
+    python3 sweep.py --labels <labels.csv> --param <NAME>=<v1>,<v2>,... [--param ...]
+                     [--config <settings overlay>] [--workers N] [--tolerance <secs>]
+                     [--cache-dir <dir>] [--top N] <day> [<day> ...]
+
+<NAME> is an Events threshold attribute, e.g. NEW_POT_MINIMUM, MIN_CUP_WEIGHT, STABLE_DEVIATION,
+EMPTY_TEST_SECONDS, EMPTY_MARGIN, FULL_MARGIN.
+
+<day> is a directory of <ts>,<weight> CSV files or a single CSV file, as for replay_archive.py.
+
+The rolling median / deviation statistics for each day are calculated once and cached in
+--cache-dir (see classes/sweep.py), then the grid points are shared across a ProcessPoolExecutor.
+
+E.g.
+    python3 sweep.py --labels ../data/server_brews/all.csv \\
+                     --param MIN_CUP_WEIGHT=20,30,40,60 --param STABLE_DEVIATION=20,30,40 \\
+                     ../data/2019-* ../data/2020-*
+"""
+
+import sys
+import time
+import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+
+from classes.config import Config
+from classes.sweep import load_stats_cache, replay_cached, load_labels, score_events, score_summary
+from replay_archive import find_days
+
+# Each worker process loads the stats caches and labels once, into these globals
+WORKER_SETTINGS = None
+WORKER_CACHES = None
+WORKER_LABELS = None
+WORKER_TOLERANCE = None
+
+def worker_init(settings, cache_filenames, labels, tolerance):
+    global WORKER_SETTINGS, WORKER_CACHES, WORKER_LABELS, WORKER_TOLERANCE
+    WORKER_SETTINGS = settings
+    WORKER_CACHES = [ load_stats_cache(*cache_args, settings) for cache_args in cache_filenames ]
+    WORKER_LABELS = labels
+    WORKER_TOLERANCE = tolerance
+
+# Replay every cached day with 'params' and return the combined score
+def evaluate(params):
+    t_start = time.process_time()
+    score = { "tp": 0, "fp": 0, "fn": 0 }
+    for stats_cache in WORKER_CACHES:
+        result = replay_cached(stats_cache, WORKER_SETTINGS, params)
+        day_score = score_events(result, WORKER_LABELS, WORKER_TOLERANCE)
+        for key in score:
+            score[key] += day_score[key]
+    return params, score_summary(score), time.process_time() - t_start
+
+# Convert "MIN_CUP_WEIGHT=20,40" to ( "MIN_CUP_WEIGHT", [ 20, 40 ] )
+def parse_param(param_string):
+    name, values_string = param_string.split("=", 1)
+    values = []
+    for value_string in values_string.split(","):
+        try:
+            values.append(int(value_string))
+        except ValueError:
+            values.append(float(value_string))
+    return name.strip(), values
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Sweep Events detector parameters against labelled events")
+    parser.add_argument("paths", nargs="+", help="day directories or CSV files of <ts>,<weight> readings")
+    parser.add_argument("--labels", required=True, help="labelled events CSV, e.g. ../data/server_brews/all.csv")
+    parser.add_argument("--param", action="append", default=[], help="<NAME>=<value>,<value>,...")
+    parser.add_argument("--config", default=None, help="settings file to overlay on config/sensor_config.json")
+    parser.add_argument("--workers", type=int, default=None, help="number of processes (default: cpu count)")
+    parser.add_argument("--tolerance", type=float, default=30, help="seconds between matching events (default 30)")
+    parser.add_argument("--cache-dir", default="sweep_cache", help="directory for cached statistics")
+    parser.add_argument("--top", type=int, default=20, help="number of results to list (default 20)")
+    args = parser.parse_args()
+
+    settings = Config(args.config).settings
+    settings = settings.replace(LOG_LEVEL=3)
+
+    days = find_days(args.paths)
+
+    labels = load_labels(args.labels)
+
+    t_start = time.time()
+
+    # Create any missing stats caches, in parallel
+    cache_args = [ (args.cache_dir, day, filenames) for day, filenames in days.items() ]
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = [ executor.submit(load_stats_cache, *day_args, settings) for day_args in cache_args ]
+        for future in futures:
+            future.result()
+
+    t_cached = time.time()
+
+    # Build the grid of parameter dictionaries
+    param_values = [ parse_param(param_string) for param_string in args.param ]
+    names = [ name for name, values in param_values ]
+    grid = [ dict(zip(names, combination))
+             for combination in itertools.product(*[ values for name, values in param_values ]) ]
+
+    with ProcessPoolExecutor(max_workers=args.workers,
+                             initializer=worker_init,
+                             initargs=(settings, cache_args, labels, args.tolerance)) as executor:
+        results = list(executor.map(evaluate, grid))
+
+    t_finish = time.time()
+
+    results.sort(key=lambda result: result[1]["f1"], reverse=True)
+
+    print("{: >5} {: >4} {: >4} {: >5} {: >5} {: >5} {: >6}  {}".format("f1", "tp", "fp", "fn",
+                                                                      "prec", "rec", "cpu", "params"))
+    for params, score, cpu_time in results[:args.top]:
+        print("{: >5.3f} {: >4} {: >4} {: >5} {: >5.3f} {: >5.3f} {: >6.2f}  {}".format(score["f1"],
+                                                                                     score["tp"],
+                                                                                     score["fp"],
+                                                                                     score["fn"],
+                                                                                     score["precision"],
+                                                                                     score["recall"],
+                                                                                     cpu_time,
+                                                                                     params))
+
+    print("sweep {} grid points over {} days, stats cache {:.1f} secs, sweep {:.1f} secs".format(len(grid),
+                                                                                          len(days),
+                                                                                          t_cached - t_start,
+                                                                                          t_finish - t_cached),
+          file=sys.stderr)
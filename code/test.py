@@ -16,7 +16,7 @@ if len(sys.argv) > 1 :
 else:
     config = Config(None)
 
-config.settings["VERSION"] = "TEST_0.1"
+config.settings = config.settings.replace(VERSION="TEST_0.1")
 
 s = Sensor(settings = config.settings)
 
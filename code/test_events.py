@@ -16,9 +16,7 @@ if len(sys.argv) > 1 :
 else:
     config = Config(None)
 
-config.settings["VERSION"] = "TEST_0.1"
-
-config.settings["DISPLAY"] = False
+config.settings = config.settings.replace(VERSION="TEST_0.1", DISPLAY=False)
 
 s = Sensor(settings = config.settings)
 
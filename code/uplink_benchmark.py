@@ -0,0 +1,134 @@
+# uplink_benchmark.py
+
+"""
+Measures the throughput and latency of each uplink transport (see classes/uplink.py) end to end on one
+machine, through an in-process LocalBroker (classes/local_broker.py) serving MQTT, the Unix socket and
+in-memory links.
+
+Usage (from the 'code' directory):
+
+    python3 uplink_benchmark.py [--messages N] [--rate HZ] [--transports memory,unix,gmqtt,hbmqtt]
+
+For each transport a subscriber link subscribes to "bench/#" and a publisher link sends N COFFEE_STATUS
+style events (default 2000) on "bench/<sensor_id>", as fast as possible or at --rate messages per second.
+The table shows the messages per second received, and the latency from put() to get() of each message.
+Transports whose client library isn't installed (e.g. hbmqtt) are skipped. The links' own per-message
+logging is sent to /dev/null during the runs.
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+import contextlib
+
+from classes.uplink import uplink_class
+from classes.local_broker import get_broker
+
+TOPIC_FILTER = "bench/#"
+
+BROKER_NAME = "127.0.0.1" # LinkMemory finds the broker by its "host", so the name is the MQTT host
+
+# Return the server_settings for a link of 'transport' to 'broker'
+def server_settings(transport, broker):
+    if transport == "unix":
+        host = broker.unix_path
+    else:
+        host = BROKER_NAME
+    return { "host": host, "port": broker.mqtt_port, "user": "bench", "password": "bench" }
+
+# Send 'count' messages from one link to another of 'transport', return ( secs, sorted latencies )
+async def run(transport, broker, count, rate, settings):
+    link_class = uplink_class(transport)
+    server = server_settings(transport, broker)
+
+    subscriber = link_class(settings=settings)
+    await subscriber.start(server)
+    await subscriber.subscribe({ "topic": TOPIC_FILTER })
+
+    publisher = link_class(settings=settings)
+    await publisher.start(server)
+
+    # let the subscription reach the broker
+    await asyncio.sleep(0.5)
+
+    latencies = []
+
+    async def receive():
+        while len(latencies) < count:
+            message = await subscriber.get()
+            if message is None:
+                return
+            latencies.append(time.perf_counter() - message["sent"])
+
+    receiver = asyncio.ensure_future(receive())
+
+    t_start = time.perf_counter()
+    for i in range(count):
+        event = { "acp_id": "csn-bench", "acp_type": "coffee_pot", "acp_ts": time.time(),
+                  "acp_units": "GRAMS", "event_code": "COFFEE_STATUS", "weight": 2000 + i % 100,
+                  "seq": i, "sent": time.perf_counter() }
+        await publisher.put("bench/csn-bench", event)
+        if rate > 0:
+            await asyncio.sleep(max(0, t_start + (i + 1) / rate - time.perf_counter()))
+        elif i % 100 == 99:
+            await asyncio.sleep(0) # let the links read
+
+    try:
+        await asyncio.wait_for(receiver, 10 + count / 100)
+    except asyncio.TimeoutError:
+        print("uplink_benchmark {} received {} of {} messages".format(transport, len(latencies), count), file=sys.stderr)
+    elapsed = time.perf_counter() - t_start
+
+    subscriber.stop_get()
+    await publisher.finish()
+    await subscriber.finish()
+
+    return elapsed, sorted(latencies)
+
+async def main(args):
+    broker = get_broker(BROKER_NAME)
+    await broker.start_mqtt(BROKER_NAME, 0)
+    socket_dir = tempfile.mkdtemp()
+    await broker.start_unix(os.path.join(socket_dir, "uplink_benchmark.sock"))
+
+    settings = { "LOG_LEVEL": 3 }
+
+    results = []
+    for transport in args.transports.split(","):
+        try:
+            uplink_class(transport)
+        except ImportError as e:
+            print("uplink_benchmark skipping {}: {}".format(transport, e))
+            continue
+
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            elapsed, latencies = await run(transport, broker, args.messages, args.rate, settings)
+        results.append(( transport, elapsed, latencies ))
+
+    await broker.finish()
+    os.rmdir(socket_dir)
+
+    print("{} messages{}".format(args.messages, " at {} Hz".format(args.rate) if args.rate > 0 else ""))
+    print("{: <10} {: >10} {: >10} {: >10} {: >10} {: >10}".format("transport", "received", "msg/s",
+                                                                   "p50 ms", "p99 ms", "max ms"))
+    for transport, elapsed, latencies in results:
+        count = len(latencies)
+        if count == 0:
+            print("{: <10} {: >10}".format(transport, 0))
+            continue
+        print("{: <10} {: >10} {: >10.0f} {: >10.3f} {: >10.3f} {: >10.3f}".format(transport, count, count / elapsed,
+                    1000 * latencies[count // 2],
+                    1000 * latencies[min(count - 1, int(count * 0.99))],
+                    1000 * latencies[-1]))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the uplink transports through a LocalBroker")
+    parser.add_argument("--messages", type=int, default=2000, help="messages to send with each transport")
+    parser.add_argument("--rate", type=float, default=0, help="messages per second, 0 for as fast as possible")
+    parser.add_argument("--transports", default="memory,unix,gmqtt,hbmqtt", help="comma-separated transports")
+    args = parser.parse_args()
+
+    asyncio.run(main(args))
@@ -0,0 +1,170 @@
+# uplink_chaos.py
+
+"""
+Checks that LinkGMQTT (classes/link_gmqtt.py) survives broker restarts: it reconnects with backoff, requests
+its subscriptions again and sends the messages put() while the broker was down.
+
+Usage (from the 'code' directory):
+
+    python3 uplink_chaos.py [--restarts N] [--up SECS] [--down SECS] [--rate HZ] [--port PORT]
+
+A LocalBroker (classes/local_broker.py) serves MQTT on 127.0.0.1:PORT (default 18830). A subscriber link
+subscribes to "chaos/#" and a publisher link sends a numbered event on "chaos/node" at --rate per second
+(default 20). The broker is stopped (closing the client connections) after --up secs (default 3), restarted
+after --down secs (default 2), and so on --restarts times (default 5). The broker itself also counts the
+messages that reach it, with an in-process subscription that isn't affected by the restarts.
+
+The check fails (exit code 1) unless, after each restart, both links reconnect and the subscriber receives
+messages again, and finally the broker has received every message put() while the publisher was disconnected
+(i.e. queued), checked by the "seq" of each message. The messages put() while the link was still connected
+in the moment around the broker closing (from IN_FLIGHT_SECS before it closes until it restarts) may be lost
+at QoS 0, so those are reported separately, and allowed up to 2 per restart. Any other message lost fails the
+check. The links' and broker's own logging is sent to /dev/null.
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+import contextlib
+
+import simplejson as json
+
+from classes.link_gmqtt import LinkGMQTT
+from classes.local_broker import get_broker
+
+TOPIC = "chaos/node"
+TOPIC_FILTER = "chaos/#"
+
+SETTINGS = { "LOG_LEVEL": 3, "UPLINK_RECONNECT_MIN": 0.2, "UPLINK_RECONNECT_MAX": 2 }
+
+IN_FLIGHT_SECS = 0.5 # messages sent this long before the broker closes may be unread by it
+
+# sent[seq] = ( time of the put(), True if the publisher was connected )
+async def publish(publisher, sent, stop, rate):
+    while not stop.is_set():
+        connected = publisher.status()["state"] == "connected"
+        t_put = time.time()
+        await publisher.put(TOPIC, { "seq": len(sent) })
+        sent.append(( t_put, connected ))
+        await asyncio.sleep(1 / rate)
+
+async def receive(subscriber, received):
+    while True:
+        message = await subscriber.get()
+        if message is None:
+            return
+        received.append(message["seq"])
+
+# Wait up to 'timeout' secs for all the 'links' to be connected, return True if they are
+async def wait_connected(links, timeout):
+    t_end = time.time() + timeout
+    while time.time() < t_end:
+        if all(link.status()["state"] == "connected" for link in links):
+            return True
+        await asyncio.sleep(0.05)
+    return False
+
+async def main(args, out):
+    broker = get_broker("chaos")
+    at_broker = []
+    broker.subscribe(TOPIC_FILTER, lambda topic, payload: at_broker.append(payload))
+    await broker.start_mqtt("127.0.0.1", args.port)
+
+    server = { "host": "127.0.0.1", "port": args.port, "user": "chaos", "password": "chaos" }
+
+    subscriber = LinkGMQTT(settings=SETTINGS)
+    await subscriber.start(server)
+    await subscriber.subscribe({ "topic": TOPIC_FILTER })
+    publisher = LinkGMQTT(settings=SETTINGS)
+    await publisher.start(server)
+
+    sent = []
+    received = []
+    stop = asyncio.Event()
+    publish_task = asyncio.ensure_future(publish(publisher, sent, stop, args.rate))
+    receive_task = asyncio.ensure_future(receive(subscriber, received))
+
+    failed = False
+    down_periods = [] # ( time the broker was stopped, time it was restarted )
+    for restart in range(args.restarts):
+        await asyncio.sleep(args.up)
+
+        t_stop = time.time()
+        await broker.finish()
+        down_sent = len(sent)
+        await asyncio.sleep(args.down)
+        down_sent = len(sent) - down_sent
+        queued = publisher.status()["queued"]
+
+        await broker.start_mqtt("127.0.0.1", args.port)
+        t_restart = time.time()
+        down_periods.append(( t_stop, t_restart ))
+        received_before = len(received)
+
+        connected = await wait_connected([ publisher, subscriber ], 10 * SETTINGS["UPLINK_RECONNECT_MAX"])
+        reconnect_secs = time.time() - t_restart
+        await asyncio.sleep(1)
+        resumed = len(received) > received_before
+
+        print("restart {}: {} sent while down, {} queued, reconnected {} in {:.2f} secs, subscriber {}".format(
+              restart + 1, down_sent, queued, "ok" if connected else "FAILED", reconnect_secs,
+              "resumed" if resumed else "NOT resumed"), file=out)
+        if not connected or not resumed:
+            failed = True
+
+    await asyncio.sleep(args.up)
+    stop.set()
+    await publish_task
+    await asyncio.sleep(0.5)
+
+    subscriber.stop_get()
+    await receive_task
+
+    await publisher.finish()
+    await subscriber.finish()
+    await broker.finish()
+
+    broker_seqs = set(json.loads(payload)["seq"] for payload in at_broker)
+    lost = [ seq for seq in range(len(sent)) if not seq in broker_seqs ]
+
+    in_flight = lambda t_put: any(t_stop - IN_FLIGHT_SECS <= t_put <= t_restart for t_stop, t_restart in down_periods)
+    queued_lost = [ seq for seq in lost if not sent[seq][1] ]
+    in_flight_lost = [ seq for seq in lost if sent[seq][1] and in_flight(sent[seq][0]) ]
+    other_lost = [ seq for seq in lost if sent[seq][1] and not in_flight(sent[seq][0]) ]
+
+    print("{} sent, {} reached the broker, {} received by the subscriber".format(
+          len(sent), len(broker_seqs), len(received)), file=out)
+    print("lost: queued {}, in flight {}, other {}".format(queued_lost, in_flight_lost, other_lost), file=out)
+    print("publisher {}".format(publisher.status()), file=out)
+    print("subscriber {}".format(subscriber.status()), file=out)
+
+    if publisher.status()["dropped"] > 0:
+        failed = True
+    # every message queued while the publisher was disconnected must reach the broker
+    if len(queued_lost) > 0 or len(other_lost) > 0:
+        failed = True
+    # allow for the messages put() in each moment between a broker stop and the disconnect
+    if len(in_flight_lost) > args.restarts * 2:
+        failed = True
+
+    return failed
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Restart a local broker under LinkGMQTT repeatedly")
+    parser.add_argument("--restarts", type=int, default=5, help="number of broker restarts")
+    parser.add_argument("--up", type=float, default=3, help="secs the broker runs between restarts")
+    parser.add_argument("--down", type=float, default=2, help="secs the broker is stopped")
+    parser.add_argument("--rate", type=float, default=20, help="messages published per second")
+    parser.add_argument("--port", type=int, default=18830, help="broker MQTT port")
+    args = parser.parse_args()
+
+    out = sys.stdout
+    with open(os.devnull, "w") as log, contextlib.redirect_stdout(log):
+        failed = asyncio.run(main(args, out))
+
+    if failed:
+        print("uplink_chaos FAILED")
+        sys.exit(1)
+    print("uplink_chaos passed")